@@ -0,0 +1,100 @@
+"""
+Benchmarks harvest F0 latency per realtime block.
+
+Compares harvest in the calling process with the HarvestPool at several
+worker counts on the audio RVC.infer extracts F0 from (block_time 0.2 s
+plus 50 ms context at 16 kHz). The pool's F0 is checked against running
+harvest on the same overlapping parts in the calling process.
+
+Run from the repository root:
+    python -m benchmarks.harvest_pool
+    python -m benchmarks.harvest_pool --workers 2 4 8 --blocks 50
+"""
+from lingu.rvc.f0_pool import HarvestPool, HOP, OVERLAP
+import numpy as np
+import argparse
+import time
+
+SAMPLERATE = 16000
+BLOCK_SAMPLES = 3200 + 800
+
+
+def voice_like(samples):
+    t = np.arange(samples) / SAMPLERATE
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLERATE
+    audio = sum(np.sin(k * phase) / k for k in range(1, 8))
+    return (0.2 * audio).astype(np.float32)
+
+
+def harvest(x):
+    import pyworld
+
+    f0, _ = pyworld.harvest(
+        x.astype(np.double),
+        fs=SAMPLERATE,
+        f0_ceil=1100,
+        f0_floor=50,
+        frame_period=10)
+    return f0
+
+
+def split_reference(x, workers):
+    # the split of the former queue based implementation, in process
+    length = len(x)
+    part_length = HOP * ((length // HOP - 1) // workers + 1)
+    parts = (length // HOP - 1) // (part_length // HOP) + 1
+    f0 = np.zeros(length // HOP + 1)
+    for part in range(parts):
+        tail = part_length * (part + 1) + OVERLAP
+        if part == 0:
+            part_f0 = harvest(x[:tail])[:-3]
+        else:
+            part_f0 = harvest(x[part_length * part - OVERLAP:tail])
+            part_f0 = part_f0[2:-3] if part != parts - 1 else part_f0[2:]
+        offset = part_length * part // HOP
+        f0[offset:offset + len(part_f0)] = part_f0
+    return f0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--blocks", type=int, default=30)
+    args = parser.parse_args()
+
+    audio = voice_like(BLOCK_SAMPLES * args.blocks)
+    blocks = [audio[i * BLOCK_SAMPLES:(i + 1) * BLOCK_SAMPLES]
+              for i in range(args.blocks)]
+
+    print(f"harvest f0 per block of {BLOCK_SAMPLES} samples")
+    times = []
+    for block in blocks:
+        start = time.perf_counter()
+        harvest(block)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"  {'in process':<16} mean {sum(times) / len(times) * 1000:>7.2f} ms"
+          f"   p95 {times[int(len(times) * 0.95)] * 1000:>7.2f} ms")
+
+    for workers in args.workers:
+        pool = HarvestPool(workers)
+        try:
+            f0 = pool.harvest(blocks[0])  # starts the workers
+            if not np.array_equal(f0, split_reference(blocks[0], workers)):
+                raise AssertionError(f"f0 of {workers} workers differs")
+            pool.latencies.clear()
+            pool.worker_times.clear()
+            for block in blocks:
+                pool.harvest(block)
+            stats = pool.get_stats()
+        finally:
+            pool.close()
+        print(f"  {f'{workers} workers':<16} mean {stats['mean_ms']:>7.2f} ms"
+              f"   p95 {stats['p95_ms']:>7.2f} ms"
+              f"   slowest part {stats['slowest_part_ms']:>6.2f} ms"
+              f"   overhead {stats['overhead_ms']:>5.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
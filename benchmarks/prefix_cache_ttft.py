@@ -0,0 +1,183 @@
+"""
+Benchmarks time-to-first-token with and without prompt prefix reuse.
+
+For ollama and lm studio the former message layout (date and time at the
+end of the system prompt, in front of the history) is compared with the
+stable layout (date and time at the front of the new user message, like
+LLMInterfaceBase.add_datetime sends them), which lets the server reuse the
+evaluated system prompt and history.
+
+For llama.cpp the model is run without and with the prompt state cache
+while alternating between the tool selection and the answer prompt, like
+a voice turn does.
+
+Run from the repository root, with the server running:
+    python -m benchmarks.prefix_cache_ttft --provider ollama --model llama3.1:8b
+    python -m benchmarks.prefix_cache_ttft --provider lmstudio --model <name>
+    python -m benchmarks.prefix_cache_ttft --provider llama.cpp --model models/llm/model.gguf
+"""
+import argparse
+import datetime
+import time
+
+URLS = {
+    "ollama": "http://127.0.0.1:11434/v1",
+    "lmstudio": "http://127.0.0.1:1234/v1",
+}
+REQUESTS = 8
+HISTORY_TURNS = 6
+
+SYSTEM_PROMPT = " ".join([
+    "You are Linguflex, a helpful, witty and concise voice assistant.",
+    "You answer in one or two short sentences that are easy to speak.",
+    "You never use lists, markdown or emojis, because everything you say",
+    "is converted to speech. You have a warm personality and a dry sense",
+    "of humor, but you always stay polite and respectful.",
+] * 8)
+SELECTION_PROMPT = " ".join([
+    "You are the world's leading expert in function selection for AI",
+    "systems. Respond ONLY with the letter of the chosen function.",
+] * 12)
+QUESTIONS = [
+    "What is the capital of Australia?",
+    "How far away is the moon?",
+    "Can you recommend a good book?",
+    "Why is the sky blue?",
+    "What should I cook tonight?",
+    "Tell me a fun fact about octopuses.",
+    "How do I make my coffee less bitter?",
+    "What is a good name for a cat?",
+]
+
+
+def now():
+    # microseconds make sure the date and time differ on every request
+    return datetime.datetime.now().strftime("%A, %Y-%m-%d %H:%M:%S.%f")
+
+
+def history():
+    messages = []
+    for i in range(HISTORY_TURNS):
+        messages.append({"role": "user", "content": QUESTIONS[i]})
+        messages.append({
+            "role": "assistant",
+            "content": "That is a great question, here is a short answer "
+                       "that is long enough to make the history matter."})
+    return messages
+
+
+def volatile_messages(question):
+    system = f"{SYSTEM_PROMPT}\n\nCurrent date and time: {now()}"
+    return [{"role": "system", "content": system}] + history() + \
+        [{"role": "user", "content": question}]
+
+
+def stable_messages(question):
+    return [{"role": "system", "content": SYSTEM_PROMPT}] + history() + [
+        {"role": "user",
+         "content": f"Current date and time: {now()}\n\n{question}"},
+    ]
+
+
+def selection_messages(question):
+    return [
+        {"role": "system", "content": SELECTION_PROMPT},
+        {"role": "user", "content": f"A: music\nB: weather\nC: Not Applicable"
+                                    f"\n\nUser's request:\n\"{question}\""},
+    ]
+
+
+def time_to_first_token(create, messages):
+    start = time.perf_counter()
+    stream = create(messages)
+    elapsed = None
+    for _ in stream:
+        elapsed = time.perf_counter() - start
+        break
+    for _ in stream:
+        pass
+    if elapsed is None:
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def run(label, create, build_messages):
+    # first request evaluates the prefix, it is not part of the result
+    time_to_first_token(create, build_messages(QUESTIONS[0]))
+    times = []
+    for i in range(REQUESTS):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        create_selection = create.selection
+        if create_selection:
+            time_to_first_token(create_selection, selection_messages(question))
+        times.append(time_to_first_token(create, build_messages(question)))
+    times.sort()
+    print(f"{label:<28} median {times[len(times) // 2] * 1000:>8.1f} ms   "
+          f"min {times[0] * 1000:>8.1f} ms")
+
+
+class ServerCreate:
+    def __init__(self, client, model, selection=False):
+        self.client = client
+        self.model = model
+        self.selection = ServerCreate(client, model) if selection else None
+
+    def __call__(self, messages):
+        return self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=8,
+            temperature=0,
+            stream=True)
+
+
+class LlamaCreate:
+    def __init__(self, llama, selection=False):
+        self.llama = llama
+        self.selection = LlamaCreate(llama) if selection else None
+
+    def __call__(self, messages):
+        return self.llama.create_chat_completion(
+            messages=messages,
+            max_tokens=8,
+            temperature=0,
+            stream=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--provider", default="ollama",
+                        choices=["ollama", "lmstudio", "llama.cpp"])
+    parser.add_argument("--model", default="llama3.1:8b")
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--gpu_layers", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.provider == "llama.cpp":
+        import llama_cpp
+
+        llama = llama_cpp.Llama(
+            model_path=args.model,
+            n_gpu_layers=args.gpu_layers,
+            chat_format="chatml",
+            n_ctx=4096,
+            verbose=False)
+
+        # alternating selection and answer prompt, like a voice turn
+        run("no prompt cache", LlamaCreate(llama, True), stable_messages)
+        llama.set_cache(llama_cpp.LlamaRAMCache())
+        run("ram prompt cache", LlamaCreate(llama, True), stable_messages)
+        return
+
+    from openai import OpenAI
+
+    client = OpenAI(base_url=args.url or URLS[args.provider], api_key="dummy")
+    run("datetime in system prompt", ServerCreate(client, args.model),
+        volatile_messages)
+    run("stable prefix", ServerCreate(client, args.model), stable_messages)
+    run("stable prefix + selection",
+        ServerCreate(client, args.model, True), stable_messages)
+
+
+if __name__ == "__main__":
+    main()
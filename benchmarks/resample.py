@@ -0,0 +1,95 @@
+"""
+Benchmarks CPU time per second of audio for chunked resampling.
+
+Compares the shared StreamResampler with the per-chunk calls it replaced:
+resampy (speech module, three calls per chunk in the former overlap
+resampler), librosa (RealtimeRVC.feed) and scipy's FFT resample (server
+microphone input). Libraries that are not installed are skipped.
+
+Run from the repository root:
+    python -m benchmarks.resample
+"""
+from lingu.core.resample import StreamResampler
+import numpy as np
+import time
+
+SECONDS = 10
+CHUNK_MS = 20
+
+CASES = [
+    # (path, input rate, output rate)
+    ("tts to browser", 24000, 48000),
+    ("tts to rvc", 24000, 40000),
+    ("microphone to whisper", 48000, 16000),
+    ("microphone to whisper", 44100, 16000),
+]
+
+
+def chunks(rate):
+    t = np.arange(SECONDS * rate) / rate
+    audio = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    size = rate * CHUNK_MS // 1000
+    return [audio[i:i + size] for i in range(0, len(audio), size)]
+
+
+def stream_resampler(audio_chunks, rate_in, rate_out):
+    resampler = StreamResampler(rate_in, rate_out)
+    for chunk in audio_chunks:
+        resampler.process(chunk)
+    resampler.flush()
+
+
+def resampy_overlap(audio_chunks, rate_in, rate_out):
+    import resampy
+
+    previous = None
+    for chunk in audio_chunks:
+        if previous is None:
+            resampy.resample(chunk, rate_in, rate_out)
+        else:
+            resampy.resample(
+                np.concatenate((previous, chunk)), rate_in, rate_out)
+            resampy.resample(chunk, rate_in, rate_out)
+        previous = chunk
+
+
+def librosa_chunks(audio_chunks, rate_in, rate_out):
+    import librosa
+
+    for chunk in audio_chunks:
+        librosa.resample(chunk, orig_sr=rate_in, target_sr=rate_out)
+
+
+def scipy_fft_chunks(audio_chunks, rate_in, rate_out):
+    from scipy.signal import resample
+
+    for chunk in audio_chunks:
+        resample(chunk, int(len(chunk) * rate_out / rate_in))
+
+
+METHODS = [
+    ("StreamResampler", stream_resampler),
+    ("resampy (3 per chunk)", resampy_overlap),
+    ("librosa", librosa_chunks),
+    ("scipy fft", scipy_fft_chunks),
+]
+
+
+def main():
+    print(f"cpu time per second of audio, {CHUNK_MS} ms chunks")
+    for name, rate_in, rate_out in CASES:
+        print(f"\n{name} ({rate_in} -> {rate_out} Hz)")
+        audio_chunks = chunks(rate_in)
+        for method_name, method in METHODS:
+            start = time.process_time()
+            try:
+                method(audio_chunks, rate_in, rate_out)
+            except ImportError:
+                print(f"  {method_name:<24} not installed")
+                continue
+            elapsed = (time.process_time() - start) / SECONDS
+            print(f"  {method_name:<24} {elapsed * 1000:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmarks the fixed per block overhead of RealtimeRVCBase.audio_callback.
+
+Compares the former streaming state handling (shifting input_wav,
+input_wav_res and output_buffer with clone() every block, input gate and
+rms mixing with librosa on numpy copies) with the circular RingTensor
+windows and on-device frame_rms. The model is not involved: both versions
+process the same random blocks at 40 kHz and their windows, gated input
+and rms mix gains are checked for equality.
+
+Run from the repository root:
+    python -m benchmarks.rvc_block_state
+    python -m benchmarks.rvc_block_state --device cuda --blocks 500
+"""
+from lingu.rvc.stream_buffers import RingTensor, frame_rms
+import numpy as np
+import argparse
+import time
+
+SAMPLERATE = 40000
+ZC = SAMPLERATE // 100
+BLOCK_FRAME = 8000  # block_time 0.2 s
+BLOCK_FRAME_16K = 160 * BLOCK_FRAME // ZC
+INPUT_FRAME = 100000 + 2000 + 400 + BLOCK_FRAME  # extra 2.5 s, crossfade
+THRESHOLD = -60 + 1e-3
+
+
+def gate_reference(librosa, indata):
+    rms = librosa.feature.rms(y=indata, frame_length=4 * ZC, hop_length=ZC)
+    db_threhold = librosa.amplitude_to_db(rms, ref=1.0)[0] < THRESHOLD
+    for i in range(db_threhold.shape[0]):
+        if db_threhold[i]:
+            indata[i * ZC: (i + 1) * ZC] = 0
+    return indata
+
+
+def gate(torch, block):
+    rms = frame_rms(block, 4 * ZC, ZC)
+    db = 10 * torch.log10(torch.clamp(rms * rms, min=1e-10))
+    db = torch.maximum(db, db.max() - 80)
+    block.view(-1, ZC).mul_((db[:-1] >= THRESHOLD)[:, None])
+    return block
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--blocks", type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        import librosa
+        import torch
+    except ImportError as e:
+        print(f"skipped, {e}")
+        return
+
+    device = torch.device(args.device)
+    rng = np.random.default_rng(0)
+    blocks = [
+        (rng.standard_normal(BLOCK_FRAME) * 10 ** rng.uniform(-4, 0, 1))
+        .astype(np.float32) for _ in range(args.blocks)]
+
+    input_wav = torch.zeros(INPUT_FRAME, device=device)
+    input_wav_res = torch.zeros(160 * INPUT_FRAME // ZC, device=device)
+    output_buffer = torch.zeros(INPUT_FRAME, device=device)
+
+    def reference(indata):
+        nonlocal input_wav, input_wav_res, output_buffer
+        indata = gate_reference(librosa, indata.copy())
+        input_wav[:-BLOCK_FRAME] = input_wav[BLOCK_FRAME:].clone()
+        input_wav[-BLOCK_FRAME:] = torch.from_numpy(indata).to(device)
+        input_wav_res[:-BLOCK_FRAME_16K] = \
+            input_wav_res[BLOCK_FRAME_16K:].clone()
+        input_wav_res[-BLOCK_FRAME_16K - 160:] = \
+            input_wav[-BLOCK_FRAME_16K - 160:]
+        output_buffer[:-BLOCK_FRAME] = output_buffer[BLOCK_FRAME:].clone()
+        output_buffer[-BLOCK_FRAME:] = input_wav[-BLOCK_FRAME:]
+        rms = librosa.feature.rms(
+            y=input_wav[-BLOCK_FRAME:].cpu().numpy(),
+            frame_length=4 * ZC, hop_length=ZC)
+        return torch.from_numpy(rms[0]).to(device)
+
+    block_in = torch.zeros(BLOCK_FRAME, device=device)
+    workspace = torch.zeros(INPUT_FRAME, device=device)
+    ring = RingTensor(INPUT_FRAME, device)
+    ring_res = RingTensor(160 * INPUT_FRAME // ZC, device)
+    ring_out = RingTensor(INPUT_FRAME, device)
+
+    def circular(indata):
+        block_in.copy_(torch.from_numpy(indata))
+        ring.push(gate(torch, block_in))
+        window = ring.window()
+        ring_res.advance(BLOCK_FRAME_16K)
+        ring_res.write_tail(window[-BLOCK_FRAME_16K - 160:])
+        ring_out.push(window[-BLOCK_FRAME:])
+        return frame_rms(window[-BLOCK_FRAME:], 4 * ZC, ZC, workspace)
+
+    for indata in blocks:
+        rms = reference(indata)
+        rms_ring = circular(indata)
+        if not (torch.equal(ring.window(), input_wav)
+                and torch.equal(ring_res.window(), input_wav_res)
+                and torch.equal(ring_out.window(), output_buffer)):
+            raise AssertionError("windows differ")
+        if not torch.allclose(rms, rms_ring, rtol=1e-4, atol=1e-7):
+            raise AssertionError("rms differs")
+    print("windows and gated input identical, rms within 1e-4")
+
+    print(f"\nstreaming state per {BLOCK_FRAME} sample block on {device}")
+    for name, function in (("shift + librosa", reference),
+                           ("circular", circular)):
+        times = []
+        for indata in blocks:
+            start = time.perf_counter()
+            function(indata)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"  {name:<16} mean {sum(times) / len(times) * 1000:>7.3f} ms"
+              f"   p95 {times[int(len(times) * 0.95)] * 1000:>7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
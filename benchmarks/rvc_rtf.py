@@ -0,0 +1,100 @@
+"""
+Benchmarks the real-time factor of the realtime voice conversion per
+backend on the CPU.
+
+Runs RealtimeRVCBase.audio_callback (feature extraction, F0, synthesis,
+crossfade) on blocks of a synthetic voice-like signal with torch and with
+onnxruntime at several thread counts. A real-time factor below 1.0 means
+a block is converted faster than it plays (block_time is 0.2 s). The
+first run with the onnx backend exports the models, warmup blocks are
+not part of the result.
+
+Run from the repository root:
+    python -m benchmarks.rvc_rtf --model Samantha
+    python -m benchmarks.rvc_rtf --model Samantha --threads 1 2 4 --f0 rmvpe
+"""
+import argparse
+import time
+import os
+
+BLOCKS = 25
+WARMUP_BLOCKS = 3
+
+
+def voice_like(samples, rate):
+    import numpy as np
+
+    # harmonics of a gliding fundamental with a syllable rate envelope
+    t = np.arange(samples) / rate
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    audio = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    return (0.2 * audio * envelope).astype(np.float32)
+
+
+def measure(model, backend, threads, f0method):
+    import numpy as np
+    from lingu import cfg
+    from lingu.rvc.rvc import RealtimeRVCBase
+
+    model_path = cfg("rvc_model_path")
+    base = RealtimeRVCBase(
+        pth=os.path.join(model_path, model + ".pth"),
+        index=os.path.join(model_path, model + ".index"),
+        backend=backend,
+        onnx_threads=threads)
+    base.config.device = "cpu"
+    base.config.is_half = False
+    base.gui_config.f0method = f0method
+    base.start_vc()
+    if base.rvc.backend != backend:
+        return None
+
+    block_frame = base.block_frame
+    audio = voice_like(block_frame * (BLOCKS + WARMUP_BLOCKS),
+                       base.gui_config.samplerate)
+    out = np.zeros(block_frame, dtype=np.float32)
+
+    times = []
+    for i in range(BLOCKS + WARMUP_BLOCKS):
+        block = audio[i * block_frame:(i + 1) * block_frame]
+        start = time.perf_counter()
+        base.audio_callback(block, out, block_frame, None, None)
+        if i >= WARMUP_BLOCKS:
+            times.append(time.perf_counter() - start)
+
+    times.sort()
+    block_time = block_frame / base.gui_config.samplerate
+    return (sum(times) / len(times) / block_time,
+            times[int(len(times) * 0.95)] / block_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="Samantha")
+    parser.add_argument("--f0", default="rmvpe",
+                        choices=["rmvpe", "fcpe", "harvest", "pm"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+
+    runs = [("torch", None)] + [("onnx", t) for t in args.threads]
+    print(f"real-time factor on cpu, {args.f0} f0, "
+          f"{BLOCKS} blocks of 0.2 s (lower is better)")
+    for backend, threads in runs:
+        label = backend if threads is None else \
+            f"{backend} ({threads or 'auto'} threads)"
+        try:
+            result = measure(args.model, backend, threads, args.f0)
+        except ImportError as e:
+            print(f"  {label:<24} not installed ({e.name})")
+            continue
+        if result is None:
+            print(f"  {label:<24} not available")
+            continue
+        mean, p95 = result
+        print(f"  {label:<24} mean {mean:>6.3f}   p95 {p95:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmarks switching between RVC voices.
+
+Switches round-robin through the installed voices (models with .pth and
+.index in rvc_model_path) and prints the switch latency of cache misses
+(loading the synthesizer and index, HuBERT and RMVPE are shared) and hits,
+the voice cache statistics and the memory of each cached voice.
+
+Run from the repository root:
+    python -m benchmarks.rvc_switch
+    python -m benchmarks.rvc_switch --voices Samantha Joe --rounds 3
+"""
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voices", nargs="+", default=None)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        from lingu.rvc.rvc import RealtimeRVC
+    except ImportError as e:
+        print(f"skipped, {e}")
+        return
+
+    rvc = RealtimeRVC()
+    try:
+        voices = args.voices or rvc.get_models()
+        if len(voices) < 2:
+            print("needs at least two voices in rvc_model_path")
+            return
+
+        for round in range(args.rounds):
+            for name in voices:
+                start = time.perf_counter()
+                rvc.set_model(name)
+                elapsed = time.perf_counter() - start
+                print(f"  round {round + 1}  {name:<20} "
+                      f"{elapsed * 1000:>8.1f} ms")
+
+        stats = rvc.get_switch_stats()
+        print(f"\n{stats['switches']} switches")
+        for kind in ("loaded", "cached"):
+            if stats[f"{kind}_ms"] is not None:
+                print(f"  {kind:<7} mean {stats[f'{kind}_ms']:>8.1f} ms")
+        cache = stats["cache"]
+        print(f"  cache   {cache['voices']}, {cache['mb']:.1f} MB, "
+              f"{cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['evictions']} evictions")
+    finally:
+        rvc.shutdown()
+
+
+if __name__ == "__main__":
+    main()
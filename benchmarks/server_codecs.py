@@ -0,0 +1,105 @@
+"""
+Benchmarks the websocket audio codecs: CPU time against bandwidth.
+
+Encodes and decodes a speech-like test signal (harmonics of a gliding
+pitch with syllable envelope and noise) in chunks as the speech module
+sends them, per codec of handlers/codecs.py and for the half sample rate
+slow clients get. Prints the CPU time per second of audio, the bitrate and
+the signal to noise ratio of the decoded audio. Opus is skipped if opuslib
+or the opus library are not installed.
+
+Run from the repository root:
+    python -m benchmarks.server_codecs
+"""
+from lingu.modules.server.handlers.codecs import (
+    available_codecs, create_codec, CODECS)
+from lingu.modules.server.handlers.sessions import AudioBroadcast
+import numpy as np
+import time
+
+SECONDS = 10
+SAMPLERATE = 48000
+CHUNK_SAMPLES = 4096
+
+
+def speech_like(rate):
+    t = np.arange(SECONDS * rate) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    audio = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None) ** 2
+    noise = np.random.default_rng(0).standard_normal(len(t)) * 0.01
+    return (0.3 * audio * envelope + noise).astype(np.float32)
+
+
+def snr_db(reference, decoded):
+    length = min(len(reference), len(decoded))
+    reference = reference[:length]
+    error = reference - decoded[:length]
+    return 10 * np.log10(np.sum(reference ** 2) / max(np.sum(error ** 2),
+                                                      1e-20))
+
+
+def run(name, audio, reduced):
+    codec = create_codec(name)
+    chunks = [audio[i:i + CHUNK_SAMPLES]
+              for i in range(0, len(audio), CHUNK_SAMPLES)]
+    payload_bytes = 0
+    encode_time = 0.0
+    encoded = []
+    for seq, chunk in enumerate(chunks):
+        broadcast = AudioBroadcast(
+            seq, SAMPLERATE, chunk.tobytes(), end=seq == len(chunks) - 1)
+        start = time.process_time()
+        samples, rate = broadcast.samples(reduced)
+        payload, rate = codec.encode(samples, rate, broadcast.end)
+        encode_time += time.process_time() - start
+        payload_bytes += len(payload)
+        encoded.append((payload, rate))
+
+    decoder = create_codec(name)
+    start = time.process_time()
+    decoded = [decoder.decode(payload, rate) for payload, rate in encoded]
+    decode_time = time.process_time() - start
+
+    rate = decoded[0][1]
+    pcm = np.concatenate([samples for samples, _ in decoded])
+    pcm = pcm.astype(np.float32) / 32768
+    reference = audio if rate == SAMPLERATE else \
+        AudioBroadcast(0, SAMPLERATE, audio.tobytes()).samples(True)[0]
+    if name == "opus":
+        # skip the resampler and encoder delay
+        delay = np.argmax(np.correlate(
+            pcm[:rate], reference[:rate // 2], mode="valid"))
+        pcm = pcm[delay:]
+    return {
+        "kbit_s": payload_bytes * 8 / SECONDS / 1000,
+        "encode_ms": encode_time / SECONDS * 1000,
+        "decode_ms": decode_time / SECONDS * 1000,
+        "snr_db": snr_db(reference, pcm),
+    }
+
+
+def main():
+    audio = speech_like(SAMPLERATE)
+    available = available_codecs()
+    print(f"per second of {SAMPLERATE} Hz audio, {CHUNK_SAMPLES} sample "
+          "chunks")
+    print(f"  {'codec':<20} {'kbit/s':>8} {'encode':>10} {'decode':>10} "
+          f"{'snr':>8}")
+    for name in CODECS:
+        if name not in available:
+            print(f"  {name:<20} not installed")
+            continue
+        for reduced in (False, True):
+            if reduced and not CODECS[name].can_reduce:
+                continue
+            stats = run(name, audio, reduced)
+            label = f"{name} (half rate)" if reduced else name
+            print(f"  {label:<20} {stats['kbit_s']:>8.1f} "
+                  f"{stats['encode_ms']:>7.3f} ms {stats['decode_ms']:>7.3f}"
+                  f" ms {stats['snr_db']:>5.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
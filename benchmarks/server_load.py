@@ -0,0 +1,202 @@
+"""
+Load test of the server event loop with simulated clients.
+
+Starts a websocket server (without TLS) on localhost with the session
+registry, text bridge and loop lag monitor of the server module, connects
+simulated clients and feeds realtime text (one event per token, as the
+listen and brain modules trigger them) and speech audio from a producer
+thread. Compares sending every token right away with the 20 Hz text
+batching and prints the messages each client receives per second, the
+send lag and the event loop lag.
+
+Run from the repository root:
+    python -m benchmarks.server_load
+    python -m benchmarks.server_load --clients 16 --tokens 200
+"""
+import argparse
+import threading
+import asyncio
+import json
+import time
+
+SECONDS = 5
+PORT = 8765
+SAMPLERATE = 48000
+CHUNK_SAMPLES = 4096
+
+
+def producer(loop, registry, post_text, tokens_per_s, stop):
+    # realtime assistant text growing token by token, user text at half
+    # the rate and a final text every second, plus realtime speech audio
+    from lingu.modules.server.handlers.sessions import AudioBroadcast
+
+    chunk = bytes(CHUNK_SAMPLES * 4)
+    chunk_interval = CHUNK_SAMPLES / SAMPLERATE
+    token_interval = 1 / tokens_per_s
+    start = time.monotonic()
+    next_token = next_chunk = start
+    tokens = seq = 0
+    while not stop.is_set():
+        now = time.monotonic()
+        if now >= next_token:
+            tokens += 1
+            post_text("realtime_assistant", "token " * tokens, True)
+            if tokens % 2 == 0:
+                post_text("realtime_user", "word " * (tokens // 2), True)
+            if tokens % tokens_per_s == 0:
+                post_text("final_usertext", "word " * (tokens // 2), False)
+            next_token += token_interval
+        if now >= next_chunk:
+            loop.call_soon_threadsafe(
+                registry.broadcast_audio,
+                AudioBroadcast(seq, SAMPLERATE, chunk),
+                time.monotonic())
+            seq += 1
+            next_chunk += chunk_interval
+        time.sleep(max(0.0, min(next_token, next_chunk) - time.monotonic()))
+
+
+async def client(websockets, counts):
+    async with websockets.connect(f"ws://127.0.0.1:{PORT}") as websocket:
+        async for message in websocket:
+            if isinstance(message, bytes):
+                counts["audio"] += 1
+            else:
+                counts["text"] += 1
+            counts["bytes"] += len(message)
+
+
+def run_clients(websockets, client_counts, ready, stop):
+    async def main():
+        tasks = [asyncio.ensure_future(client(websockets, counts))
+                 for counts in client_counts]
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(main())
+
+
+def run(websockets, clients, tokens_per_s, batched):
+    from lingu.modules.server.handlers.sessions import SessionRegistry
+    from lingu.modules.server.handlers.event_bridge import (
+        EventBridge, LoopLagMonitor)
+
+    loop = asyncio.new_event_loop()
+    registry = SessionRegistry()
+    bridge = EventBridge(loop, registry.broadcast)
+    monitor = LoopLagMonitor()
+
+    if batched:
+        def post_text(kind, text, merge):
+            bridge.post(kind, json.dumps({"type": kind, "text": text}),
+                        merge)
+    else:
+        def post_text(kind, text, merge):
+            loop.call_soon_threadsafe(
+                registry.broadcast,
+                json.dumps({"type": kind, "text": text}),
+                time.monotonic())
+
+    async def handler(websocket, path):
+        session = registry.add(websocket)
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            registry.remove(session)
+
+    async def serve():
+        monitor.start()
+        return await websockets.serve(handler, "127.0.0.1", PORT)
+
+    server = loop.run_until_complete(serve())
+    server_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    server_thread.start()
+
+    client_counts = [{"text": 0, "audio": 0, "bytes": 0}
+                     for _ in range(clients)]
+    ready = threading.Event()
+    stop_clients = threading.Event()
+    client_thread = threading.Thread(
+        target=run_clients,
+        args=(websockets, client_counts, ready, stop_clients))
+    client_thread.start()
+    ready.wait()
+    while len(registry) < clients:
+        time.sleep(0.01)
+
+    stop_producer = threading.Event()
+    producer_thread = threading.Thread(
+        target=producer,
+        args=(loop, registry, post_text, tokens_per_s, stop_producer))
+    start_cpu = time.process_time()
+    producer_thread.start()
+    time.sleep(SECONDS)
+    stop_producer.set()
+    producer_thread.join()
+    cpu = time.process_time() - start_cpu
+    time.sleep(0.2)
+
+    session_stats = registry.get_stats()
+    lag = monitor.get_stats()
+    stop_clients.set()
+    client_thread.join()
+
+    async def shutdown():
+        monitor.stop()
+        server.close()
+        await server.wait_closed()
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    server_thread.join()
+    loop.close()
+
+    return {
+        "text_per_s": sum(c["text"] for c in client_counts)
+        / clients / SECONDS,
+        "audio_per_s": sum(c["audio"] for c in client_counts)
+        / clients / SECONDS,
+        "kbytes_per_s": sum(c["bytes"] for c in client_counts)
+        / clients / SECONDS / 1000,
+        "send_lag_ms": sum(s["lag_ms"] for s in session_stats)
+        / max(1, len(session_stats)),
+        "loop_lag": lag,
+        "cpu_percent": cpu / SECONDS * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=100,
+                        help="realtime text tokens per second")
+    args = parser.parse_args()
+
+    try:
+        import websockets
+    except ImportError as e:
+        print(f"skipped, {e}")
+        return
+
+    print(f"{args.clients} clients, {args.tokens} tokens/s, "
+          f"{SAMPLERATE // CHUNK_SAMPLES} audio frames/s, {SECONDS} s")
+    for name, batched in (("every token", False), ("20 Hz batches", True)):
+        stats = run(websockets, args.clients, args.tokens, batched)
+        lag = stats["loop_lag"]
+        print(f"\n{name}")
+        print(f"  per client   {stats['text_per_s']:>7.1f} text/s "
+              f"{stats['audio_per_s']:>6.1f} audio/s "
+              f"{stats['kbytes_per_s']:>8.1f} kB/s")
+        print(f"  send lag     {stats['send_lag_ms']:>7.2f} ms")
+        print(f"  loop lag     mean {lag['mean_ms']:.2f} ms, "
+              f"p95 {lag['p95_ms']:.2f} ms, max {lag['max_ms']:.2f} ms")
+        print(f"  process cpu  {stats['cpu_percent']:>6.1f} %")
+
+
+if __name__ == "__main__":
+    main()
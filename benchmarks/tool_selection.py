@@ -0,0 +1,77 @@
+"""
+Benchmarks tool selection latency against the number of keywords.
+
+Compares the former per-keyword regex scan in Tools.get_tools with the
+precompiled keyword patterns built when the language files are imported.
+
+Run from the repository root:
+    python -m benchmarks.tool_selection
+"""
+from lingu.core.tools import compile_keywords
+import random
+import string
+import timeit
+import re
+
+OBJECTS = 15
+REPEATS = 200
+USER_TEXT = "Hey Linguflex, could you please play some relaxing jazz " \
+            "music in the living room and dim the lights a little bit?"
+
+
+def random_keyword():
+    word = "".join(random.choices(string.ascii_lowercase, k=6))
+    return random.choice([word, word + "*", "*" + word + "*"])
+
+
+def select_per_keyword(keyword_lists, text):
+    selected = 0
+    for keywords in keyword_lists:
+        keywords_in_input = [
+            keyword for keyword in keywords
+            if re.search(
+                r"\b" + keyword.lower().replace("*", ".*") + r"\b",
+                text.lower()
+            )
+        ]
+        if keywords_in_input:
+            selected += 1
+    return selected
+
+
+def select_precompiled(patterns, text):
+    selected = 0
+    text_lower = text.lower()
+    for pattern in patterns:
+        if pattern.search(text_lower):
+            selected += 1
+    return selected
+
+
+def main():
+    random.seed(0)
+    print(f"{'keywords':>10} {'per keyword':>14} {'precompiled':>14}")
+    for keywords_per_object in [5, 10, 25, 50, 100]:
+        keyword_lists = [
+            [random_keyword() for _ in range(keywords_per_object)]
+            for _ in range(OBJECTS)
+        ]
+        patterns = [compile_keywords(k) for k in keyword_lists]
+
+        assert select_per_keyword(keyword_lists, USER_TEXT) == \
+            select_precompiled(patterns, USER_TEXT)
+
+        old = timeit.timeit(
+            lambda: select_per_keyword(keyword_lists, USER_TEXT),
+            number=REPEATS) / REPEATS
+        new = timeit.timeit(
+            lambda: select_precompiled(patterns, USER_TEXT),
+            number=REPEATS) / REPEATS
+
+        total_keywords = keywords_per_object * OBJECTS
+        print(f"{total_keywords:>10} {old * 1000:>11.3f} ms "
+              f"{new * 1000:>11.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ from lingu.core.test import Test  # noqa: F401
 from lingu.core.invokable import Invokable  # noqa: F401
 from lingu.core.populatable import Populatable  # noqa: F401
 from lingu.core.events import events  # noqa: F401
+from lingu.core.tracer import tracer  # noqa: F401
+from lingu.core.cache import ResultCache, make_key  # noqa: F401
+from lingu.core.resample import StreamResampler  # noqa: F401
 from lingu.core.prompt import prompt, Prompt  # noqa: F401
 from lingu.ui.ui import UI  # noqa: F401
 from lingu.ui.line import Line, VSpacer, SimpleLine, StretchLine  # noqa: F401
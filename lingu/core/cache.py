@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from .log import log
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+def make_key(*parts):
+    """
+    Builds a content addressed cache key.
+
+    Args:
+        *parts: JSON serializable parts identifying the result.
+
+    Returns:
+        str: SHA-256 hex digest of the parts.
+    """
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two tier cache for JSON serializable results.
+
+    Recently used entries are kept in an in-memory LRU. If a database
+    file is given, entries are also written to a SQLite table, so they
+    survive restarts. Both tiers expire entries after ttl seconds and
+    drop the least recently used entries when they are full.
+    """
+    def __init__(
+            self,
+            name,
+            max_entries=256,
+            ttl=0,
+            db_path=None,
+            max_db_entries=10000):
+        """
+        Args:
+            name (str): Name of the cache, used as SQLite table name.
+            max_entries (int): Maximum number of entries in memory.
+            ttl (float): Seconds until an entry expires, 0 = never.
+            db_path (str, optional): SQLite file of the disk tier,
+              None keeps the cache in memory only.
+            max_db_entries (int): Maximum number of entries on disk.
+        """
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_db_entries = max(1, max_db_entries)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} ("
+                "key TEXT PRIMARY KEY, value TEXT, "
+                "created REAL, accessed REAL)")
+            self.db.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_accessed "
+                f"ON {self.name} (accessed)")
+            self.db.commit()
+        except Exception as e:
+            log.err(f"  [cache] could not open {db_path}, "
+                    f"keeping {self.name} in memory only: {e}")
+            self.db = None
+
+    def _is_expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key):
+        """
+        Looks up a result, memory first, then disk.
+
+        Args:
+            key (str): The cache key (see make_key).
+
+        Returns:
+            tuple: (True, value) on a hit, (False, None) on a miss.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._is_expired(created, now):
+                    self.entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return True, json.loads(value)
+                del self.entries[key]
+                self.expired += 1
+
+            if self.db is not None:
+                row = self.db.execute(
+                    f"SELECT value, created FROM {self.name} WHERE key = ?",
+                    (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._is_expired(created, now):
+                        self.db.execute(
+                            f"UPDATE {self.name} SET accessed = ? "
+                            "WHERE key = ?", (now, key))
+                        self.db.commit()
+                        self._put_memory(key, created, value)
+                        self.disk_hits += 1
+                        return True, json.loads(value)
+                    self.db.execute(
+                        f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                    self.db.commit()
+                    self.expired += 1
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """
+        Stores a result in both tiers.
+
+        Args:
+            key (str): The cache key (see make_key).
+            value: JSON serializable result.
+        """
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self.lock:
+            self._put_memory(key, now, data)
+
+            if self.db is not None:
+                self.db.execute(
+                    f"INSERT OR REPLACE INTO {self.name} "
+                    "(key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, data, now, now))
+                self._prune_db(now)
+                self.db.commit()
+
+    def _put_memory(self, key, created, data):
+        self.entries[key] = (created, data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_db(self, now):
+        if self.ttl > 0:
+            self.db.execute(
+                f"DELETE FROM {self.name} WHERE created < ?",
+                (now - self.ttl,))
+        count = self.db.execute(
+            f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+        if count > self.max_db_entries:
+            self.db.execute(
+                f"DELETE FROM {self.name} WHERE key IN ("
+                f"SELECT key FROM {self.name} ORDER BY accessed LIMIT ?)",
+                (count - self.max_db_entries,))
+            self.evictions += count - self.max_db_entries
+
+    def clear(self):
+        """
+        Removes all entries from both tiers.
+        """
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute(f"DELETE FROM {self.name}")
+                self.db.commit()
+
+    def get_stats(self):
+        """
+        Returns hit and miss statistics.
+
+        Returns:
+            dict: Hits per tier, misses, hit rate, expired and
+              evicted entries and the number of entries in memory.
+        """
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "name": self.name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "memory_entries": len(self.entries),
+            }
@@ -1,15 +1,169 @@
-from collections import namedtuple
+from .profiling import EventProfiler, listener_name, PROFILING
+from collections import namedtuple, deque
+from .settings import cfg
+from .log import log
+import traceback
+import threading
+import time
 
 DEBUG = False
 
+ASYNC_LISTENERS = bool(cfg("events", "async_listeners", default=True))
+MAX_QUEUE_SIZE = int(cfg("events", "max_queue_size", default=256))
+
+EventListener = namedtuple(
+    'EventListener',
+    ['callback', 'allowed_trigger_module', 'priority', 'dispatcher'])
+
+
+class AsyncDispatcher:
+    """
+    Delivers events to a single listener on its own worker thread.
+
+    Events are delivered in the order they were triggered. A coalescing
+    dispatcher only keeps the newest pending event, which suits listeners
+    that always show the latest state (like the full assistant text).
+    If the queue is full the triggering thread waits (backpressure), which
+    is counted in the statistics.
+    """
+    def __init__(self, event_name, callback, profiler, coalesce=False,
+                 max_queue_size=MAX_QUEUE_SIZE):
+        """
+        Args:
+            event_name (str): The name of the event dispatched.
+            callback (Callable): The listener callback.
+            profiler (EventProfiler): Records the listener execution time.
+            coalesce (bool): Replace pending events by newer ones.
+            max_queue_size (int): Maximum number of pending events.
+        """
+        self.event_name = event_name
+        self.callback = callback
+        self.profiler = profiler
+        self.coalesce = coalesce
+        self.max_queue_size = max(1, max_queue_size)
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.worker = None
+
+        self.triggered = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.queue_time = 0.0
+
+    def put(self, args, kwargs):
+        """
+        Queues an event for delivery.
+
+        Args:
+            args (tuple): Positional arguments for the callback.
+            kwargs (dict): Keyword arguments for the callback.
+        """
+        with self.condition:
+            if self.worker is None:
+                self.worker = threading.Thread(
+                    target=self._worker,
+                    name=f"event_{self.event_name}",
+                    daemon=True)
+                self.worker.start()
+
+            self.triggered += 1
+
+            if self.coalesce and self.queue:
+                self.queue[-1] = (time.time(), args, kwargs)
+                self.coalesced += 1
+                return
+
+            if len(self.queue) >= self.max_queue_size:
+                self.blocked += 1
+                blocked_start = time.time()
+                while len(self.queue) >= self.max_queue_size:
+                    self.condition.wait()
+                self.blocked_time += time.time() - blocked_start
+
+            self.queue.append((time.time(), args, kwargs))
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify_all()
+
+    def _worker(self):
+        """
+        Calls the listener for every queued event.
+        """
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                queued_time, args, kwargs = self.queue.popleft()
+                self.condition.notify_all()
+
+            self.queue_time += time.time() - queued_time
+
+            try:
+                if self.profiler.enabled:
+                    start = time.perf_counter()
+                    self.callback(*args, **kwargs)
+                    self.profiler.record(
+                        self.event_name,
+                        self.callback,
+                        time.perf_counter() - start)
+                else:
+                    self.callback(*args, **kwargs)
+            except Exception as e:
+                self.errors += 1
+                log.err(f"  [events] error in async listener for "
+                        f"{self.event_name}: {str(e)}")
+                log.hgh(traceback.format_exc())
+
+            self.delivered += 1
+
+    def get_stats(self):
+        """
+        Returns the dispatch and backpressure statistics.
+
+        Returns:
+            dict: Statistics of this dispatcher.
+        """
+        with self.condition:
+            depth = len(self.queue)
+
+        return {
+            "event": self.event_name,
+            "listener": listener_name(self.callback),
+            "coalesce": self.coalesce,
+            "triggered": self.triggered,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_depth,
+            "blocked": self.blocked,
+            "blocked_time": self.blocked_time,
+            "avg_queue_time": self.queue_time / self.delivered
+            if self.delivered else 0.0,
+        }
+
 
 class EventManager:
     def __init__(self):
         # Dictionary to hold all event listeners, with the event name as the
         # key and a list of EventListener namedtuples as the value.
         self.event_listeners = {}
+        self.dispatchers = []
+        self.profiler = EventProfiler()
+        if PROFILING:
+            self.profiler.enable()
 
-    def add_listener(self, event_name, allowed_trigger_module, callback):
+    def add_listener(
+            self,
+            event_name,
+            allowed_trigger_module,
+            callback,
+            asynchronous=False,
+            coalesce=False,
+            priority=0):
         """
         Registers an event listener for a specific event.
 
@@ -19,15 +173,64 @@ class EventManager:
                 allowed to trigger this event.
             callback (Callable): The function to be called when the event is
                 triggered.
+            asynchronous (bool): Call the listener on its own worker thread
+                so it can not delay the triggering thread.
+            coalesce (bool): For asynchronous listeners only deliver the
+                newest pending event (for high-frequency events where only
+                the latest data matters).
+            priority (int): Listeners with higher priority are called first.
         """
         if event_name not in self.event_listeners:
             self.event_listeners[event_name] = []
 
-        EventListener = namedtuple(
-            'EventListener',
-            ['callback', 'allowed_trigger_module'])
-        self.event_listeners[event_name].append(
-            EventListener(callback, allowed_trigger_module))
+        dispatcher = None
+        if asynchronous and ASYNC_LISTENERS:
+            dispatcher = AsyncDispatcher(
+                event_name, callback, self.profiler, coalesce)
+            self.dispatchers.append(dispatcher)
+
+        listener = EventListener(
+            callback, allowed_trigger_module, priority, dispatcher)
+        # replace instead of sorting in place, a trigger may be iterating
+        # (stable sort keeps registration order for equal priorities)
+        self.event_listeners[event_name] = sorted(
+            self.event_listeners[event_name] + [listener],
+            key=lambda listener: -listener.priority)
+
+    def get_dispatch_stats(self):
+        """
+        Returns the statistics of all asynchronous listeners.
+
+        Returns:
+            List[dict]: Dispatch and backpressure statistics per listener.
+        """
+        return [dispatcher.get_stats() for dispatcher in self.dispatchers]
+
+    def get_profile_stats(self):
+        """
+        Returns the listener timing statistics collected while
+        profiling is enabled (see events.profiler.enable()).
+
+        Returns:
+            List[dict]: Call count, cumulative, p50 and p99 time
+              per (event, listener).
+        """
+        return self.profiler.get_stats()
+
+    def _call(self, event_name, listener, args, kwargs):
+        """
+        Calls a synchronous listener and records its execution time
+        if profiling is enabled.
+        """
+        if self.profiler.enabled:
+            start = time.perf_counter()
+            listener.callback(*args, **kwargs)
+            self.profiler.record(
+                event_name,
+                listener.callback,
+                time.perf_counter() - start)
+        else:
+            listener.callback(*args, **kwargs)
 
     def trigger(self, event_name, triggering_module, data=None):
         """
@@ -54,10 +257,11 @@ class EventManager:
 
                 if (triggering_module == listener.allowed_trigger_module or
                         listener.allowed_trigger_module == "*"):
-                    if data is None:
-                        listener.callback()
+                    args = () if data is None else (data,)
+                    if listener.dispatcher:
+                        listener.dispatcher.put(args, {})
                     else:
-                        listener.callback(data)
+                        self._call(event_name, listener, args, {})
 
     def trigger_with_params(self, event_name, triggering_module, **kwargs):
         """
@@ -76,7 +280,10 @@ class EventManager:
         if event_name in self.event_listeners:
             for listener in self.event_listeners[event_name]:
                 if triggering_module == listener.allowed_trigger_module:
-                    listener.callback(**kwargs)
+                    if listener.dispatcher:
+                        listener.dispatcher.put((), kwargs)
+                    else:
+                        self._call(event_name, listener, (), kwargs)
 
 
 events = EventManager()
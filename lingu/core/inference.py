@@ -1,3 +1,4 @@
+from .cache import ResultCache, make_key
 from openai import OpenAI
 from .log import log
 from .exc import exc
@@ -15,6 +16,12 @@ function_calling_model_name = cfg(
     "local_llm", "model_name",
     default="llama3.1:8b"))
 
+CACHE_ENABLED = bool(cfg("inference", "cache_enabled", default=True))
+CACHE_ENTRIES = int(cfg("inference", "cache_entries", default=256))
+CACHE_TTL = float(cfg("inference", "cache_ttl", default=604800))
+CACHE_FILE = cfg("inference", "cache_file", default="cache/inference.sqlite")
+CACHE_FILE_ENTRIES = int(cfg("inference", "cache_file_entries", default=10000))
+
 class InferenceManager:
     """
     Manages the inference process for various objects using
@@ -32,6 +39,15 @@ class InferenceManager:
         self.llama = None
         self.openai_instructor = None
         self.inference_allowed = True
+        self.schemas = {}
+        self.cache = None
+        if CACHE_ENABLED:
+            self.cache = ResultCache(
+                "inference",
+                max_entries=CACHE_ENTRIES,
+                ttl=CACHE_TTL,
+                db_path=CACHE_FILE,
+                max_db_entries=CACHE_FILE_ENTRIES)
 
         events.add_listener(
             "recording_start",
@@ -58,13 +74,15 @@ class InferenceManager:
             content=None,
             model="gpt-3.5-turbo-1106",
             abort_retries = 5,
-            sleep_retries = 3):
+            sleep_retries = 3,
+            use_cache=True):
 
         result = None
 
         retries = abort_retries
         while result is None:
-            result = self.inference(inference_object, prompt, content, model)
+            result = self.inference(
+                inference_object, prompt, content, model, use_cache)
             if result is not None or retries == 0:
                 return result
             time.sleep(sleep_retries)
@@ -90,14 +108,16 @@ class InferenceManager:
         """
         self.inference_allowed = allowed
 
-    def set_inference_objects(self, inference_objects):
+    def set_inference_objects(self, inference_objects, internal_inf_objs):
         """
         Set the inference objects to be managed.
 
         Args:
             inference_objects (list): A list of inference objects.
+            internal_inf_objs (dict): Internal inference objects by name.
         """
         self.inf_objs = inference_objects
+        self.internal_inf_objs = internal_inf_objs
 
     def set_instructor(self, instructor, llama):
         """
@@ -115,27 +135,76 @@ class InferenceManager:
             inference_object,
             prompt,
             content,
-            model="gpt-3.5-turbo-1106"):
+            model="gpt-3.5-turbo-1106",
+            use_cache=True):
         
         print (f"INFERENCE MODEL: {model}")
 
+        key = None
+        if use_cache and self.cache is not None:
+            key = self._cache_key(inference_object, prompt, content, model)
+            if key is not None:
+                hit, data = self.cache.get(key)
+                if hit:
+                    log.dbg(f"  [inference] cache hit for {inference_object}")
+                    return self._restore_result(inference_object, data)
+
         if model == "local":
-            return self._inference_local(
+            result = self._inference_local(
                 inference_object,
                 prompt,
                 content)
         elif model == "ollama":
-            return self._inference_ollama(
+            result = self._inference_ollama(
                 inference_object,
                 prompt,
                 content)
         else:
-            return self._inference_openai(
+            result = self._inference_openai(
                 inference_object,
                 prompt,
                 content,
                 model)
 
+        if key is not None and result is not None:
+            self.cache.put(key, result.model_dump(mode="json"))
+
+        return result
+
+    def _cache_key(self, inference_object, prompt, content, model):
+        """
+        Builds the cache key of an inference request from the schema of
+        the inference object, the prompt, the content and the model.
+
+        Returns:
+            str: The cache key, None if the inference object is unknown.
+        """
+        schema = self.schemas.get(inference_object)
+        if schema is None:
+            inf_obj = self.internal_inf_objs.get(inference_object)
+            if inf_obj is None:
+                return None
+            schema = inf_obj.instance.model_json_schema()
+            self.schemas[inference_object] = schema
+
+        if model in ("local", "ollama"):
+            model = function_calling_model_name
+
+        return make_key(schema, prompt, content, model)
+
+    def _restore_result(self, inference_object, data):
+        inf_obj = self.internal_inf_objs.get(inference_object)
+        return instructor.Partial[inf_obj.instance].model_validate(data)
+
+    def get_cache_stats(self):
+        """
+        Returns the hit and miss statistics of the inference cache.
+
+        Returns:
+            dict: Cache statistics, empty if the cache is disabled.
+        """
+        return self.cache.get_stats() if self.cache is not None else {}
+
     def _inference_ollama(self, inference_object, prompt, content):
         """
         Perform inference using the specified object, prompt, and content with Ollama model.
@@ -154,53 +223,53 @@ class InferenceManager:
         if not self.inference_allowed:
             return None
 
-        for inf_obj in self.inf_objs:
-            if inf_obj.name == inference_object and inf_obj.is_internal:
-
-                content_string = f"Content:\n```{content}```"
-                messages = [{"role": "user", "content": prompt}]
-                messages.append({"role": "user", "content": content_string})
-
-                try:
-                    inf_obj.module["state"] = "executing"
-
-                    log.dbg("  [inference] calling Ollama with messages " f"{messages}")
-                    events.trigger("inference_start", "inference")
-                    extraction_stream = self.instructor(
-                        model=function_calling_model_name,
-                        response_model=instructor.Partial[inf_obj.instance],
-                        max_retries=MAX_RETRY,
-                        messages=messages,
-                        temperature=0,
-                        max_tokens=1000,
-                        stream=True,
-                    )
-                    log.dbg("  [inference] perform extraction")
-                    inf_obj.module["state"] = "normal"
-
-                    print("  [inference] extracting ", end="", flush=True)
-                    inference_started = False
+        inf_obj = self.internal_inf_objs.get(inference_object)
+        if inf_obj is None:
+            raise Exception("Could not find inference object "
+                            f"{inference_object}")
+
+        content_string = f"Content:\n```{content}```"
+        messages = [{"role": "user", "content": prompt}]
+        messages.append({"role": "user", "content": content_string})
+
+        try:
+            inf_obj.module["state"] = "executing"
+
+            log.dbg("  [inference] calling Ollama with messages " f"{messages}")
+            events.trigger("inference_start", "inference")
+            extraction_stream = self.instructor(
+                model=function_calling_model_name,
+                response_model=instructor.Partial[inf_obj.instance],
+                max_retries=MAX_RETRY,
+                messages=messages,
+                temperature=0,
+                max_tokens=1000,
+                stream=True,
+            )
+            log.dbg("  [inference] perform extraction")
+            inf_obj.module["state"] = "normal"
+
+            print("  [inference] extracting ", end="", flush=True)
+            inference_started = False
+            final_extraction = None
+            for extraction in extraction_stream:
+                if not inference_started:
+                    events.trigger("inference_processing", "inference")
+                inference_started = True
+                if not self.inference_allowed:
+                    log.inf("  [inference] Ollama inference stopped " "(maybe due to recording start event).")
                     final_extraction = None
-                    for extraction in extraction_stream:
-                        if not inference_started:
-                            events.trigger("inference_processing", "inference")
-                        inference_started = True
-                        if not self.inference_allowed:
-                            log.inf("  [inference] Ollama inference stopped " "(maybe due to recording start event).")
-                            final_extraction = None
-                            break
-                        final_extraction = extraction
-                        print(".", end="", flush=True)
-
-                    events.trigger("inference_end", "inference")
-                    print("\n  [inference] extraction done")
-                    return final_extraction
-                except Exception as e:
-                    log.err("  [inference] error performing Ollama inference " f"{inf_obj.instance}: {e}")
-                    exc(e)
-                    raise e
-
-        raise Exception(f"Could not find inference object {inference_object}")
+                    break
+                final_extraction = extraction
+                print(".", end="", flush=True)
+
+            events.trigger("inference_end", "inference")
+            print("\n  [inference] extraction done")
+            return final_extraction
+        except Exception as e:
+            log.err("  [inference] error performing Ollama inference " f"{inf_obj.instance}: {e}")
+            exc(e)
+            raise e
 
     def _inference_local(
             self,
@@ -225,57 +294,57 @@ class InferenceManager:
         if not self.inference_allowed:
             return None
 
-        for inf_obj in self.inf_objs:
-            if inf_obj.name == inference_object and inf_obj.is_internal:
-
-                content_string = f"Content:\n```{content}```"
-                messages = [{"role": "user", "content": prompt}]
-                messages.append({"role": "user", "content": content_string})
-
-                try:
-                    inf_obj.module["state"] = "executing"
-
-                    log.dbg("  [inference] calling local with messages "
-                            f"{messages}")
-                    events.trigger("inference_start", "inference")
-                    extraction_stream = self.instructor(
-                        response_model=instructor.Partial[inf_obj.instance],
-                        max_retries=MAX_RETRY,
-                        messages=messages,
-                        temperature=0,
-                        max_tokens=1000,
-                        stream=True,
-                    )
-                    log.dbg("  [inference] perform extraction")
-                    inf_obj.module["state"] = "normal"
-
-                    # obj = None
+        inf_obj = self.internal_inf_objs.get(inference_object)
+        if inf_obj is None:
+            raise Exception("Could not find inference object "
+                            f"{inference_object}")
+
+        content_string = f"Content:\n```{content}```"
+        messages = [{"role": "user", "content": prompt}]
+        messages.append({"role": "user", "content": content_string})
+
+        try:
+            inf_obj.module["state"] = "executing"
+
+            log.dbg("  [inference] calling local with messages "
+                    f"{messages}")
+            events.trigger("inference_start", "inference")
+            extraction_stream = self.instructor(
+                response_model=instructor.Partial[inf_obj.instance],
+                max_retries=MAX_RETRY,
+                messages=messages,
+                temperature=0,
+                max_tokens=1000,
+                stream=True,
+            )
+            log.dbg("  [inference] perform extraction")
+            inf_obj.module["state"] = "normal"
+
+            # obj = None
+            final_extraction = None
+
+            print("  [inference] extracting ", end="", flush=True)
+            inference_started = False
+            for extraction in extraction_stream:
+                if not inference_started:
+                    events.trigger("inference_processing", "inference")
+                inference_started = True
+                if not self.inference_allowed:
+                    log.inf("  [inference] local inference stopped "
+                            "(maybe due to recording start event).")
                     final_extraction = None
-
-                    print("  [inference] extracting ", end="", flush=True)
-                    inference_started = False
-                    for extraction in extraction_stream:
-                        if not inference_started:
-                            events.trigger("inference_processing", "inference")
-                        inference_started = True
-                        if not self.inference_allowed:
-                            log.inf("  [inference] local inference stopped "
-                                    "(maybe due to recording start event).")
-                            final_extraction = None
-                            break
-                        final_extraction = extraction
-                        print(".", end="", flush=True)
-
-                    events.trigger("inference_end", "inference")
-                    print("\n  [inference] extraction done")
-                    return final_extraction
-                except Exception as e:
-                    log.err("  [inference] error performing local inference "
-                            f"{inf_obj.instance}: {e}")
-                    exc(e)
-                    raise e
-
-        raise Exception(f"Could not find inference object {inference_object}")
+                    break
+                final_extraction = extraction
+                print(".", end="", flush=True)
+
+            events.trigger("inference_end", "inference")
+            print("\n  [inference] extraction done")
+            return final_extraction
+        except Exception as e:
+            log.err("  [inference] error performing local inference "
+                    f"{inf_obj.instance}: {e}")
+            exc(e)
+            raise e
 
     def verify_openai_client(self):
         if not self.openai_instructor:
@@ -308,55 +377,57 @@ class InferenceManager:
 
         self.verify_openai_client()
 
-        for inf_obj in self.inf_objs:
-            if inf_obj.name == inference_object and inf_obj.is_internal:
-
-                content_string = f"Content:\n```{content}```"
-                messages = [{"role": "user", "content": prompt}]
-                messages.append({"role": "user", "content": content_string})
-
-                try:
-                    inf_obj.module["state"] = "executing"
-
-                    log.dbg("  [inference] calling openai with messages "
-                            f"{messages}")
-                    events.trigger("inference_start", "inference")
-                    extraction_stream = self.openai_instructor(
-                        model=model,
-                        response_model=instructor.Partial[inf_obj.instance],
-                        max_retries=MAX_RETRY,
-                        messages=messages,
-                        temperature=0,
-                        max_tokens=1000,
-                        stream=True,
-                    )
-                    log.dbg("  [inference] perform extraction")
-                    inf_obj.module["state"] = "normal"
-
-                    # obj = None
+        inf_obj = self.internal_inf_objs.get(inference_object)
+        if inf_obj is None:
+            raise Exception("Could not find inference object "
+                            f"{inference_object}")
+
+        content_string = f"Content:\n```{content}```"
+        messages = [{"role": "user", "content": prompt}]
+        messages.append({"role": "user", "content": content_string})
+
+        try:
+            inf_obj.module["state"] = "executing"
+
+            log.dbg("  [inference] calling openai with messages "
+                    f"{messages}")
+            events.trigger("inference_start", "inference")
+            extraction_stream = self.openai_instructor(
+                model=model,
+                response_model=instructor.Partial[inf_obj.instance],
+                max_retries=MAX_RETRY,
+                messages=messages,
+                temperature=0,
+                max_tokens=1000,
+                stream=True,
+            )
+            log.dbg("  [inference] perform extraction")
+            inf_obj.module["state"] = "normal"
+
+            # obj = None
+            final_extraction = None
+
+            print("  [inference] extracting ", end="", flush=True)
+            inference_started = False
+            for extraction in extraction_stream:
+                if not inference_started:
+                    events.trigger("inference_processing", "inference")
+                inference_started = True
+                if not self.inference_allowed:
+                    log.inf("  [inference] local inference stopped "
+                            "(maybe due to recording start event).")
                     final_extraction = None
-
-                    print("  [inference] extracting ", end="", flush=True)
-                    inference_started = False
-                    for extraction in extraction_stream:
-                        if not inference_started:
-                            events.trigger("inference_processing", "inference")
-                        inference_started = True
-                        if not self.inference_allowed:
-                            log.inf("  [inference] local inference stopped "
-                                    "(maybe due to recording start event).")
-                            final_extraction = None
-                            break
-                        final_extraction = extraction
-                        # obj = extraction.model_dump()
-                        # log.dbg(f"  [inference] streaming result: {obj}")
-                        print(".", end="", flush=True)
-
-                    events.trigger("inference_end", "inference")
-                    print("\n  [inference] extraction done")
-                    return final_extraction
-                except Exception as e:
-                    log.err("  [inference] error performing local inference "
-                            f"{inf_obj.instance}: {e}")
-                    exc(e)
-                    raise e
+                    break
+                final_extraction = extraction
+                # obj = extraction.model_dump()
+                # log.dbg(f"  [inference] streaming result: {obj}")
+                print(".", end="", flush=True)
+
+            events.trigger("inference_end", "inference")
+            print("\n  [inference] extraction done")
+            return final_extraction
+        except Exception as e:
+            log.err("  [inference] error performing local inference "
+                    f"{inf_obj.instance}: {e}")
+            exc(e)
+            raise e
\ No newline at end of file
@@ -86,7 +86,9 @@ class Lingu:
         self.ui.set_symbols_ready()
         self.modules.set_ready_event()
         self.modules.post_init_processing()
-        self.tools = Tools(self.modules.get_inference_objects())
+        self.tools = Tools(
+            self.modules.get_inference_objects(),
+            self.modules.inf_objs_by_name)
 
         self.main_worker = threading.Thread(
             target=self._main_worker
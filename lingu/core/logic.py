@@ -24,7 +24,8 @@ class Logic:
             inference_object,
             prompt,
             content,
-            model="gpt-3.5-turbo-1106"):
+            model="gpt-3.5-turbo-1106",
+            use_cache=True):
         """
         Inference logic.
 
@@ -33,12 +34,14 @@ class Logic:
             prompt: The prompt to use for inference.
             content: The content to analyze or process.
             model: The model to use for inference.
+            use_cache: Return a cached result for identical requests.
         """
         return self.inference_manager.inference(
             inference_object,
             prompt,
             content,
-            model)
+            model,
+            use_cache)
 
 
     def inference_safe(
@@ -47,7 +50,8 @@ class Logic:
             prompt,
             content=None,
             model="gpt-3.5-turbo-1106",
-            abort_retries = 5):
+            abort_retries = 5,
+            use_cache=True):
         """
         Inference logic but guarantees return at the price of being slow.
 
@@ -56,13 +60,15 @@ class Logic:
             prompt: The prompt to use for inference.
             content: The content to analyze or process.
             model: The model to use for inference.
+            use_cache: Return a cached result for identical requests.
         """
         return self.inference_manager.inference_safe(
             inference_object,
             prompt,
             content,
             model,
-            abort_retries)
+            abort_retries,
+            use_cache=use_cache)
 
     def llm(self, **kwargs):
         return self.inference_manager.llm(**kwargs)
@@ -75,7 +81,8 @@ class Logic:
             self,
             event_name: str,
             trigger_module_name: str,
-            callback
+            callback,
+            **kwargs
     ):
         """Registers a callback for a specified event.
 
@@ -84,8 +91,10 @@ class Logic:
             trigger_module_name (str): The name of the module triggering
               the event.
             callback: The function to call when the event is triggered.
+            **kwargs: Dispatch options (asynchronous, coalesce, priority).
         """
-        events.add_listener(event_name, trigger_module_name, callback)
+        events.add_listener(
+            event_name, trigger_module_name, callback, **kwargs)
 
     def trigger(self, event_name: str, data=None):
         """Triggers an event with optional data.
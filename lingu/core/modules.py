@@ -2,6 +2,7 @@ from .repeat import import_repeat_functions
 from .inference import InferenceManager
 from .populatable import Populatable
 from .invokable import Invokable
+from .tools import compile_keywords
 from .settings import cfg
 from .state import State
 from .test import Test
@@ -37,6 +38,8 @@ class InferenceObject():
         schema (dict): Schema related to the OpenAI API.
         is_internal (bool): Flag indicating if object is internal.
         execute_count (int): Counter for the number of executions.
+        keyword_pattern (re.Pattern): Compiled keywords used for tool
+          selection, None if the object has no keywords.
     """
     def __init__(self, name=None, instance=None, module=None):
         self.name = name
@@ -49,6 +52,7 @@ class InferenceObject():
         self.module = module
         self.is_internal = False
         self.execute_count = 0
+        self.keyword_pattern = None
 
 
 class Modules:
@@ -60,6 +64,9 @@ class Modules:
         all (dict): Dictionary of all modules.
         populatables (list): List of populatable modules.
         invokables (list): List of invokable modules.
+        inf_objs_by_name (dict): Inference objects by name.
+        internal_inf_objs_by_name (dict): Internal inference objects
+          by name.
         inference_manager (InferenceManager): Manager for inference operations.
     """
     def __init__(self):
@@ -67,6 +74,8 @@ class Modules:
         self.populatables = []
         self.invokables = []
         self.tests = []
+        self.inf_objs_by_name = {}
+        self.internal_inf_objs_by_name = {}
         self.inference_manager = InferenceManager()
 
     def import_file(self, py_file: str, folder: str, module: dict):
@@ -257,6 +266,9 @@ class Modules:
                                     value = module["lang"][inf_obj.name][key]
                                     inf_obj.language_info[key] = value
 
+                        inf_obj.keyword_pattern = compile_keywords(
+                            inf_obj.language_info.get("keywords"))
+
                 except Exception as e:
                     log.err("error occurred reading module file "
                             f"{language_file_name}: {str(e)}")
@@ -271,6 +283,21 @@ class Modules:
         """
         return self.invokables + self.populatables
 
+    def build_inference_registry(self):
+        """
+        Builds the name lookup tables for all inference objects, so tool
+        dispatch does not need to scan the full list.
+        If names collide, the first object wins like in a linear scan.
+        """
+        self.inf_objs_by_name = {}
+        self.internal_inf_objs_by_name = {}
+
+        for inf_obj in self.get_inference_objects():
+            self.inf_objs_by_name.setdefault(inf_obj.name, inf_obj)
+            if inf_obj.is_internal:
+                self.internal_inf_objs_by_name.setdefault(
+                    inf_obj.name, inf_obj)
+
     def get_module_folders(
             self,
             module_path: str,
@@ -357,8 +384,10 @@ class Modules:
             if "logic" in module:
                 module["logic"].server_ready_event.set()
 
+        self.build_inference_registry()
         self.inference_manager.set_inference_objects(
-            self.get_inference_objects())
+            self.get_inference_objects(),
+            self.internal_inf_objs_by_name)
 
     def post_init_processing(self):
         """
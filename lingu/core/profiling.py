@@ -0,0 +1,172 @@
+from .log import log, LOG_DIR, LOG_FILE_DATETIME
+from collections import deque
+from .settings import cfg
+import threading
+import json
+import time
+import os
+
+PROFILING = bool(cfg("events", "profiling", default=False))
+DUMP_INTERVAL = float(cfg("events", "profiling_dump_interval", default=60))
+MAX_SAMPLES = 1000
+
+
+def listener_name(callback):
+    """
+    Returns a readable name for a listener callback.
+
+    Args:
+        callback (Callable): The listener callback.
+
+    Returns:
+        str: Qualified name of the callback.
+    """
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+class ListenerProfile:
+    """
+    Timing statistics of one listener for one event.
+
+    Percentiles are computed from the most recent samples only,
+    counts and cumulative time cover the whole profiling run.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def record(self, duration):
+        self.count += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+        self.samples.append(duration)
+
+    def percentile(self, samples, fraction):
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(fraction * len(samples)))
+        return samples[index]
+
+    def get_stats(self):
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total_time": self.total_time,
+            "avg_time": self.total_time / self.count if self.count else 0.0,
+            "p50": self.percentile(samples, 0.5),
+            "p99": self.percentile(samples, 0.99),
+            "max_time": self.max_time,
+        }
+
+
+class EventProfiler:
+    """
+    Records call counts and latencies per (event, listener).
+
+    When disabled, the event manager only pays for checking
+    the enabled flag.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.dump_interval = DUMP_INTERVAL
+        self.dump_thread = None
+        self.dump_file_path = os.path.join(
+            LOG_DIR, f"event_profile_{LOG_FILE_DATETIME}.json")
+
+    def enable(self, dump_interval=None):
+        """
+        Starts profiling and the periodic dump to the logs directory.
+
+        Args:
+            dump_interval (float, optional): Seconds between dumps,
+              0 disables the periodic dump.
+        """
+        if dump_interval is not None:
+            self.dump_interval = dump_interval
+        self.enabled = True
+
+        if self.dump_interval > 0 and self.dump_thread is None:
+            self.dump_thread = threading.Thread(
+                target=self._dump_worker,
+                daemon=True)
+            self.dump_thread.start()
+
+    def disable(self):
+        """
+        Stops profiling. Collected statistics are kept.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Clears all collected statistics.
+        """
+        with self.lock:
+            self.profiles = {}
+            self.start_time = time.time()
+
+    def record(self, event_name, callback, duration):
+        """
+        Records the duration of a single listener call.
+
+        Args:
+            event_name (str): The name of the triggered event.
+            callback (Callable): The listener callback.
+            duration (float): Execution time in seconds.
+        """
+        key = (event_name, listener_name(callback))
+        with self.lock:
+            profile = self.profiles.get(key)
+            if profile is None:
+                profile = self.profiles[key] = ListenerProfile()
+            profile.record(duration)
+
+    def get_stats(self):
+        """
+        Returns the statistics of all profiled listeners,
+        slowest cumulative time first.
+
+        Returns:
+            List[dict]: Statistics per (event, listener).
+        """
+        with self.lock:
+            stats = []
+            for (event_name, name), profile in self.profiles.items():
+                entry = {"event": event_name, "listener": name}
+                entry.update(profile.get_stats())
+                stats.append(entry)
+
+        stats.sort(key=lambda entry: entry["total_time"], reverse=True)
+        return stats
+
+    def dump(self, file_path=None):
+        """
+        Writes the current statistics as JSON.
+
+        Args:
+            file_path (str, optional): Target file, defaults to
+              an event profile file in the logs directory.
+        """
+        file_path = file_path or self.dump_file_path
+        data = {
+            "duration": time.time() - self.start_time,
+            "listeners": self.get_stats(),
+        }
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    def _dump_worker(self):
+        while True:
+            time.sleep(self.dump_interval)
+            if not self.enabled:
+                continue
+            try:
+                self.dump()
+            except Exception as e:
+                log.err(f"  [events] error writing event profile: {str(e)}")
@@ -128,11 +128,27 @@ class Prompt():
         """
         return self.build_prompt()
 
-    def system_prompt(self):
+    def datetime_prompt(self):
+        """
+        Returns the current date and time, including the day of the week.
+
+        Returns:
+            str: The date and time line of the system prompt.
+        """
+        current_datetime = datetime.datetime.now()
+        formatted_datetime = current_datetime.strftime("%A, %Y-%m-%d %H:%M:%S")
+        return f"Current date and time: {formatted_datetime}"
+
+    def system_prompt(self, include_datetime=True):
         """
         Constructs and returns the system prompt string with the current date,
         including the day of the week.
 
+        Args:
+            include_datetime (bool): If False, the date and time are left
+              out, so the system prompt stays identical between requests
+              and can be reused from the model's prefix cache.
+
         Returns:
             str: The system prompt with the current date
               and day of the week appended.
@@ -140,18 +156,16 @@ class Prompt():
         # Retrieve the existing prompt content, if any.
         prompt_content = self.get() if self.get() else ""
 
+        if not include_datetime:
+            return prompt_content
+
         # Append a newline for formatting, if the prompt has content.
         if prompt_content:
             prompt_content += "\n\n"
 
-        # Get the current date, day, and time
-        current_datetime = datetime.datetime.now()
-        formatted_datetime = current_datetime.strftime("%A, %Y-%m-%d %H:%M:%S")
-
         # Construct the prompt content
-        prompt_content += f"Current date and time: {formatted_datetime}"
+        prompt_content += self.datetime_prompt()
 
         return prompt_content
 
-
 prompt = Prompt()
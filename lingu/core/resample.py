@@ -0,0 +1,218 @@
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin
+from functools import lru_cache
+from math import gcd
+import numpy as np
+
+# zero crossings of the windowed sinc on each side of the filter center,
+# higher values give a steeper lowpass at the cost of cpu time
+HALF_WIDTH = 16
+KAISER_BETA = 8.6
+ROLLOFF = 0.94
+# rate pairs with more phases use a gathered einsum instead of one
+# matrix vector product per phase
+MAX_STRIDED_PHASES = 16
+
+
+@lru_cache(maxsize=None)
+def design_polyphase_filter(up, down, half_width=HALF_WIDTH):
+    """
+    Designs the anti-aliasing lowpass for a rational rate change and
+    splits it into its polyphase components.
+
+    Args:
+        up (int): Upsampling factor.
+        down (int): Downsampling factor.
+        half_width (int): Filter taps per phase on each side of the center.
+
+    Returns:
+        tuple: (phases, delay) with phases of shape (up, taps_per_phase),
+          each row reversed so it can be applied to input samples in
+          ascending order, and the filter delay in upsampled samples.
+    """
+    max_rate = max(up, down)
+    num_taps = 2 * half_width * max_rate + 1
+    taps = firwin(
+        num_taps,
+        ROLLOFF / max_rate,
+        window=("kaiser", KAISER_BETA)) * up
+
+    taps_per_phase = -(-num_taps // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:num_taps] = taps
+
+    # phase p holds taps p, p + up, p + 2 * up, ...
+    phases = padded.reshape(taps_per_phase, up).T[:, ::-1]
+    return np.ascontiguousarray(phases, dtype=np.float32), num_taps // 2
+
+
+class StreamResampler:
+    """
+    Streaming polyphase resampler for mono audio.
+
+    Chunks of any size are resampled as if they were one continuous signal:
+    the input samples the filter still needs are carried over to the next
+    chunk, so there are no clicks at chunk boundaries. The filter is
+    designed once per rate pair. Output is held back by about half the
+    filter length (below a millisecond), flush() returns it at the end
+    of a stream.
+    """
+    def __init__(
+            self,
+            input_rate,
+            output_rate,
+            dtype_in=np.float32,
+            dtype_out=np.float32):
+        """
+        Args:
+            input_rate (int): Sample rate of the fed audio.
+            output_rate (int): Sample rate of the returned audio.
+            dtype_in: np.int16 or np.float32 (-1.0 to 1.0).
+            dtype_out: np.int16 or np.float32 (-1.0 to 1.0).
+        """
+        self.dtype_in = np.dtype(dtype_in)
+        self.dtype_out = np.dtype(dtype_out)
+        self.input_rate = None
+        self.output_rate = None
+        self.set_rates(input_rate, output_rate)
+
+    def set_rates(self, input_rate, output_rate):
+        """
+        Changes the sample rates. Resets the stream if they differ from
+        the current ones, otherwise does nothing.
+
+        Args:
+            input_rate (int): Sample rate of the fed audio.
+            output_rate (int): Sample rate of the returned audio.
+        """
+        input_rate = int(input_rate)
+        output_rate = int(output_rate)
+        if input_rate == self.input_rate and output_rate == self.output_rate:
+            return
+
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        divisor = gcd(input_rate, output_rate)
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self.phases, self.delay = design_polyphase_filter(self.up, self.down)
+        self.taps_per_phase = self.phases.shape[1]
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new stream, discarding carried over samples.
+        """
+        # input samples before the stream start count as silence
+        self.buffer = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self.buffer_start = -(self.taps_per_phase - 1)
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def _to_float(self, chunk):
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = np.frombuffer(chunk, dtype=self.dtype_in)
+        if self.dtype_in == np.int16:
+            return chunk.astype(np.float32) / 32768.0
+        return chunk.astype(np.float32, copy=False)
+
+    def _from_float(self, audio):
+        if self.dtype_out == np.int16:
+            return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        return audio
+
+    def _compute(self, end):
+        """
+        Computes the output samples up to (excluding) index end.
+        """
+        count = end - self.samples_out
+        if count <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        positions = np.arange(
+            self.samples_out, end, dtype=np.int64) * self.down + self.delay
+        last_inputs = positions // self.up
+        phase_indices = positions - last_inputs * self.up
+
+        windows = sliding_window_view(self.buffer, self.taps_per_phase)
+        starts = last_inputs - (self.taps_per_phase - 1) - self.buffer_start
+
+        if self.up <= MAX_STRIDED_PHASES:
+            # the phase repeats every up output samples while the window
+            # moves on by down input samples, so every phase is a matrix
+            # vector product over a strided view (no gather needed)
+            audio = np.empty(count, dtype=np.float32)
+            for offset in range(min(self.up, count)):
+                rows = windows[starts[offset]::self.down][
+                    :len(range(offset, count, self.up))]
+                audio[offset::self.up] = rows @ \
+                    self.phases[phase_indices[offset]]
+        else:
+            audio = np.einsum(
+                "ij,ij->i",
+                windows[starts],
+                self.phases[phase_indices])
+        self.samples_out = end
+
+        # keep the input samples needed by the next output sample
+        next_position = end * self.down + self.delay
+        keep_from = next_position // self.up - (self.taps_per_phase - 1)
+        drop = min(keep_from - self.buffer_start, len(self.buffer))
+        if drop > 0:
+            self.buffer = self.buffer[drop:]
+            self.buffer_start += drop
+
+        return audio.astype(np.float32, copy=False)
+
+    def process(self, chunk):
+        """
+        Resamples the next chunk of the stream.
+
+        Args:
+            chunk (bytes or np.ndarray): Audio in dtype_in.
+
+        Returns:
+            np.ndarray: Resampled audio in dtype_out.
+        """
+        audio = self._to_float(chunk)
+
+        if self.up == self.down:
+            return self._from_float(audio)
+
+        self.buffer = np.concatenate((self.buffer, audio))
+        self.samples_in += len(audio)
+
+        # output samples whose filter window is covered by the input
+        end = ((self.samples_in - 1) * self.up - self.delay) // self.down + 1
+        return self._from_float(self._compute(max(end, self.samples_out)))
+
+    def flush(self):
+        """
+        Returns the samples held back at the end of the stream and
+        resets the resampler for the next stream.
+
+        Returns:
+            np.ndarray: Remaining resampled audio in dtype_out.
+        """
+        if self.up == self.down:
+            return self._from_float(np.zeros(0, dtype=np.float32))
+
+        end = -(-self.samples_in * self.up // self.down)
+        padding = np.zeros(self.taps_per_phase, dtype=np.float32)
+        self.buffer = np.concatenate((self.buffer, padding))
+        audio = self._compute(end)
+        self.reset()
+        return self._from_float(audio)
+
+    def resample(self, audio):
+        """
+        Resamples a complete signal in one go (process and flush).
+
+        Args:
+            audio (bytes or np.ndarray): Audio in dtype_in.
+
+        Returns:
+            np.ndarray: Resampled audio in dtype_out.
+        """
+        self.reset()
+        return np.concatenate((self.process(audio), self.flush()))
@@ -1,4 +1,5 @@
 from .events import events
+from .tracer import tracer
 from .prompt import Prompt
 from .exc import exc
 from .log import log
@@ -9,21 +10,48 @@ import re
 called_tool_messages = int(cfg("called_tool_messages", default="1"))
 
 
+def compile_keywords(keywords):
+    """
+    Compiles the keywords of an inference object into a single pattern.
+
+    Each keyword follows the language file syntax, where "*" is a wildcard.
+    The resulting alternation matches if any one of the keywords would have
+    matched on its own, so tool selection needs one search per inference
+    object instead of one per keyword.
+
+    Args:
+        keywords (List[str]): Keywords from the language file.
+
+    Returns:
+        re.Pattern: The compiled pattern or None if there are no keywords.
+    """
+    if not keywords:
+        return None
+
+    alternatives = "|".join(
+        keyword.lower().replace("*", ".*") for keyword in keywords
+    )
+    return re.compile(r"\b(?:" + alternatives + r")\b")
+
+
 class Tools:
     """
     Handles LLM Tool calling
     """
 
-    def __init__(self, inf_objs):
+    def __init__(self, inf_objs, inf_objs_by_name):
         """
         Initialize the Tools instance.
 
         Args:
             inf_objs (List): A list of inference objects available
               for execution.
+            inf_objs_by_name (Dict): The same inference objects
+              keyed by name.
         """
         self.prompt = Prompt("")
         self.inf_objs = inf_objs
+        self.inf_objs_by_name = inf_objs_by_name
         self.executed_tools = []
 
         events.add_listener(
@@ -53,10 +81,7 @@ class Tools:
         Returns:
             Dict: The tool information.
         """
-        for inf_obj in self.inf_objs:
-            if inf_obj.name == name:
-                return inf_obj
-        return None
+        return self.inf_objs_by_name.get(name)
 
     def execute_tool(self, tool):
         """
@@ -73,83 +98,82 @@ class Tools:
         return_value = "fail, reason: tool not found"
         tool["executed"] = False
 
-        for inf_obj in self.inf_objs:
-            log.inf(f"  comparing {inf_obj.name} to tool {tool['name']}")
-            if inf_obj.name == tool["name"]:
-
-                log.dbg(f"  found tool {inf_obj.name}")
-
-                if inf_obj.is_invokable:
-                    inf_obj.execute_count = called_tool_messages
-                    inf_obj.module["state"] = "executing"
-                    execute = inf_obj.info_dict["execution"]
-                    args = tool["arguments"]
-                    try:
-                        events.trigger_with_params(
-                            event_name="function_call",
-                            triggering_module="brain",
-                            tool=tool,
-                            inf_obj=inf_obj
+        inf_obj = self.inf_objs_by_name.get(tool["name"])
+
+        if inf_obj is not None:
+
+            log.dbg(f"  found tool {inf_obj.name}")
+
+            if inf_obj.is_invokable:
+                inf_obj.execute_count = called_tool_messages
+                inf_obj.module["state"] = "executing"
+                execute = inf_obj.info_dict["execution"]
+                args = tool["arguments"]
+                try:
+                    events.trigger_with_params(
+                        event_name="function_call",
+                        triggering_module="brain",
+                        tool=tool,
+                        inf_obj=inf_obj
+                    )
+                    return_value = execute.from_arguments(args)
+                    if "success_prompt" in inf_obj.language_info:
+                        self.prompt.add(
+                            inf_obj.language_info["success_prompt"]
                         )
-                        return_value = execute.from_arguments(args)
-                        if "success_prompt" in inf_obj.language_info:
-                            self.prompt.add(
-                                inf_obj.language_info["success_prompt"]
-                            )
-                    except Exception as e:
-                        return_value = f"fail, reason: {str(e)}"
-                        if "fail_prompt" in inf_obj.language_info:
-                            self.prompt.add(
-                                inf_obj.language_info["fail_prompt"]
-                            )
-                        exc(e)
-                elif inf_obj.is_populatable:
-                    inf_obj.execute_count = called_tool_messages
-                    inf_obj.module["state"] = "executing"
-                    obj = inf_obj.info_dict["obj"]
-                    args = tool["arguments"]
-                    try:
-                        events.trigger_with_params(
-                            event_name="function_call",
-                            triggering_module="brain",
-                            tool=tool,
-                            inf_obj=inf_obj
+                except Exception as e:
+                    return_value = f"fail, reason: {str(e)}"
+                    if "fail_prompt" in inf_obj.language_info:
+                        self.prompt.add(
+                            inf_obj.language_info["fail_prompt"]
                         )
-                        class_instance = obj.from_arguments(args)
-                        if hasattr(class_instance, 'on_populated'):
-                            log.dbg("  calling on_populated for "
-                                    f"{inf_obj.name}")
-                            return_value = class_instance.on_populated()
-                        else:
-                            return_value = "success"
-
-                        print("Checking for success prompt in "
-                              f"{inf_obj.language_info}")
-                        if "success_prompt" in inf_obj.language_info:
-                            print("Adding success prompt "
-                                  f"{inf_obj.language_info['success_prompt']}")
-                            self.prompt.add(
-                                inf_obj.language_info["success_prompt"])
-                    except Exception as e:
-                        return_value = f"fail, reason: {str(e)}"
-                        if "fail_prompt" in inf_obj.language_info:
-                            self.prompt.add(
-                                inf_obj.language_info["fail_prompt"])
-                        exc(e)
-
-                inf_obj.module["state"] = "normal"
-
-                events.trigger_with_params(
-                    event_name="function_call_finished",
-                    triggering_module="brain",
-                    tool=tool,
-                    inf_obj=inf_obj
-                )
-
-                log.dbg(f"  tool {inf_obj.name} executed, "
-                        f"return value: {return_value}")
-                tool["executed"] = True
-                break
+                    exc(e)
+            elif inf_obj.is_populatable:
+                inf_obj.execute_count = called_tool_messages
+                inf_obj.module["state"] = "executing"
+                obj = inf_obj.info_dict["obj"]
+                args = tool["arguments"]
+                try:
+                    events.trigger_with_params(
+                        event_name="function_call",
+                        triggering_module="brain",
+                        tool=tool,
+                        inf_obj=inf_obj
+                    )
+                    class_instance = obj.from_arguments(args)
+                    if hasattr(class_instance, 'on_populated'):
+                        log.dbg("  calling on_populated for "
+                                f"{inf_obj.name}")
+                        return_value = class_instance.on_populated()
+                    else:
+                        return_value = "success"
+
+                    print("Checking for success prompt in "
+                          f"{inf_obj.language_info}")
+                    if "success_prompt" in inf_obj.language_info:
+                        print("Adding success prompt "
+                              f"{inf_obj.language_info['success_prompt']}")
+                        self.prompt.add(
+                            inf_obj.language_info["success_prompt"])
+                except Exception as e:
+                    return_value = f"fail, reason: {str(e)}"
+                    if "fail_prompt" in inf_obj.language_info:
+                        self.prompt.add(
+                            inf_obj.language_info["fail_prompt"])
+                    exc(e)
+
+            inf_obj.module["state"] = "normal"
+
+            events.trigger_with_params(
+                event_name="function_call_finished",
+                triggering_module="brain",
+                tool=tool,
+                inf_obj=inf_obj
+            )
+
+            log.dbg(f"  tool {inf_obj.name} executed, "
+                    f"return value: {return_value}")
+            tool["executed"] = True
 
         tool["return_value"] = return_value
         if tool["executed"]:
@@ -168,25 +192,14 @@ class Tools:
             List[Dict]: A list of tools relevant to the provided text.
         """
         functions = []
+        text_lower = text.lower()
 
         for inf_obj in self.inf_objs:
 
             if inf_obj.is_internal:
                 continue
 
-            if "keywords" in inf_obj.language_info and \
-                    inf_obj.language_info["keywords"] and \
-                    len(inf_obj.language_info["keywords"]) > 0:
-
-                keywords_in_input = [
-                    keyword for keyword in inf_obj.language_info["keywords"]
-                    if re.search(
-                        r"\b" + keyword.lower().replace("*", ".*") + r"\b",
-                        text.lower()
-                    )
-                ]
-
-            else:
+            if inf_obj.keyword_pattern is None:
                 if "init_prompt" in inf_obj.language_info:
                     if inf_obj.language_info["init_prompt"]:
                         init_prompt = inf_obj.language_info["init_prompt"]
@@ -194,13 +207,15 @@ class Tools:
                 functions.append(inf_obj.schema)
                 continue
 
-            if keywords_in_input:
+            keyword_match = inf_obj.keyword_pattern.search(text_lower)
+
+            if keyword_match:
                 if "init_prompt" in inf_obj.language_info:
                     if inf_obj.language_info["init_prompt"]:
                         init_prompt = inf_obj.language_info["init_prompt"]
                         self.prompt.add(init_prompt)
                 functions.append(inf_obj.schema)
-                log.dbg(f"  keywords detected {str(keywords_in_input)} "
+                log.dbg(f"  keyword detected \"{keyword_match.group(0)}\" "
                         f"for {inf_obj.name}, added schema")
                 continue
 
@@ -212,6 +227,8 @@ class Tools:
                 functions.append(inf_obj.schema)
                 continue
 
+        tracer.stamp("tool_selection")
+
         tools = []
 
         for fct in functions:
@@ -0,0 +1,145 @@
+from .log import log, LOG_DIR, LOG_FILE_DATETIME
+from collections import deque
+from .settings import cfg
+from .events import events
+import threading
+import json
+import time
+import os
+
+TRACING = bool(cfg("tracing", "enabled", default=True))
+SUMMARY_TURNS = int(cfg("tracing", "summary_turns", default=20))
+
+# stages in the order they usually happen within a voice turn
+STAGES = [
+    "user_text_complete",
+    "tool_selection",
+    "decide_for_tool_to_call",
+    "first_assistant_chunk",
+    "tts_first_chunk",
+    "rvc_first_block",
+    "audio_stream_start",
+]
+
+
+class TurnTracer:
+    """
+    Measures the latency of a voice turn, from the moment the microphone
+    recording stops until the first audio is played out.
+
+    Every stage is stamped once per turn with the time elapsed since
+    recording_stop. Finished turns are appended to a JSONL file in the
+    logs directory and kept for a rolling summary.
+    """
+    def __init__(self):
+        self.enabled = TRACING
+        self.lock = threading.Lock()
+        self.turn = None
+        self.turns = deque(maxlen=SUMMARY_TURNS)
+        self.file_path = os.path.join(
+            LOG_DIR, f"turn_latency_{LOG_FILE_DATETIME}.jsonl")
+
+        if not self.enabled:
+            return
+
+        events.add_listener(
+            "recording_stop",
+            "listen",
+            self.start_turn,
+            priority=100)
+        events.add_listener(
+            "user_text_complete",
+            "listen",
+            lambda text: self.stamp("user_text_complete"),
+            priority=100)
+        events.add_listener(
+            "assistant_chunk",
+            "brain",
+            lambda chunk: self.stamp("first_assistant_chunk"),
+            priority=100)
+        events.add_listener(
+            "audio_stream_start",
+            "speech",
+            lambda: self.stamp("audio_stream_start"),
+            priority=100)
+        events.add_listener(
+            "audio_stream_stop",
+            "speech",
+            self.finish_turn)
+
+    def start_turn(self):
+        """
+        Starts a new turn. An unfinished previous turn gets written as is.
+        """
+        self.finish_turn()
+        with self.lock:
+            self.turn = {
+                "start": time.perf_counter(),
+                "time": time.time(),
+                "stamps": {},
+            }
+
+    def stamp(self, stage):
+        """
+        Records the first occurrence of a stage in the current turn.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        turn = self.turn
+        if turn is None or stage in turn["stamps"]:
+            return
+        turn["stamps"][stage] = time.perf_counter() - turn["start"]
+
+    def finish_turn(self):
+        """
+        Writes the current turn to the trace file and updates the summary.
+        """
+        with self.lock:
+            turn = self.turn
+            self.turn = None
+
+        if turn is None or not turn["stamps"]:
+            return
+
+        record = {
+            "time": turn["time"],
+            "stages": {
+                stage: round(seconds * 1000, 1)
+                for stage, seconds in sorted(
+                    turn["stamps"].items(), key=lambda item: item[1])
+            },
+        }
+        self.turns.append(record)
+
+        try:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            log.err(f"  [tracer] error writing turn trace: {str(e)}")
+
+        log.dbg(f"  [tracer] turn latency (ms): {record['stages']}")
+        # listeners read the new averages with get_summary
+        events.trigger("turn_traced", "tracer")
+
+    def get_summary(self):
+        """
+        Returns the average latency per stage over the recent turns.
+
+        Returns:
+            dict: Stage name to average milliseconds since recording_stop,
+              in stage order. Stages never reached are left out.
+        """
+        turns = list(self.turns)
+        summary = {"turns": len(turns)}
+        for stage in STAGES:
+            values = [
+                turn["stages"][stage]
+                for turn in turns if stage in turn["stages"]
+            ]
+            if values:
+                summary[stage] = round(sum(values) / len(values), 1)
+        return summary
+
+
+tracer = TurnTracer()
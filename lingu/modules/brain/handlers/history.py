@@ -1,16 +1,83 @@
 import tiktoken
+from collections import deque
 from lingu import log
+import functools
+import itertools
 import base64
 import json
 
 
 IMG_PLACEHOLDER = '[Image Placeholder]'
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_REPLY_PRIMING = 3  # <|start|>assistant<|message|>
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    Returns the tiktoken encoding for a model, created once per model.
+
+    Args:
+        model (str): The model name.
+
+    Returns:
+        Encoding: The encoding, cl100k_base for unknown models.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        log.wrn(f"Model {model} not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_message_tokens(message, encoding):
+    """
+    Counts the tokens of a single message.
+
+    Args:
+        message (dict): The message.
+        encoding (Encoding): The tiktoken encoding.
+
+    Returns:
+        int: Number of tokens including the per message overhead.
+    """
+    num_tokens = TOKENS_PER_MESSAGE
+    for key, value in message.items():
+        if key == "role":
+            num_tokens += len(encoding.encode(value))
+        elif key == "content":
+            if value is not None:
+                if isinstance(value, str):
+                    num_tokens += len(encoding.encode(value))
+                elif isinstance(value, list) or isinstance(value, dict):
+                    num_tokens += len(encoding.encode(json.dumps(value)))
+        elif key == "name":
+            num_tokens += TOKENS_PER_NAME
+            num_tokens += len(encoding.encode(value))
+        elif key == "function_call":
+            # function_call is a dict with 'name' and 'arguments'
+            num_tokens += len(encoding.encode("function_call"))
+            function_call = value
+            if "name" in function_call:
+                num_tokens += len(encoding.encode(function_call["name"]))
+            if "arguments" in function_call:
+                num_tokens += len(encoding.encode(function_call["arguments"]))
+        else:
+            # For any other keys
+            num_tokens += len(encoding.encode(str(value)))
+    return num_tokens
 
 
 class History:
     """
     Manages a history of messages with a
     limit on the number of stored messages.
+
+    Messages are stored in groups: an assistant message and the tool
+    or function results answering it form one group, every other message
+    starts a new one. Groups are evicted from the front as a whole, so a
+    tool call is never separated from its results.
     """
 
     def __init__(
@@ -35,7 +102,17 @@ class History:
         self.max_tokens_per_msg = max_tokens_per_msg
         self.max_history_tokens = max_history_tokens
 
-        self.history = []
+        self.groups = deque()
+        self.message_count = 0
+        self.token_counts = {}
+        self.token_model = "gpt-3.5-turbo"
+
+    @property
+    def history(self) -> list:
+        """
+        All stored messages, oldest first.
+        """
+        return list(itertools.chain.from_iterable(self.groups))
 
     def _dump_json_if_necessary(self, obj):
         if isinstance(obj, str):
@@ -80,7 +157,7 @@ class History:
             'content': func_return
             }
         log.dbg(f"  [history] adding function answer:\n{func_return_message}")
-        self._add(func_return_message)
+        self._add(func_return_message, new_group=False)
 
     def assistant(self, assistant_response: str) -> None:
         """
@@ -163,110 +240,161 @@ class History:
                 "content": json.dumps(tool["return_value"])
             }
             log.dbg(f"  [history] adding executed tool:\n{message}")
-            self._add(message)
+            self._add(message, new_group=False)
 
-    def _add(self, entry: str) -> None:
+    def _add(self, entry: str, new_group: bool = True) -> None:
         """
         Adds a new entry to the history.
 
         Args:
             entry (str): The message to add to the history.
+            new_group (bool): Start a new group. If False the entry belongs
+              to the previous message (tool or function results).
         """
-        self.history.append(entry)
+        if new_group or not self.groups:
+            self.groups.append([entry])
+        else:
+            self.groups[-1].append(entry)
+        self.message_count += 1
 
         # Ensure the history does not exceed the maximum limit
-        if len(self.history) > self.max_history_messages:
-            self.history.pop(0)
+        while (self.message_count > self.max_history_messages
+                and len(self.groups) > 1):
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> list:
+        """
+        Removes the oldest group of messages.
+
+        Returns:
+            list: The removed messages.
+        """
+        group = self.groups.popleft()
+        self.message_count -= len(group)
+        for message in group:
+            self._forget(message)
+        return group
 
     def get(self, number_of_messages=-1, purge_images=False) -> list:
         """
         Retrieves the most recent entries in the history
         up to the maximum limit, optionally purging image content.
 
+        Only whole groups are returned, so the result never starts with
+        a tool result lacking its tool call. The newest group is always
+        returned, even if it holds more messages than requested.
+
         Args:
             number_of_messages (int): The number of messages to retrieve. Defaults to -1, which retrieves up to max_history_messages.
             purge_images (bool): Whether to remove image content from the messages. Defaults to False.
 
         Returns:
             list: A list of the most recent entries, potentially purged of images.
+              Stored messages are never modified, only messages containing
+              images are copied when purging.
         """
         number_of_messages = (
             number_of_messages
             if number_of_messages > 0
             else self.max_history_messages
         )
-        messages = self.history[-number_of_messages:]
+
+        selected_groups = []
+        count = 0
+        for group in reversed(self.groups):
+            if selected_groups and count + len(group) > number_of_messages:
+                break
+            selected_groups.append(group)
+            count += len(group)
+
+        messages = []
+        for group in reversed(selected_groups):
+            messages.extend(group)
 
         if purge_images:
-            purged_messages = []
-            for message in messages:
-                if 'content' in message and isinstance(message['content'], list):
-                    # Filter out the image_url type from the content
-                    message['content'] = [
-                        content for content in message['content']
-                        if content.get('type') != 'image_url'
-                    ]
-                purged_messages.append(message)
-            messages = purged_messages
-
-        # Remove tool message from the history if it is the first message
-        # This is because tool needs context
-        while (
-            len(messages) > 0
-            and "role" in messages[0]
-            and messages[0]["role"] == "tool"
-        ):
-            messages = messages[1:]
+            messages = [
+                self._without_images(message)
+                if isinstance(message.get('content'), list) else message
+                for message in messages
+            ]
 
         return messages
 
+    def _without_images(self, message) -> dict:
+        """
+        Returns a copy of a message with the image content filtered out.
+
+        Args:
+            message (dict): A message with a content list.
+
+        Returns:
+            dict: The copied message.
+        """
+        purged_message = dict(message)
+        purged_message['content'] = [
+            content for content in message['content']
+            if content.get('type') != 'image_url'
+        ]
+        return purged_message
+
+    def _message_tokens(self, message) -> int:
+        """
+        Returns the token count of a message, encoding it only
+        if it is not cached yet.
+
+        Args:
+            message (dict): A message stored in the history.
+
+        Returns:
+            int: Number of tokens of the message.
+        """
+        key = id(message)
+        tokens = self.token_counts.get(key)
+        if tokens is None:
+            tokens = count_message_tokens(
+                message, get_encoding(self.token_model))
+            self.token_counts[key] = tokens
+        return tokens
+
+    def _forget(self, message) -> None:
+        """
+        Removes the cached token count of a message.
+
+        Args:
+            message (dict): The message that changed or left the history.
+        """
+        self.token_counts.pop(id(message), None)
+
+    def _truncate(self, message, encoding) -> None:
+        """
+        Cuts the content of a message at a token boundary so the
+        message fits into max_tokens_per_msg.
+
+        Args:
+            message (dict): Message with string content.
+            encoding (Encoding): The tiktoken encoding.
+        """
+        excess = self._message_tokens(message) - self.max_tokens_per_msg
+        if excess <= 0:
+            return
+
+        content_tokens = encoding.encode(message['content'])
+        keep = max(0, len(content_tokens) - excess)
+        message['content'] = encoding.decode(content_tokens[:keep])
+        self.token_counts[id(message)] = count_message_tokens(
+            message, encoding)
+
     def get_tokens(self, messages, functions=None, model="gpt-3.5-turbo"):
         """
         Get the number of tokens used by the messages and functions.
         """
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            log.wrn(f"Model {model} not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
-
-        # Define tokens per message and tokens per name
-        if model.startswith("gpt-3.5-turbo") or model.startswith("gpt-4"):
-            tokens_per_message = 3
-            tokens_per_name = 1
-        else:
-            log.wrn(f"Token counting not implemented for model {model}. Using default.")
-            tokens_per_message = 3
-            tokens_per_name = 1
+        encoding = get_encoding(model)
 
         num_tokens = 0
         for message in messages:
-            num_tokens += tokens_per_message
-            for key, value in message.items():
-                if key == "role":
-                    num_tokens += len(encoding.encode(value))
-                elif key == "content":
-                    if value is not None:
-                        if isinstance(value, str):
-                            num_tokens += len(encoding.encode(value))
-                        elif isinstance(value, list) or isinstance(value, dict):
-                            num_tokens += len(encoding.encode(json.dumps(value)))
-                elif key == "name":
-                    num_tokens += tokens_per_name
-                    num_tokens += len(encoding.encode(value))
-                elif key == "function_call":
-                    # function_call is a dict with 'name' and 'arguments'
-                    num_tokens += len(encoding.encode("function_call"))
-                    function_call = value
-                    if "name" in function_call:
-                        num_tokens += len(encoding.encode(function_call["name"]))
-                    if "arguments" in function_call:
-                        num_tokens += len(encoding.encode(function_call["arguments"]))
-                else:
-                    # For any other keys
-                    num_tokens += len(encoding.encode(str(value)))
-
-        num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+            num_tokens += count_message_tokens(message, encoding)
+
+        num_tokens += TOKENS_REPLY_PRIMING
 
         # Count tokens in functions if provided
         if functions:
@@ -285,6 +413,10 @@ class History:
         Trim the history to ensure the maximum number of tokens
         is not exceeded.
 
+        Token counts are cached per message, oversized messages are cut
+        at a token boundary in one step and the total is kept as a
+        running sum while the oldest message groups are removed.
+
         Args:
             system_message (str): The system message
               that will be added to the history.
@@ -292,62 +424,41 @@ class History:
               containing the token counting function.
             model (str): The model used for token counting.
         """
-        # Define maximum iterations to prevent infinite loops
-        MAX_ITERATIONS = 5000
+        if model != self.token_model:
+            self.token_model = model
+            self.token_counts = {}
+        encoding = get_encoding(model)
 
         # handle image messages (replace image data with a placeholder)
-        for message in self.history:
+        # and trim each text message independently
+        for message in itertools.chain.from_iterable(self.groups):
             if 'content' in message:
                 # Check if message contains an image
                 if isinstance(message['content'], list):
                     for content_part in message['content']:
-                        if content_part.get('type') == 'image_url':
+                        if content_part.get('type') == 'image_url' and \
+                                content_part['image_url']['url'] != \
+                                IMG_PLACEHOLDER:
                             # Replace image data with a placeholder
                             content_part['image_url']['url'] = IMG_PLACEHOLDER
+                            self._forget(message)
                 elif isinstance(message['content'], str):
-                    message_tokens = self.get_tokens([message], functions, model)
-                    while message_tokens > self.max_tokens_per_msg:
-                        message['content'] = message['content'][:-10]
-                        message_tokens = self.get_tokens(
-                            [message], functions, model)
-
-        # First loop: Trim each message independently, excluding the last two
-        for message in self.history[:-2]:
-            iteration_count = 0
-
-            # Calculate tokens for the current message
-            message_tokens = self.get_tokens([message], functions, model)
+                    self._truncate(message, encoding)
 
-            while (message_tokens > self.max_tokens_per_msg
-                    and iteration_count < MAX_ITERATIONS):
-
-                # Reduce message content incrementally
-                if not message or not message['content']:
-                    break
-
-                message['content'] = message['content'][:-20]
-                message_tokens = self.get_tokens([message], functions, model)
-                iteration_count += 1
-
-        # Second loop: Check the total tokens of the entire history
-        iteration_count = 0
-
-        # Prepare the full messages list including system message
-        messages = [{'role': 'system', 'content': system_message}] + self.get()
-
-        current_tokens = self.get_tokens(messages, functions, model)
+        # Check the total tokens of the entire history
+        current_tokens = self.get_tokens(
+            [{'role': 'system', 'content': system_message}],
+            functions,
+            model)
+        for message in itertools.chain.from_iterable(self.groups):
+            current_tokens += self._message_tokens(message)
 
         while (current_tokens > self.max_history_tokens
-                and len(self.history) > 0
-                and iteration_count < MAX_ITERATIONS):
-            # Remove the oldest message
-            self.history.pop(0)
-
-            # Recalculate the total number of tokens
-            messages = [{'role': 'system', 'content': system_message}] + self.get()
-            current_tokens = self.get_tokens(messages, functions, model)
+                and len(self.groups) > 0):
+            # Remove the oldest group, a tool call leaves with its results
+            for message in self.groups[0]:
+                current_tokens -= self._message_tokens(message)
+            self._evict_oldest()
 
             log.dbg("  [trim_tokens] New total tokens after removing a "
-                    f"message: {current_tokens}")
-
-            iteration_count += 1
+                    f"message group: {current_tokens}")
@@ -30,6 +30,20 @@ verbose = bool(cfg("local_llm", "verbose", default=False))
 n_threads = int(cfg("local_llm", "threads", default=6))
 rope_freq_base = int(cfg("local_llm", "rope_freq_base", default=10000))
 rope_freq_scale = float(cfg("local_llm", "rope_freq_scale", default=1.0))
+stable_prefix = bool(cfg("local_llm", "stable_prefix", default=True))
+prompt_cache = cfg("local_llm", "prompt_cache", default="ram")
+prompt_cache_dir = cfg(
+    "local_llm", "prompt_cache_dir", default="cache/llama_prompt_cache")
+prompt_cache_mb = int(cfg("local_llm", "prompt_cache_mb", default=2048))
+
+DECIDE_SYSTEM_PROMPT = """You are a world class function calling algorithm.
+                    Your task is to call a function when needed.
+                    You need to decide if invoking a specific function
+                    aids in successfully addressing a user's request.
+                    You will be provided with a list of functions."""
+DECIDE_INSTRUCTION = "Return \"None\" if there is no function that " \
+                     "can help. Otherwise, return the name of the " \
+                     "function to call."
 
 
 class ChatAnswer(BaseModel):
@@ -78,6 +92,7 @@ class LLamaCppInterface(LLM_Base):
             create=self.llama.create_chat_completion_openai_v1,
             mode=instructor.Mode.JSON_SCHEMA
         )
+        self.set_prompt_cache()
         self.sleep = False
         self.abort = False
         events.add_listener(
@@ -104,6 +119,42 @@ class LLamaCppInterface(LLM_Base):
 
         log.dbg("  [brain] warm up llm")
         self.warm_up()
+        self.prime_prompt_cache()
+
+    def set_prompt_cache(self):
+        """
+        Attaches a prompt cache to the model. llama.cpp only reuses the
+        evaluated state for the prompt it processed last, so alternating
+        between tool selection and answer prompts would evaluate the long
+        system prompts every time. The cache stores the model state after
+        each prompt and restores the one with the longest common prefix.
+        """
+        capacity = prompt_cache_mb * 1024 * 1024
+        if prompt_cache == "disk":
+            log.dbg(f"  [brain] using disk prompt cache in {prompt_cache_dir}")
+            self.llama.set_cache(llama_cpp.LlamaDiskCache(
+                cache_dir=prompt_cache_dir, capacity_bytes=capacity))
+        elif prompt_cache == "ram":
+            log.dbg("  [brain] using ram prompt cache")
+            self.llama.set_cache(llama_cpp.LlamaRAMCache(
+                capacity_bytes=capacity))
+
+    def prime_prompt_cache(self):
+        """
+        Evaluates the static prompt prefixes once, so the first request
+        already restores them from the prompt cache.
+        """
+        if self.llama.cache is None:
+            return
+
+        prefixes = [
+            [{"role": "system", "content": DECIDE_SYSTEM_PROMPT}],
+            [{"role": "system",
+              "content": prompt.system_prompt(include_datetime=False)}],
+        ]
+        for messages in prefixes:
+            self.wait_wake()
+            self.llama.create_chat_completion(messages=messages, max_tokens=1)
 
     def abort_immediately(self):
         self.abort = True
@@ -157,14 +208,12 @@ class LLamaCppInterface(LLM_Base):
             name = tool["function"]["name"]
             function_names += f' - \"{name}\"\n'
 
+        # static parts first, so only the user's request
+        # has to be evaluated when the prefix comes from the prompt cache
         messages_decide = [
             {
                 "role": "system",
-                "content": """You are a world class function calling algorithm.
-                    Your task is to call a function when needed.
-                    You need to decide if invoking a specific function
-                    aids in successfully addressing a user's request.
-                    You will be provided with a list of functions.""",
+                "content": DECIDE_SYSTEM_PROMPT,
             },
             {
                 "role": "user",
@@ -173,14 +222,12 @@ class LLamaCppInterface(LLM_Base):
             },
             {
                 "role": "user",
-                "content": f"User's request:\n"
-                           f'"{user_content}"',
+                "content": DECIDE_INSTRUCTION,
             },
             {
                 "role": "user",
-                "content": "Return \"None\" if there is no function that "
-                           "can help. Otherwise, return the name of the "
-                           "function to call.",
+                "content": f"User's request:\n"
+                           f'"{user_content}"',
             },
         ]
 
@@ -344,7 +391,8 @@ Focus on providing a short, concise, and direct response to the user's query, ra
             # create new system prompt
             new_system_prompt_message = {
                 'role': 'system',
-                'content': prompt.system_prompt()
+                'content': prompt.system_prompt(
+                    include_datetime=not stable_prefix)
             }
             # remove first message from messages (existing system prompt)
             messages.pop(0)
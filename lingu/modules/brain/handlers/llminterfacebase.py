@@ -1,8 +1,9 @@
 from .languagemodelbase import LLM_Base
-from lingu import cfg, log, exc, prompt, events, Prompt
+from lingu import cfg, log, exc, prompt, events, Prompt, tracer
 from pydantic import BaseModel, Field
 from .history import History
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 import instructor
 import itertools
 import copy
@@ -23,7 +24,7 @@ class FunctionName(BaseModel):
     )
 
 class LLMInterfaceBase(LLM_Base):
-    def __init__(self, history: History, model_name, function_calling_model_name, llama_create, instructor_create, openai_completion=False):
+    def __init__(self, history: History, model_name, function_calling_model_name, llama_create, instructor_create, openai_completion=False, extra_body=None):
         super().__init__()
         self.prompt = Prompt("")
         self.messages = []
@@ -35,6 +36,14 @@ class LLMInterfaceBase(LLM_Base):
         self.abort = False
         self.openai_completion = openai_completion
         self.fast_function_calling = bool(cfg("local_llm", "fast_function_executiuon", default=False))
+        self.speculative_function_calling = bool(cfg("local_llm", "speculative_function_calling", default=False))
+        self.speculative_candidates = int(cfg("local_llm", "speculative_candidates", default=1))
+        self.speculative_answer = bool(cfg("local_llm", "speculative_answer", default=False))
+        self.executor = ThreadPoolExecutor(max_workers=max(2, self.speculative_candidates + 1))
+        self.stable_prefix = bool(cfg("local_llm", "stable_prefix", default=True))
+
+        # provider specific request fields (like the model ttl of lm studio)
+        self.request_options = {"extra_body": extra_body} if extra_body else {}
 
         self.llama = llama_create
         self.create = instructor_create
@@ -79,6 +88,7 @@ class LLMInterfaceBase(LLM_Base):
             model=self.model_name,
             max_tokens=5,
             stream=True,
+            **self.request_options
         )
         log.inf("  [brain] generating...")
         for token in extraction_stream:
@@ -120,6 +130,104 @@ class LLMInterfaceBase(LLM_Base):
         elif example_type == "function_arguments":
             return self.extend_function_parameter_messages(tool.language_info['examples'])
 
+    def _extract_arguments(self, selected_function, user_content):
+        """
+        Lets the function calling model fill out the parameters of a tool.
+        Has no side effects, so it can run speculatively.
+
+        Args:
+            selected_function (str): Name of the tool.
+            user_content (str): The user's request.
+
+        Returns:
+            The extracted (populated) tool instance.
+        """
+        tool = self.tools.get_tool_by_name(selected_function)
+
+        tool_examples_arguments = []
+        tool_example_argument = self._get_tool_example(selected_function, "function_arguments")
+
+        if tool_example_argument is not None:
+            tool_examples_arguments = tool_examples_arguments + tool_example_argument
+            if DEBUG_LEVEL >= 3:
+                log.inf(f"  [brain]  [TOOL INJECTION] INJECTING SUB TOOL EXAMPLES:\n{tool_example_argument}")
+
+        tool_call_system_prompt = f"""You are the world's leading expert in executing the {selected_function} function. Your task is to analyze a user's request and provide the correct parameters for this function. Your unparalleled knowledge enables you to interpret user requests accurately and translate them into precise function parameters.
+
+Your task is to provide the parameters for the {selected_function} function based on the given user request. You MUST adhere to these guidelines:
+
+Guidelines:
+1. Respond ONLY with the required parameters for the tool.
+2. Provide NO explanations or additional text.
+3. Ensure all required parameters are included and correctly formatted.
+4. If a parameter is not explicitly mentioned in the user's request, use your expert judgment to provide a reasonable default value.
+5. Carefully think through the user's request to extract all relevant information.
+6. Do NOT hesitate to provide your answer once you've determined the correct parameters.
+
+Remember:
+- Trust your knowledge and analytical skills.
+- Ensure your parameters are based solely on the user's request and the tool's requirements.
+- You will be penalized heavily for any response that includes text beyond the required parameters.
+- You will receive a $1000 bonus for each set of correct parameters, motivating you to provide the most accurate responses possible."""
+
+        user_request_prompt = f"""User's request:
+"{user_content}"
+
+Based on this request, provide the parameters for the {selected_function} function. Respond only with the parameter values in the correct format for the function."""
+
+        messages_tool = [{"role": "system", "content": tool_call_system_prompt}] + tool_examples_arguments + [{"role": "user", "content": user_request_prompt}]
+
+        log.dbg(f"  [brain] {self.function_calling_model_name} "
+                f"calling tool {selected_function} "
+                f"with messages {messages_tool}")
+
+        self.wait_wake()
+
+        final_extraction = self.create(
+            response_model=instructor.Partial[tool.instance],
+            max_retries=self.max_retries,
+            messages=messages_tool,
+            model=self.function_calling_model_name,
+            max_tokens=300,
+            temperature=0.1,
+            **self.request_options
+        )
+        return final_extraction
+
+    def _speculation_candidates(self, tools):
+        """
+        Returns the names of the tools most likely to be selected.
+        Tools matched by their keywords come first, tools offered for
+        every request (without keywords) after them.
+
+        Args:
+            tools (list): The tools offered for the request.
+
+        Returns:
+            list: Up to speculative_candidates tool names.
+        """
+        matched = []
+        unmatched = []
+        for tool in tools:
+            name = tool["function"]["name"]
+            inf_obj = self.tools.get_tool_by_name(name)
+            if inf_obj and inf_obj.keyword_pattern is not None:
+                matched.append(name)
+            else:
+                unmatched.append(name)
+        return (matched + unmatched)[:self.speculative_candidates]
+
+    def _not_applicable_likely(self, tools):
+        """
+        Returns True if no offered tool was matched by its keywords,
+        so the function selection will probably return "Not Applicable".
+        """
+        for tool in tools:
+            inf_obj = self.tools.get_tool_by_name(tool["function"]["name"])
+            if inf_obj and inf_obj.keyword_pattern is not None:
+                return False
+        return True
+
     def decide_for_tool_to_call(self, messages, tools, fast_function_calling=True):
         if not tools:
             return False, None
@@ -127,9 +235,17 @@ class LLMInterfaceBase(LLM_Base):
         log.inf(f"  [brain] Deciding if to select a tool.")
 
         user_message, user_content = self.get_user_message(messages)
+        speculations = {}
 
         if fast_function_calling:
 
+            if self.speculative_function_calling:
+                # extract arguments for the likely candidates while the
+                # selection call runs, losers are discarded
+                for name in self._speculation_candidates(tools):
+                    speculations[name] = self.executor.submit(
+                        self._extract_arguments, name, user_content)
+
             function_choices = {}
             choice_letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
@@ -191,7 +307,8 @@ Remember:
                     messages=messages_decide,
                     stream=False,
                     model=self.function_calling_model_name,
-                    **params
+                    **params,
+                    **self.request_options
                 )
 
             selected_letter = response.choices[0].message.content.strip().upper()
@@ -295,6 +412,7 @@ Remember:
                             max_tokens=500,
                             temperature=0.1,
                             stream=True,
+                            **self.request_options
                         )
 
                         print(f"Function to call: [waiting for LLM]", flush=True, end="")
@@ -401,55 +519,12 @@ Remember:
             log.err(f"  [brain] {self.function_calling_model_name} selected function not found: {selected_function}")
             return False, None
         
-        # Proceed with function call logic
-        tool_examples_arguments = []
-        tool_example_argument = self._get_tool_example(selected_function, "function_arguments")
-
-        if tool_example_argument is not None:
-            tool_examples_arguments = tool_examples_arguments + tool_example_argument
-            if DEBUG_LEVEL >= 3:
-                log.inf(f"  [brain]  [TOOL INJECTION] INJECTING SUB TOOL EXAMPLES:\n{tool_example_argument}")
-
-        tool_call_system_prompt = f"""You are the world's leading expert in executing the {selected_function} function. Your task is to analyze a user's request and provide the correct parameters for this function. Your unparalleled knowledge enables you to interpret user requests accurately and translate them into precise function parameters.
-
-Your task is to provide the parameters for the {selected_function} function based on the given user request. You MUST adhere to these guidelines:
-
-Guidelines:
-1. Respond ONLY with the required parameters for the tool.
-2. Provide NO explanations or additional text.
-3. Ensure all required parameters are included and correctly formatted.
-4. If a parameter is not explicitly mentioned in the user's request, use your expert judgment to provide a reasonable default value.
-5. Carefully think through the user's request to extract all relevant information.
-6. Do NOT hesitate to provide your answer once you've determined the correct parameters.
-
-Remember:
-- Trust your knowledge and analytical skills.
-- Ensure your parameters are based solely on the user's request and the tool's requirements.
-- You will be penalized heavily for any response that includes text beyond the required parameters.
-- You will receive a $1000 bonus for each set of correct parameters, motivating you to provide the most accurate responses possible."""
-
-        user_request_prompt = f"""User's request:
-"{user_content}"
-
-Based on this request, provide the parameters for the {selected_function} function. Respond only with the parameter values in the correct format for the function."""
-
-        messages_tool = [{"role": "system", "content": tool_call_system_prompt}] + tool_examples_arguments + [{"role": "user", "content": user_request_prompt}]
-
-        log.dbg(f"  [brain] {self.function_calling_model_name} "
-                f"calling tool {selected_function} "
-                f"with messages {messages_tool}")
-
-        self.wait_wake()
-
         try:
-            final_extraction = self.create(
-                response_model=instructor.Partial[tool.instance],
-                max_retries=self.max_retries,
-                messages=messages_tool,
-                model=self.function_calling_model_name,
-                max_tokens=300,
-                temperature=0.1,
-            )
+            if selected_function in speculations:
+                log.dbg(f"  [brain] using speculative extraction for {selected_function}")
+                final_extraction = speculations[selected_function].result()
+            else:
+                final_extraction = self._extract_arguments(selected_function, user_content)
 
             if final_extraction is None:
                 raise Exception("No valid extraction received")
@@ -555,7 +630,8 @@ Remember:
                 messages=messages_decide,
                 stream=False,
                 model=self.function_calling_model_name,
-                **params
+                **params,
+                **self.request_options
             )
 
         decision = response.choices[0].message.content.strip().lower()
@@ -611,6 +687,7 @@ Remember:
                     model=self.function_calling_model_name,
                     max_tokens=300,
                     temperature=0.1,
+                    **self.request_options
                 )
 
                 if final_extraction is None:
@@ -660,19 +737,104 @@ Remember:
             return False, None
 
 
+    def _answer_params(self):
+        return {
+            "max_tokens": int(cfg("local_llm", "max_tokens", default=1024)),
+            "temperature": float(cfg("local_llm", "temperature", default=1.0)),
+            "top_p": float(cfg("local_llm", "top_p", default=1)),
+        }
+
+    def add_datetime(self, messages):
+        """
+        Adds the current date and time to the answer request.
+
+        The date and time change with every request. Adding them to the
+        last user message keeps system prompt and history a prefix the
+        model server can reuse from its cache (a second system message is
+        rejected by many chat templates). Only the answer request gets
+        them, the tool prompts keep the plain user text.
+
+        Args:
+            messages (list): Messages of the request, not changed.
+
+        Returns:
+            list: Copy of messages with the date and time in a copy of the
+              last user message, or in the system prompt if there is none.
+        """
+        messages = messages[:]
+        for index in range(len(messages) - 1, 0, -1):
+            message = messages[index]
+            if message["role"] == "user" \
+                    and isinstance(message.get("content"), str):
+                messages[index] = dict(
+                    message,
+                    content=f"{prompt.datetime_prompt()}\n\n"
+                            f"{message['content']}")
+                return messages
+        messages[0] = {
+            'role': 'system',
+            'content': prompt.system_prompt(include_datetime=True)
+        }
+        return messages
+
+    def _create_answer_stream(self, messages, params):
+        if self.stable_prefix:
+            messages = self.add_datetime(messages)
+        if self.openai_completion:
+            print("### OPENAI COMPLETION ###")
+            return self.llama.create_chat_completion_openai_v1(
+                messages=messages,
+                stream=True,
+                **params
+            )
+        else:
+            print("### LLAMA CHAT COMPLETION ###")
+            return self.llama.chat.completions.create(
+                messages=messages,
+                stream=True,
+                model=self.model_name,
+                **params,
+                **self.request_options
+            )
+
+    def _discard_answer_stream(self, future):
+        """
+        Closes a speculatively started answer stream that is not needed.
+        """
+        try:
+            response = future.result()
+            if hasattr(response, "close"):
+                response.close()
+        except Exception as e:
+            log.dbg(f"  [brain] discarded speculative answer failed: {e}")
+
     def generate(self, text, messages, tools=None):
         self.abort = False
         first_request = text != ""
+        speculative_answer = None
 
         if first_request:
             self.prompt.start()
+
+            if self.speculative_answer and tools and \
+                    self._not_applicable_likely(tools):
+                # start the plain answer while the tool decision runs
+                speculative_answer = self.executor.submit(
+                    self._create_answer_stream,
+                    messages[:],
+                    self._answer_params())
+
             try:
                 success, return_value = self.decide_for_tool_to_call(messages, tools, self.fast_function_calling)
+                tracer.stamp("decide_for_tool_to_call")
             except Exception as e:
                 log.err(f"  [brain] {self.model_name} tool decision failed: {e}")
                 exc(e)
 
             if self.tools.executed_tools:
+                if speculative_answer:
+                    speculative_answer.add_done_callback(
+                        self._discard_answer_stream)
                 self.tool_executed = True
                 self.messages = messages[:]
                 return
@@ -683,19 +845,19 @@ Remember:
             prompt.add(self.prompt.get(), prioritize=True)
             new_system_prompt_message = {
                 'role': 'system',
-                'content': prompt.system_prompt()
+                'content': prompt.system_prompt(
+                    include_datetime=not self.stable_prefix)
             }
             messages.pop(0)
             messages.insert(0, new_system_prompt_message)
 
-        params = {
-            "max_tokens": int(cfg("local_llm", "max_tokens", default=1024)),
-            "temperature": float(cfg("local_llm", "temperature", default=1.0)),
-            "top_p": float(cfg("local_llm", "top_p", default=1)),
-        }
+        params = self._answer_params()
 
         self.wait_wake()
         if self.abort:
+            if speculative_answer:
+                speculative_answer.add_done_callback(
+                    self._discard_answer_stream)
             return
 
         log.inf(f"  [brain] calling {self.model_name} with params:")
@@ -703,21 +865,11 @@ Remember:
         log.inf('  Messages:')
         log.inf('=>{}'.format(json.dumps(messages, indent=4)))
 
-        if self.openai_completion:
-            print("### OPENAI COMPLETION ###")
-            response = self.llama.create_chat_completion_openai_v1(
-                messages=messages,
-                stream=True,
-                **params
-            )
+        if speculative_answer:
+            log.dbg("  [brain] using speculatively started answer")
+            response = speculative_answer.result()
         else:
-            print("### LLAMA CHAT COMPLETION ###")
-            response = self.llama.chat.completions.create(
-                messages=messages,
-                stream=True,
-                model=self.model_name,
-                **params
-            )
+            response = self._create_answer_stream(messages, params)
 
         if not self.abort:
             for chunk in response:
@@ -728,6 +880,15 @@ Remember:
                 if content:
                     yield content
 
+        self.keep_loaded()
+
+    def keep_loaded(self):
+        """
+        Called after every answer. Providers that unload idle models
+        (and with them the cached prompt prefix) override this.
+        """
+        pass
+
     def set_temperature(self, temperature):
         log.inf(f"  [brain] setting temperature to {temperature}")
         self.temperature = temperature
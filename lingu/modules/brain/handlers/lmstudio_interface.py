@@ -12,6 +12,9 @@ class LMStudioInterface(LLMInterfaceBase):
             default=model_name)
         
         lmstudio_url = cfg("local_llm", "lmstudio_url", default="http://localhost:1234/v1")
+        # seconds an idle just-in-time loaded model (and its prompt cache)
+        # stays in memory
+        model_ttl = int(cfg("local_llm", "keep_alive", default=3600))
 
         print(f"Using model: {model_name}")
         print(f"Using function calling model: {function_calling_model_name}")
@@ -22,4 +25,4 @@ class LMStudioInterface(LLMInterfaceBase):
             create=llama.chat.completions.create,
             mode=instructor.Mode.MD_JSON
         )
-        super().__init__(history, model_name, function_calling_model_name, llama, create)
+        super().__init__(history, model_name, function_calling_model_name, llama, create, extra_body={"ttl": model_ttl})
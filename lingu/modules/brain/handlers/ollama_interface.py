@@ -36,6 +36,9 @@ class OllamaInterface(LLMInterfaceBase):
             create=llama.chat.completions.create,
             mode=instructor.Mode.JSON_SCHEMA
         )
+        # the openai compatible endpoint has no keep_alive field, the models
+        # are kept loaded through the native api (see keep_loaded)
+        self.keep_alive = cfg("local_llm", "keep_alive", default=3600)
         super().__init__(history, model_name, function_calling_model_name, llama, create)
 
     def warm_up_safe(self):
@@ -55,6 +58,7 @@ class OllamaInterface(LLMInterfaceBase):
             )
             if response and len(response.choices) > 0:
                 log.inf("  [brain] ollama model is ready and responsive")
+                self.keep_loaded()
             else:
                 raise OpenAIError("Warmup failed: Model did not respond as expected.")
         except OpenAIError as e:
@@ -62,6 +66,22 @@ class OllamaInterface(LLMInterfaceBase):
         except Exception as e:
             raise Exception(f"An unexpected error occurred during warmup: {str(e)}")        
 
+    def keep_loaded(self):
+        """
+        Requests without keep_alive reset the unload timer of a model to
+        the server default. Refreshing it after every answer keeps the
+        models and their evaluated prompt prefix in memory.
+        """
+        self.executor.submit(self._refresh_keep_alive)
+
+    def _refresh_keep_alive(self):
+        try:
+            for name in {self.model_name, self.function_calling_model_name}:
+                # a request without prompt only loads the model
+                ollama.generate(model=name, keep_alive=self.keep_alive)
+        except Exception as e:
+            log.wrn(f"  [brain] could not refresh ollama keep_alive: {e}")
+
     def warm_up_with_error_handling(self, last_try = False):
         log.dbg("  performing warmup with error handling")
         try:
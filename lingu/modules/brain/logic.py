@@ -9,6 +9,8 @@ max_tokens_per_msg = int(cfg("max_tokens_per_msg", default=1000))
 max_history_tokens = int(cfg("max_history_tokens", default=7000))
 use_local_llm = bool(cfg("local_llm", "use_local_llm", default=False))
 model_provider = cfg("local_llm", "model_provider", default="llama.cpp")
+stable_prefix = use_local_llm and \
+    bool(cfg("local_llm", "stable_prefix", default=True))
 model_name = cfg(
     "local_llm", "model_name",
     default="openhermes-2.5-mistral-7b.Q5_K_M.gguf")
@@ -186,7 +188,7 @@ class BrainLogic(Logic):
         """
         system_prompt_message = {
             'role': 'system',
-            'content': prompt.system_prompt()
+            'content': prompt.system_prompt(include_datetime=not stable_prefix)
         }
 
         self.history.trim_tokens(
@@ -199,9 +201,11 @@ class BrainLogic(Logic):
 
         log.inf(f"  history: {self.history.history}")
 
+        messages = [system_prompt_message] + self.history.get(purge_images=True)
+
         assistant_response_stream = self.llm.generate(
             text,
-            [system_prompt_message] + self.history.get(purge_images=True),
+            messages,
             tools_for_usertext)
 
         return assistant_response_stream
@@ -14,7 +14,7 @@ Triggers:
 
 
 from RealtimeSTT import AudioToTextRecorderClient
-from lingu import cfg, log, Logic, prompt, is_testmode
+from lingu import cfg, log, Logic, prompt, is_testmode, ResultCache, make_key
 import numpy as np
 import threading
 import base64
@@ -139,7 +139,8 @@ class ListenLogic(Logic):
         self.prob_sentence_end_start_time = None
         self.text_history: Deque[TextEntry] = Deque()
         self.max_history_age = 1.0  # 1 second
-        self.speech_finished_cache = {}
+        self.speech_finished_cache = ResultCache(
+            "speech_finished", max_entries=1024)
         self.prev_text = ""
         self.post_speech_silence_duration = 0
         self.text_time_deque = deque()
@@ -514,10 +515,12 @@ class ListenLogic(Logic):
     def is_speech_finished(self, text):
          #return False
         # Check if the result is already in the cache
-        if text in self.speech_finished_cache:
+        key = make_key(text)
+        hit, result = self.speech_finished_cache.get(key)
+        if hit:
             if IS_DEBUG:
                 print(f"Cache hit for: '{text}'")
-            return self.speech_finished_cache[text]
+            return result
         
         user_prompt = (
             "Please reply with only 'c' if the following text is a complete thought (a sentence that stands on its own), "
@@ -544,7 +547,7 @@ class ListenLogic(Logic):
         result = reply == 'c'
 
         # Cache the result
-        self.speech_finished_cache[text] = result
+        self.speech_finished_cache.put(key, result)
 
         return result
 
@@ -18,6 +18,13 @@ class MimicLogic(Logic):
 
     def _on_voices(self, voices):
         self.voices = voices
+        self.send_char_voices()
+
+    def send_char_voices(self):
+        """
+        Tells speech the voices of all chars, so it can preload them.
+        """
+        self.trigger("char_voices", [char["voice"] for char in state.chars])
 
     def save_char(self, char, char_index):
         log.dbg(f"  saving char {char}")
@@ -48,6 +55,7 @@ class MimicLogic(Logic):
                 return
 
         state.save()
+        self.send_char_voices()
 
     def delete_char(self, char_index):
         log.dbg(f"deleting char {char_index}")
@@ -58,6 +66,7 @@ class MimicLogic(Logic):
             if len(state.chars) == 0:
                 state.char_index = -1
             state.save()
+            self.send_char_voices()
         else:
             log.err(f"Error: char_index {char_index} out of "
                     "range. Char not deleted.")
@@ -0,0 +1,74 @@
+"""
+Binary audio frames pushed to the client over the websocket.
+
+Every frame is one binary websocket message, a 12 byte little-endian
+header followed by the audio samples:
+
+    uint32  seq          frame number on this connection, starts at 0
+    uint32  sample_rate  sample rate of the audio in Hz
+    uint8   format       FORMAT_FLOAT32, FORMAT_INT16, FORMAT_MULAW or
+                         FORMAT_OPUS, negotiated per client (see codecs.py)
+    uint8   flags        FLAG_END_OF_UTTERANCE on the last frame of an
+                         utterance (without audio, except for the last
+                         Opus packet)
+    uint16  channels     interleaved channels, always 1 for now
+
+Text messages (JSON) keep using websocket text messages, so the client
+tells both apart by the message type.
+"""
+import struct
+
+HEADER = struct.Struct("<IIBBH")
+HEADER_SIZE = HEADER.size
+
+FORMAT_FLOAT32 = 0
+FORMAT_INT16 = 1
+FORMAT_MULAW = 2
+FORMAT_OPUS = 3
+
+FLAG_END_OF_UTTERANCE = 1
+
+SEQ_MODULO = 2 ** 32
+
+
+def encode_frame(seq, sample_rate, audio_format, payload=b"", end=False,
+                 channels=1):
+    """
+    Builds a frame.
+
+    Args:
+        seq (int): Frame number, wraps at 2**32.
+        sample_rate (int): Sample rate of the payload in Hz.
+        audio_format (int): FORMAT_FLOAT32, FORMAT_INT16, FORMAT_MULAW
+          or FORMAT_OPUS.
+        payload (bytes): Encoded audio.
+        end (bool): Marks the end of the utterance.
+        channels (int): Interleaved channels of the payload.
+
+    Returns:
+        bytes: Header and payload.
+    """
+    flags = FLAG_END_OF_UTTERANCE if end else 0
+    header = HEADER.pack(
+        seq % SEQ_MODULO, sample_rate, audio_format, flags, channels)
+    return header + payload
+
+
+def decode_frame(message):
+    """
+    Splits a frame into its header fields and payload.
+
+    Returns:
+        tuple: (seq, sample_rate, audio_format, end, channels, payload)
+          with payload as memoryview of message.
+
+    Raises:
+        ValueError: If the message is shorter than the header.
+    """
+    if len(message) < HEADER_SIZE:
+        raise ValueError(f"audio frame of {len(message)} bytes has no header")
+    seq, sample_rate, audio_format, flags, channels = \
+        HEADER.unpack_from(message)
+    payload = memoryview(message)[HEADER_SIZE:]
+    end = bool(flags & FLAG_END_OF_UTTERANCE)
+    return seq, sample_rate, audio_format, end, channels, payload
@@ -0,0 +1,243 @@
+"""
+Audio codecs of the websocket connection.
+
+Clients list the codecs they can decode ("accept") and encode ("send") in
+the metadata header of their microphone messages, the server picks the
+first codec of its client_codecs setting both sides support and tells the
+client with a {"type": "codec"} message.
+
+    float32  raw float32 PCM, 32 bit per sample
+    int16    raw int16 PCM, 16 bit per sample
+    mulaw    mu-law companded 8 bit PCM, numpy only
+    opus     20 ms Opus packets at 48 kHz, 32 kbit/s, needs opuslib and
+             the native opus library (optional, see docs/server.md)
+
+Stateless codecs encode a chunk the same for every client, so it is
+encoded once and shared. Opus keeps encoder and decoder state per client.
+"""
+from .audio_frames import (
+    FORMAT_FLOAT32, FORMAT_INT16, FORMAT_MULAW, FORMAT_OPUS)
+from lingu import StreamResampler
+import numpy as np
+import struct
+
+try:
+    import opuslib
+except Exception:
+    # opuslib raises a plain Exception if the opus library is missing
+    opuslib = None
+
+MULAW_MU = 255
+OPUS_SAMPLERATE = 48000
+OPUS_FRAME = 960  # 20 ms
+OPUS_MAX_FRAME = 5760  # 120 ms, longest packet a client may send
+OPUS_BITRATE = 32000
+PACKET_LENGTH = struct.Struct("<H")
+
+
+def mulaw_encode(audio):
+    """
+    Args:
+        audio (np.ndarray): float32 samples (-1.0 to 1.0).
+
+    Returns:
+        np.ndarray: uint8 mu-law codes.
+    """
+    audio = np.clip(audio, -1.0, 1.0)
+    companded = np.sign(audio) * np.log1p(MULAW_MU * np.abs(audio)) \
+        / np.log1p(MULAW_MU)
+    return np.rint((companded + 1) * 127.5).astype(np.uint8)
+
+
+def mulaw_decode(codes):
+    """
+    Args:
+        codes (np.ndarray): uint8 mu-law codes.
+
+    Returns:
+        np.ndarray: float32 samples.
+    """
+    companded = codes.astype(np.float32) / 127.5 - 1
+    audio = np.sign(companded) * np.expm1(
+        np.abs(companded) * np.log1p(MULAW_MU)) / MULAW_MU
+    return audio.astype(np.float32)
+
+
+def float32_to_int16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class Codec:
+    """
+    Base class of the codecs.
+
+    Attributes:
+        name (str): Name used in the negotiation.
+        audio_format (int): Format field of the audio frames.
+        shared (bool): Encodes without state, the result can be sent to
+          every client using the codec.
+        can_reduce (bool): Slow clients can get the audio at half the
+          sample rate.
+    """
+    name = None
+    audio_format = None
+    shared = True
+    can_reduce = True
+
+    def encode(self, audio, sample_rate, end=False):
+        """
+        Args:
+            audio (np.ndarray): float32 samples.
+            sample_rate (int): Sample rate of audio.
+            end (bool): Last chunk of the utterance.
+
+        Returns:
+            tuple: (payload bytes, sample rate of the payload)
+        """
+        raise NotImplementedError
+
+    def decode(self, payload, sample_rate):
+        """
+        Args:
+            payload (bytes): Audio sent by the client.
+            sample_rate (int): Sample rate the client stated.
+
+        Returns:
+            tuple: (int16 samples, sample rate)
+        """
+        raise NotImplementedError
+
+
+class Float32Codec(Codec):
+    name = "float32"
+    audio_format = FORMAT_FLOAT32
+
+    def encode(self, audio, sample_rate, end=False):
+        return audio.astype("<f4", copy=False).tobytes(), sample_rate
+
+    def decode(self, payload, sample_rate):
+        audio = np.frombuffer(payload, dtype="<f4")
+        return float32_to_int16(audio), sample_rate
+
+
+class Int16Codec(Codec):
+    name = "int16"
+    audio_format = FORMAT_INT16
+
+    def encode(self, audio, sample_rate, end=False):
+        return float32_to_int16(audio).astype("<i2").tobytes(), sample_rate
+
+    def decode(self, payload, sample_rate):
+        return np.frombuffer(payload, dtype="<i2"), sample_rate
+
+
+class MulawCodec(Codec):
+    name = "mulaw"
+    audio_format = FORMAT_MULAW
+
+    def encode(self, audio, sample_rate, end=False):
+        return mulaw_encode(audio).tobytes(), sample_rate
+
+    def decode(self, payload, sample_rate):
+        codes = np.frombuffer(payload, dtype=np.uint8)
+        return float32_to_int16(mulaw_decode(codes)), sample_rate
+
+
+class OpusCodec(Codec):
+    """
+    Opus at 48 kHz. Audio is resampled to 48 kHz and cut into 20 ms
+    packets, the rest is carried over to the next chunk and padded with
+    silence at the end of the utterance. A payload holds any number of
+    packets, each prefixed with its uint16 little-endian length.
+    """
+    name = "opus"
+    audio_format = FORMAT_OPUS
+    shared = False
+    can_reduce = False
+
+    def __init__(self, bitrate=OPUS_BITRATE):
+        if opuslib is None:
+            raise RuntimeError("opus codec needs opuslib and libopus")
+        self.encoder = opuslib.Encoder(OPUS_SAMPLERATE, 1, "audio")
+        self.encoder.bitrate = bitrate
+        self.decoder = opuslib.Decoder(OPUS_SAMPLERATE, 1)
+        self.resampler = StreamResampler(OPUS_SAMPLERATE, OPUS_SAMPLERATE)
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def encode(self, audio, sample_rate, end=False):
+        self.resampler.set_rates(sample_rate, OPUS_SAMPLERATE)
+        parts = [self.pending, self.resampler.process(audio)]
+        if end:
+            parts.append(self.resampler.flush())
+        audio = np.concatenate(parts)
+        if end and len(audio) % OPUS_FRAME:
+            padding = OPUS_FRAME - len(audio) % OPUS_FRAME
+            audio = np.concatenate(
+                (audio, np.zeros(padding, dtype=np.float32)))
+        count = len(audio) // OPUS_FRAME * OPUS_FRAME
+        self.pending = audio[count:]
+
+        packets = []
+        for start in range(0, count, OPUS_FRAME):
+            packet = self.encoder.encode_float(
+                audio[start:start + OPUS_FRAME].tobytes(), OPUS_FRAME)
+            packets.append(PACKET_LENGTH.pack(len(packet)))
+            packets.append(packet)
+        return b"".join(packets), OPUS_SAMPLERATE
+
+    def decode(self, payload, sample_rate):
+        pcm = []
+        offset = 0
+        while offset + PACKET_LENGTH.size <= len(payload):
+            length, = PACKET_LENGTH.unpack_from(payload, offset)
+            offset += PACKET_LENGTH.size
+            packet = bytes(payload[offset:offset + length])
+            offset += length
+            pcm.append(self.decoder.decode(packet, OPUS_MAX_FRAME))
+        return np.frombuffer(b"".join(pcm), dtype="<i2"), OPUS_SAMPLERATE
+
+
+CODECS = {
+    codec.name: codec
+    for codec in (Float32Codec, Int16Codec, MulawCodec, OpusCodec)
+}
+
+
+def available_codecs():
+    """
+    Returns:
+        list: Names of the codecs usable on this machine.
+    """
+    return [name for name in CODECS if name != "opus" or opuslib]
+
+
+def create_codec(name):
+    """
+    Returns:
+        Codec: New codec instance (own state for stateful codecs).
+
+    Raises:
+        ValueError: If the codec is unknown or not available.
+    """
+    if name not in available_codecs():
+        raise ValueError(f"audio codec {name} not available")
+    return CODECS[name]()
+
+
+def negotiate(offered, preferred, fallback):
+    """
+    Picks the codec for one direction.
+
+    Args:
+        offered (list): Codec names the client supports.
+        preferred (list): Codec names allowed by the server, best first.
+        fallback (str): Used if there is no common codec.
+
+    Returns:
+        str: Codec name.
+    """
+    available = available_codecs()
+    for name in preferred:
+        if name in offered and name in available:
+            return name
+    return fallback
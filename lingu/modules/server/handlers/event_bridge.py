@@ -0,0 +1,175 @@
+"""
+Hands events from the synchronous event bus over to the server event loop.
+
+Realtime text arrives once per token from the listen and brain threads.
+EventBridge collects it under a lock and sends it to the clients at most
+every interval (20 Hz by default), only the newest text of a kind is sent
+per tick. Events that must not be merged (final texts, stream starts) are
+sent on the next loop iteration, together with everything before them, so
+the order of events is kept.
+
+LoopLagMonitor measures how late the event loop runs its callbacks.
+"""
+from collections import deque
+import threading
+import asyncio
+import time
+
+FLUSH_INTERVAL = 0.05  # 20 Hz
+LAG_INTERVAL = 0.05
+STATS_SAMPLES = 200
+
+
+class EventBridge:
+    """
+    Thread-safe batching of messages for the clients.
+    """
+    def __init__(self, loop, send, interval=FLUSH_INTERVAL):
+        """
+        Args:
+            loop: Event loop send runs in.
+            send (callable): Called in the loop with every message and the
+              time.monotonic() it was posted.
+            interval (float): Seconds between sending merged messages.
+        """
+        self.loop = loop
+        self.send = send
+        self.interval = interval
+        self.lock = threading.Lock()
+        # [kind, message, posted_at, mergeable]
+        self.pending = []
+        self.scheduled = False
+        self.immediate = False
+        self.timer = None  # pending tick, only used in the loop
+        self.last_flush = 0.0
+
+        self.posted = 0
+        self.merged = 0
+        self.flushes = 0
+        self.sent = 0
+
+    def post(self, kind, message, merge=False):
+        """
+        Queues a message for the clients, callable from any thread.
+
+        Args:
+            kind (str): Message type, mergeable messages of the same kind
+              replace each other until they are sent.
+            message (str): The message.
+            merge (bool): The message may be replaced by a newer one of
+              the same kind and is sent with the next tick. Otherwise it
+              is sent right away.
+        """
+        posted_at = time.monotonic()
+        with self.lock:
+            self.posted += 1
+            if not self._merge(kind, message, merge):
+                self.pending.append([kind, message, posted_at, merge])
+            if merge:
+                if not self.scheduled:
+                    self.scheduled = True
+                    self.loop.call_soon_threadsafe(self._schedule)
+            elif not self.immediate:
+                self.immediate = True
+                self.loop.call_soon_threadsafe(self.flush)
+
+    def _merge(self, kind, message, merge):
+        # replaces a pending message of the same kind unless a message
+        # that can not be merged was queued after it
+        if not merge:
+            return False
+        for entry in reversed(self.pending):
+            if not entry[3]:
+                return False
+            if entry[0] == kind:
+                entry[1] = message
+                self.merged += 1
+                return True
+        return False
+
+    def _schedule(self):
+        if self.timer is None:
+            delay = self.last_flush + self.interval - time.monotonic()
+            self.timer = self.loop.call_later(max(0.0, delay), self.flush)
+
+    def flush(self):
+        """
+        Sends the pending messages, runs in the event loop.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            self.scheduled = False
+            self.immediate = False
+            if not pending:
+                return
+            self.flushes += 1
+            self.sent += len(pending)
+        self.last_flush = time.monotonic()
+        for kind, message, posted_at, merge in pending:
+            self.send(message, posted_at)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Posted, merged and sent messages and the number of
+              flushes.
+        """
+        with self.lock:
+            return {
+                "interval_ms": self.interval * 1000,
+                "posted": self.posted,
+                "merged": self.merged,
+                "flushes": self.flushes,
+                "sent": self.sent,
+                "pending": len(self.pending),
+            }
+
+
+class LoopLagMonitor:
+    """
+    Measures the event loop lag: how much later than requested a sleeping
+    task wakes up. High values mean callbacks block the loop.
+    """
+    def __init__(self, interval=LAG_INTERVAL, samples=STATS_SAMPLES):
+        self.interval = interval
+        self.lags = deque(maxlen=samples)
+        self.task = None
+
+    def start(self):
+        """
+        Starts measuring, call from within the event loop.
+        """
+        self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lags.append(
+                max(0.0, time.monotonic() - start - self.interval))
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Mean, 95th percentile and longest lag of the recent
+              samples in milliseconds.
+        """
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0, "mean_ms": 0.0, "p95_ms": 0.0,
+                    "max_ms": 0.0}
+        return {
+            "samples": len(lags),
+            "mean_ms": sum(lags) / len(lags) * 1000,
+            "p95_ms": lags[int(len(lags) * 0.95)] * 1000,
+            "max_ms": lags[-1] * 1000,
+        }
@@ -0,0 +1,198 @@
+"""
+Microphone audio of a client on its way to the listen module.
+
+The client numbers its microphone messages (seq in the metadata header).
+The jitter buffer puts them back in order, waits for missing ones up to
+jitter_depth messages and counts messages that arrive too late or never.
+Websocket messages travel over TCP and always arrive complete and in
+order, so with the browser client the buffer passes every message right
+away and the reordered, late and dropped counters stay at zero. It only
+comes into play for clients that send over several connections or an
+unreliable transport. Numbering starts at 0, a client restarting it at 0
+is followed once it is past the first jitter_depth messages (before that
+a 0 is a late first message).
+
+The decoded 16 kHz audio is cut into fixed blocks and a voice activity
+pre-gate only passes blocks with speech, so silence from remote clients
+is not pushed through the full RealtimeSTT processing.
+
+Once speech is detected the gate stays open for hangover seconds, longer
+than the pauses the listen module waits for to end a sentence, and passes
+the preroll seconds before the speech as well.
+"""
+from collections import deque
+import numpy as np
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+SAMPLERATE = 16000
+
+GATE_OFF = "off"
+GATE_ENERGY = "energy"
+GATE_WEBRTC = "webrtc"
+
+
+class IngestStage:
+    """
+    Jitter buffer and voice activity pre-gate of one client.
+    """
+    def __init__(
+            self,
+            decode,
+            block_ms=20,
+            jitter_depth=4,
+            gate=GATE_WEBRTC,
+            threshold_db=-55,
+            hangover=2.5,
+            preroll=0.3,
+            webrtc_sensitivity=1):
+        """
+        Args:
+            decode (callable): Called in order with the arguments passed
+              to push, returns the audio as 16 kHz int16 samples.
+            block_ms (int): Block length, 10, 20 or 30 ms for WebRTC VAD.
+            jitter_depth (int): Messages buffered while waiting for a
+              missing one before it counts as dropped.
+            gate (str): GATE_WEBRTC (energy and WebRTC VAD), GATE_ENERGY
+              or GATE_OFF.
+            threshold_db (float): Blocks below this level (dBFS) are
+              silence.
+            hangover (float): Seconds the gate stays open after speech.
+            preroll (float): Seconds before the speech passed with it.
+            webrtc_sensitivity (int): WebRTC VAD aggressiveness (0-3).
+        """
+        self.decode = decode
+        self.block_size = SAMPLERATE * block_ms // 1000
+        self.jitter_depth = max(0, int(jitter_depth))
+        self.threshold = 10 ** (threshold_db / 20) * 32768
+        self.hangover_blocks = int(hangover * 1000 / block_ms)
+        self.preroll = deque(maxlen=int(preroll * 1000 / block_ms))
+        self.gate = gate
+        self.vad = None
+        if gate == GATE_WEBRTC:
+            if webrtcvad is None:
+                self.gate = GATE_ENERGY
+            else:
+                self.vad = webrtcvad.Vad(webrtc_sensitivity)
+
+        self.next_seq = None
+        self.waiting = {}
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.open_blocks = 0
+
+        self.received = 0
+        self.restarts = 0
+        self.reordered = 0
+        self.late = 0
+        self.dropped = 0
+        self.blocks = 0
+        self.passed_blocks = 0
+
+    def push(self, seq, *args):
+        """
+        Adds a message of the client.
+
+        Args:
+            seq (int): Message number, None for clients that do not
+              number their messages (processed right away).
+            *args: Passed to decode.
+
+        Returns:
+            bytes: int16 audio to pass on, empty while the gate is closed.
+        """
+        self.received += 1
+        if seq is None:
+            return self._gate(self.decode(*args))
+
+        passed = []
+        if seq == 0 and self.next_seq is not None \
+                and self.next_seq > self.jitter_depth:
+            # the client restarted its numbering, pass on what is left of
+            # the old one instead of dropping the new messages as late
+            for old_seq in sorted(self.waiting):
+                passed.append(self._gate(self.decode(*self.waiting[old_seq])))
+            self.waiting = {}
+            self.next_seq = 0
+            self.restarts += 1
+        if self.next_seq is None:
+            # a low first number means the messages before it are late
+            self.next_seq = 0 if seq <= self.jitter_depth else seq
+        if seq < self.next_seq or seq in self.waiting:
+            self.late += 1
+            return b"".join(passed)
+        if seq != self.next_seq:
+            self.reordered += 1
+        self.waiting[seq] = args
+
+        while self.waiting:
+            if self.next_seq not in self.waiting:
+                if len(self.waiting) <= self.jitter_depth:
+                    break
+                # give up on the missing messages
+                first = min(self.waiting)
+                self.dropped += first - self.next_seq
+                self.next_seq = first
+            args = self.waiting.pop(self.next_seq)
+            self.next_seq += 1
+            passed.append(self._gate(self.decode(*args)))
+        return b"".join(passed)
+
+    def is_voiced(self, block):
+        """
+        Returns True if the block of int16 samples contains speech.
+        """
+        rms = np.sqrt(np.mean(np.square(block, dtype=np.float32)))
+        if rms < self.threshold:
+            return False
+        if self.vad is not None:
+            return self.vad.is_speech(block.tobytes(), SAMPLERATE)
+        return True
+
+    def _gate(self, audio):
+        if self.gate == GATE_OFF:
+            return audio.tobytes()
+
+        audio = np.concatenate((self.remainder, audio))
+        count = len(audio) // self.block_size * self.block_size
+        self.remainder = audio[count:]
+
+        passed = []
+        for start in range(0, count, self.block_size):
+            block = audio[start:start + self.block_size]
+            self.blocks += 1
+            if self.is_voiced(block):
+                if not self.open_blocks:
+                    passed.extend(self.preroll)
+                    self.passed_blocks += len(self.preroll)
+                    self.preroll.clear()
+                self.open_blocks = self.hangover_blocks
+            elif self.open_blocks:
+                self.open_blocks -= 1
+            else:
+                self.preroll.append(block)
+                continue
+            passed.append(block)
+            self.passed_blocks += 1
+        return b"".join(block.tobytes() for block in passed)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Received, reordered, late and dropped messages, restarts
+              of the numbering and the share of blocks passed by the gate.
+        """
+        return {
+            "gate": self.gate,
+            "received": self.received,
+            "restarts": self.restarts,
+            "reordered": self.reordered,
+            "late": self.late,
+            "dropped": self.dropped,
+            "blocks": self.blocks,
+            "passed_blocks": self.passed_blocks,
+            "gated_percent": 100 * (1 - self.passed_blocks / self.blocks)
+            if self.blocks else 0.0,
+        }
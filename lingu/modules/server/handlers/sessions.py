@@ -0,0 +1,324 @@
+"""
+Connected websocket clients and the messages sent to them.
+
+Every client gets a ClientSession with its own send queue, sender task and
+audio codecs. Messages are broadcast once to all sessions: the queues hold
+references to the same immutable bytes or str object, audio is encoded
+once per stateless codec (see codecs.py) and shared the same way.
+
+Audio frames of a client that does not keep up are downsampled (once for
+all slow clients using the same codec) or dropped, text messages are only
+dropped when a client stopped receiving altogether, so a slow client never
+stalls the others.
+
+All methods except get_stats run in the event loop thread.
+"""
+from .audio_frames import encode_frame
+from .codecs import create_codec
+from collections import deque
+import numpy as np
+import itertools
+import websockets
+import asyncio
+import time
+
+POLICY_DROP = "drop"
+POLICY_DOWNSAMPLE = "downsample"
+
+RATE_WINDOW = 2.0  # seconds of sent messages the bytes/s are measured over
+STATS_MESSAGES = 200  # recent messages the lag is measured over
+INPUT_HOLD = 0.5  # seconds a client keeps the microphone input after its last chunk
+
+
+class AudioBroadcast:
+    """
+    One chunk of float32 audio sent to all clients.
+    """
+    def __init__(self, seq, sample_rate, chunk, end=False):
+        """
+        Args:
+            seq (int): Frame number.
+            sample_rate (int): Sample rate of chunk.
+            chunk (bytes): float32 samples.
+            end (bool): Marks the end of the utterance, the frame is never
+              dropped or downsampled.
+        """
+        self.seq = seq
+        self.sample_rate = sample_rate
+        self.chunk = chunk
+        self.end = end
+        self.frames = {}
+
+    def samples(self, reduced=False):
+        """
+        Returns:
+            tuple: (float32 samples, sample rate), with reduced at half the
+              sample rate (sample pairs averaged).
+        """
+        audio = np.frombuffer(self.chunk, dtype=np.float32)
+        if not reduced:
+            return audio, self.sample_rate
+        audio = audio[:len(audio) // 2 * 2].reshape(-1, 2)
+        return audio.mean(axis=1, dtype=np.float32), self.sample_rate // 2
+
+    def frame(self, codec, reduced=False):
+        """
+        Returns:
+            bytes: The frame encoded with codec, shared between all
+              clients for stateless codecs.
+        """
+        if not codec.shared:
+            return self._encode(codec, reduced)
+        key = (codec.name, reduced)
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = self.frames[key] = self._encode(codec, reduced)
+        return frame
+
+    def _encode(self, codec, reduced):
+        audio, sample_rate = self.samples(reduced)
+        payload, sample_rate = codec.encode(audio, sample_rate, self.end)
+        # stateful codecs may hold back the audio, the frame is sent
+        # anyway so the client sees no gap in the frame numbers
+        return encode_frame(
+            self.seq, sample_rate, codec.audio_format, payload, end=self.end)
+
+
+class ClientSession:
+    """
+    One connected websocket client.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket, max_frames, policy=POLICY_DOWNSAMPLE):
+        """
+        Args:
+            websocket: Connection of the client.
+            max_frames (int): Audio frames queued before further frames
+              are dropped. With POLICY_DOWNSAMPLE frames are downsampled
+              once half of them are queued.
+            policy (str): POLICY_DROP or POLICY_DOWNSAMPLE.
+        """
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.address = websocket.remote_address[0]
+        self.max_frames = max(1, int(max_frames))
+        self.max_messages = 4 * self.max_frames
+        self.policy = policy
+        self.connected_at = time.monotonic()
+        self.last_input = 0.0
+        self.codec = create_codec("float32")
+        self.uplink = create_codec("int16")
+        self.accepted = None
+        self.ingest = None  # IngestStage of the microphone audio
+
+        # (message, queued_at, is_audio)
+        self.queue = deque()
+        self.queued_frames = 0
+        self.wakeup = asyncio.Event()
+
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.dropped_frames = 0
+        self.dropped_messages = 0
+        self.downsampled_frames = 0
+        self.recent_sent = deque()  # (sent_at, bytes)
+        self.lags = deque(maxlen=STATS_MESSAGES)
+
+    def set_codecs(self, downlink=None, uplink=None):
+        """
+        Switches the codec of audio sent to (downlink) or received from
+        (uplink) the client. Keeps the state if it does not change.
+        """
+        if downlink and downlink != self.codec.name:
+            self.codec = create_codec(downlink)
+        if uplink and uplink != self.uplink.name:
+            self.uplink = create_codec(uplink)
+
+    def decode(self, payload, sample_rate):
+        """
+        Decodes audio sent by the client.
+
+        Returns:
+            tuple: (int16 samples, sample rate)
+        """
+        return self.uplink.decode(payload, sample_rate)
+
+    def offer(self, message, queued_at):
+        """
+        Queues a text message, dropped only if the queue is full.
+        """
+        if len(self.queue) >= self.max_messages:
+            self.dropped_messages += 1
+            return
+        self.queue.append((message, queued_at, False))
+        self.wakeup.set()
+
+    def offer_audio(self, audio, queued_at):
+        """
+        Encodes and queues audio according to the session's policy.
+
+        Args:
+            audio (AudioBroadcast): The audio.
+            queued_at (float): time.monotonic() the audio was created.
+        """
+        reduced = False
+        if not audio.end:
+            if self.queued_frames >= self.max_frames:
+                self.dropped_frames += 1
+                return
+            if len(self.queue) >= self.max_messages:
+                self.dropped_frames += 1
+                return
+            if self.policy == POLICY_DOWNSAMPLE and self.codec.can_reduce \
+                    and self.queued_frames >= self.max_frames // 2:
+                reduced = True
+                self.downsampled_frames += 1
+        frame = audio.frame(self.codec, reduced)
+        self.queue.append((frame, queued_at, True))
+        self.queued_frames += 1
+        self.wakeup.set()
+
+    async def run(self):
+        """
+        Sends the queued messages until the connection closes.
+        """
+        try:
+            while True:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                message, queued_at, is_audio = self.queue.popleft()
+                if is_audio:
+                    self.queued_frames -= 1
+                await self.websocket.send(message)
+                now = time.monotonic()
+                self.sent_messages += 1
+                self.sent_bytes += len(message)
+                self.lags.append(now - queued_at)
+                self.recent_sent.append((now, len(message)))
+                while self.recent_sent[0][0] < now - RATE_WINDOW:
+                    self.recent_sent.popleft()
+        except websockets.ConnectionClosed:
+            pass
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Queue depth, send rate, lag between creating and sending
+              a message (mean and longest of the recent ones, in
+              milliseconds) and dropped and downsampled counts.
+        """
+        now = time.monotonic()
+        recent = [size for sent_at, size in list(self.recent_sent)
+                  if sent_at >= now - RATE_WINDOW]
+        lags = list(self.lags)
+        return {
+            "id": self.id,
+            "address": self.address,
+            "codec": self.codec.name,
+            "uplink_codec": self.uplink.name,
+            "connected_s": now - self.connected_at,
+            "queue_depth": len(self.queue),
+            "queued_frames": self.queued_frames,
+            "sent_messages": self.sent_messages,
+            "sent_bytes": self.sent_bytes,
+            "bytes_per_s": sum(recent) / RATE_WINDOW,
+            "lag_ms": sum(lags) / len(lags) * 1000 if lags else 0.0,
+            "max_lag_ms": max(lags, default=0) * 1000,
+            "dropped_frames": self.dropped_frames,
+            "dropped_messages": self.dropped_messages,
+            "downsampled_frames": self.downsampled_frames,
+            "ingest": self.ingest.get_stats() if self.ingest else None,
+        }
+
+
+class SessionRegistry:
+    """
+    Registry of the connected clients.
+    """
+    def __init__(self, max_frames=64, policy=POLICY_DOWNSAMPLE):
+        """
+        Args:
+            max_frames (int): Audio frames queued per client, see
+              ClientSession.
+            policy (str): What happens to audio of slow clients,
+              POLICY_DROP or POLICY_DOWNSAMPLE.
+        """
+        if policy not in (POLICY_DROP, POLICY_DOWNSAMPLE):
+            raise ValueError(f"unknown slow client policy {policy}")
+        self.max_frames = max_frames
+        self.policy = policy
+        self.sessions = {}
+        self.input_session = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, websocket):
+        """
+        Registers a client and starts its sender task.
+
+        Returns:
+            ClientSession: The new session.
+        """
+        session = ClientSession(websocket, self.max_frames, self.policy)
+        session.task = asyncio.ensure_future(session.run())
+        self.sessions[session.id] = session
+        return session
+
+    def remove(self, session):
+        session.task.cancel()
+        self.sessions.pop(session.id, None)
+        if self.input_session is session:
+            self.input_session = None
+
+    def broadcast(self, message, queued_at=None):
+        """
+        Queues a text message for all clients.
+        """
+        queued_at = queued_at or time.monotonic()
+        for session in self.sessions.values():
+            session.offer(message, queued_at)
+
+    def broadcast_audio(self, audio, queued_at=None):
+        """
+        Queues audio for all clients.
+
+        Args:
+            audio (AudioBroadcast): The audio.
+            queued_at (float, optional): time.monotonic() the audio was
+              created.
+        """
+        queued_at = queued_at or time.monotonic()
+        for session in self.sessions.values():
+            session.offer_audio(audio, queued_at)
+
+    def claim_input(self, session):
+        """
+        Decides which client feeds the microphone input. A client keeps it
+        while it sends audio, others take over after INPUT_HOLD seconds
+        without audio from it, so the streams of several clients are
+        never interleaved.
+
+        Returns:
+            bool: True if the audio of session is to be used.
+        """
+        now = time.monotonic()
+        current = self.input_session
+        if current is not session and current is not None \
+                and now - current.last_input < INPUT_HOLD:
+            return False
+        self.input_session = session
+        session.last_input = now
+        return True
+
+    def get_stats(self):
+        """
+        Returns:
+            list: Stats of every connected client, see
+              ClientSession.get_stats. Thread-safe.
+        """
+        return [session.get_stats()
+                for session in list(self.sessions.values())]
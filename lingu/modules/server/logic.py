@@ -1,40 +1,47 @@
-from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse
-from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from scipy.signal import resample
-from lingu import log, cfg, Logic
-from queue import Queue
+from lingu import log, cfg, Logic, StreamResampler
+from .handlers.sessions import SessionRegistry, AudioBroadcast
+from .handlers.codecs import negotiate
+from .handlers.event_bridge import EventBridge, LoopLagMonitor
+from .handlers.ingest import IngestStage
 import numpy as np
 import websockets
 import threading
 import ipaddress
-import requests
 import asyncio
 import uvicorn
 import socket
-import wave
 import json
 import time
 import ssl
-import io
 
 host = cfg("server", "host")
 ssl_certfile = cfg("server", "ssl_certfile")
 ssl_keyfile = cfg("server", "ssl_keyfile")
 port_ssl = cfg("server", "port_ssl")
 port_websocket = cfg("server", "port_websocket")
+client_queue_frames = int(cfg("server", "client_queue_frames", default=64))
+slow_client_policy = cfg("server", "slow_client_policy", default="downsample")
+client_codecs = cfg(
+    "server", "client_codecs", default=["opus", "mulaw", "int16", "float32"])
+text_update_rate = float(cfg("server", "text_update_rate", default=20))
+ingest_block_ms = int(cfg("server", "ingest_block_ms", default=20))
+ingest_jitter_messages = int(cfg("server", "ingest_jitter_messages", default=4))
+ingest_gate = cfg("server", "ingest_gate", default="webrtc")
+ingest_gate_db = float(cfg("server", "ingest_gate_db", default=-55))
+ingest_hangover = float(cfg("server", "ingest_hangover", default=2.5))
+ingest_preroll = float(cfg("server", "ingest_preroll", default=0.3))
 
 ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
 ssl_context.load_cert_chain(ssl_certfile, ssl_keyfile)
 ssl_context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
 ssl_context.set_ciphers("HIGH:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK:!SRP")
 
-tts_lock = threading.Lock()
-speaking_lock = threading.Lock()
-audiochunk_generator_lock = threading.Lock()
-play_text_to_speech_semaphore = threading.Semaphore(1)
-current_speaking = {}
+SPEECH_SAMPLERATE = 48000  # speech resamples audio for clients to 48 kHz
+RVC_SAMPLERATE = 40000  # RealtimeRVC output
 
 
 class WebserverLogic(Logic):
@@ -43,9 +50,20 @@ class WebserverLogic(Logic):
     """
     def __init__(self):
         super().__init__() 
-        self.loop = asyncio.get_event_loop()
-        self.audio_queue = Queue()
-        self.client_websocket = None
+        # one loop serves http and websocket clients
+        self.loop = asyncio.new_event_loop()
+        self.loop_monitor = LoopLagMonitor()
+        # connected clients, only used in the event loop thread
+        self.sessions = SessionRegistry(
+            client_queue_frames, slow_client_policy)
+        # realtime text is sent to the clients text_update_rate times
+        # a second at most
+        self.bridge = EventBridge(
+            self.loop, self.sessions.broadcast, 1 / text_update_rate)
+        self.audio_lock = threading.Lock()
+        self.audio_seq = 0
+        self.audio_samplerate = SPEECH_SAMPLERATE
+        self.utterance_open = False
 
         self.add_listener(
             "user_text", "listen",
@@ -73,145 +91,209 @@ class WebserverLogic(Logic):
             self.disconnect_client)
 
     def disconnect_client(self):
-        # Disconnect Websockets
-        if self.client_websocket:
-            asyncio.run_coroutine_threadsafe(
-                self.client_websocket.close(),
-                self.loop
-            )
-
-            self.client_websocket = None
-            print("Websocket connection closed.")
-            self.trigger("client_disconnected")
-        self.state.set_text("")
-        self.state.set_active(False)
-
-    async def send_to_client(self, message):
-        if self.client_websocket:
-            await self.client_websocket.send(message)
+        # Disconnect Websockets, the connection handlers clean up
+        async def close_all():
+            for session in list(self.sessions.sessions.values()):
+                await session.websocket.close()
+        asyncio.run_coroutine_threadsafe(close_all(), self.loop)
+
+    def update_state(self):
+        sessions = list(self.sessions.sessions.values())
+        if len(sessions) == 1:
+            self.state.set_text(sessions[0].address)
+        elif sessions:
+            self.state.set_text(f"{len(sessions)} clients")
+        else:
+            self.state.set_text("")
+        self.state.set_active(bool(sessions))
+
+    def get_session_stats(self):
+        """
+        Returns:
+            list: Queue depth, bytes/s, lag and drops of every connected
+              client, see handlers/sessions.py.
+        """
+        return self.sessions.get_stats()
+
+    def get_server_stats(self):
+        """
+        Returns:
+            dict: Client stats, text batching stats and event loop lag.
+        """
+        return {
+            "sessions": self.get_session_stats(),
+            "text_bridge": self.bridge.get_stats(),
+            "loop_lag": self.loop_monitor.get_stats(),
+        }
+
+    def send_to_client(self, message, merge=False):
+        """
+        Queues a text message for all connected clients.
+        Thread-safe, returns immediately.
+
+        Args:
+            message (dict): The message, with its kind in 'type'.
+            merge (bool): Only the newest message of its kind is sent
+              per text update (realtime text).
+        """
+        if not len(self.sessions):
+            return
+        self.bridge.post(message['type'], json.dumps(message), merge)
 
     def realtime_usertext(self, text):
-        if not self.client_websocket:
-            return
-        try:
-            asyncio.run_coroutine_threadsafe(
-                self.send_to_client(
-                    json.dumps({
-                        'type': 'realtime_user',
-                        'text': text
-                    })),
-                self.loop
-            )
-            # print(f"\r{text}", flush=True, end='')
-        except Exception as e:
-            print(f"Error in realtime_text_detected: {e}")
+        self.send_to_client({
+            'type': 'realtime_user',
+            'text': text
+        }, merge=True)
 
     def realtime_assistanttext(self, text):
-        if not self.client_websocket:
-            return
-        try:
-            asyncio.run_coroutine_threadsafe(
-                self.send_to_client(
-                    json.dumps({
-                        'type': 'realtime_assistant',
-                        'text': text
-                    })),
-                self.loop
-            )
-            # print(f"\r{text}", flush=True, end='')
-        except Exception as e:
-            print(f"Error in realtime_text_detected: {e}")
+        self.send_to_client({
+            'type': 'realtime_assistant',
+            'text': text
+        }, merge=True)
 
     def final_usertext(self, full_sentence):
-        if not self.client_websocket:
-            return
-        try:
-            asyncio.run_coroutine_threadsafe(
-                self.send_to_client(
-                    json.dumps({
-                        'type': 'final_usertext',
-                        'text': full_sentence
-                    })),
-                self.loop
-            )
-            # print(f"\rSentence: {full_sentence}")        
-        except Exception as e:
-            print(f"Error in final_text_detected: {e}")
+        self.send_to_client({
+            'type': 'final_usertext',
+            'text': full_sentence
+        })
 
     def audio_stream_ready(self):
-        self.audio_chunks_available = True
-        # (self.stream_info, self.engine_name) = data
-        # (audio_format, num_channels, sample_rate) = self.stream_info
-
-        if not self.client_websocket:
-            return
-        # print(f"Audio stream ready: {self.stream_info}")
-        try:
-            asyncio.run_coroutine_threadsafe(
-                self.send_to_client(
-                    json.dumps({
-                        'type': 'audio_stream_ready',
-                        'text': ''
-                    })),
-                self.loop
-            )
-        except Exception as e:
-            print(f"Error in audio_stream_ready: {e}")
+        self.send_to_client({
+            'type': 'audio_stream_ready',
+            'text': ''
+        })
 
     def audio_stream_stop(self):
-        self.audio_chunks_available = False
+        self.send_audio(b"", end=True)
 
     def audio_chunk(self, chunk):
-        self.rvc_chunk = False
-        self.audio_queue.put(chunk)
+        self.send_audio(chunk, SPEECH_SAMPLERATE)
 
     def rvc_audio_chunk(self, chunk):
-        self.rvc_chunk = True
-        self.audio_queue.put(chunk)
+        self.send_audio(chunk, RVC_SAMPLERATE)
+
+    def send_audio(self, chunk, sample_rate=None, end=False):
+        """
+        Pushes float32 audio to all connected clients as binary frame
+        (see handlers/audio_frames.py), encoded with the codec of each
+        client. Clients that lag behind get the audio at half the sample
+        rate or not at all.
+
+        Args:
+            chunk (bytes): Little-endian float32 samples.
+            sample_rate (int): Sample rate of chunk, None keeps the one
+              of the last frame.
+            end (bool): Marks the end of the utterance. Only sent if audio
+              was sent since the last end marker.
+        """
+        if not len(self.sessions):
+            return
+        with self.audio_lock:
+            if end and not self.utterance_open:
+                return
+            self.utterance_open = not end
+            if sample_rate:
+                self.audio_samplerate = sample_rate
+            audio = AudioBroadcast(
+                self.audio_seq, self.audio_samplerate, chunk, end=end)
+            self.audio_seq += 1
+            self.loop.call_soon_threadsafe(
+                self.sessions.broadcast_audio, audio, time.monotonic())
+
+    def negotiate_codecs(self, session, metadata):
+        """
+        Picks the codecs of a client from the codecs listed in the
+        metadata header of its messages and tells the client. The client
+        switches its uplink codec when it receives the answer, every
+        message states the codec it is encoded with.
+        """
+        accepted = (metadata.get('accept'), metadata.get('send'))
+        if accepted == session.accepted:
+            return
+        session.accepted = accepted
+        downlink = negotiate(accepted[0] or [], client_codecs, "float32")
+        uplink = negotiate(accepted[1] or [], client_codecs, "int16")
+        session.set_codecs(downlink=downlink)
+        log.inf(f"  [server] client {session.id} receives {downlink}, "
+                f"sends {uplink} audio")
+        session.offer(json.dumps({
+            'type': 'codec',
+            'downlink': downlink,
+            'uplink': uplink
+        }), time.monotonic())
 
     async def listen_server_worker(self, websocket, path):
 
-        # Extract the IP address from the WebSocket connection
-        client_ip = websocket.remote_address[0]
-        print(f"Client connected from {client_ip}")
-        self.state.set_text(f"{client_ip}")
+        session = self.sessions.add(websocket)
+        print(f"Client {session.id} connected from {session.address}")
 
-        def decode_and_resample(
-                audio_data,
-                original_sample_rate,
-                target_sample_rate):
+        # one stream per client, so the filter state carries over
+        # from message to message
+        resampler = StreamResampler(
+            16000, 16000, dtype_in=np.int16, dtype_out=np.int16)
+
+        def decode_and_resample(audio_data, original_sample_rate, codec):
             """
             We need to resample from client microphone sample rate to 16 kHz.
             Otherwise Whisper, WebRTCVad and Silero VAD won't work.
             """
+            try:
+                session.set_codecs(uplink=codec)
+            except ValueError as e:
+                log.wrn(f"  [server] client {session.id}: {e}")
+                return np.zeros(0, dtype=np.int16)
+            audio, sample_rate = session.decode(
+                audio_data, original_sample_rate)
+            resampler.set_rates(sample_rate, 16000)
+            return resampler.process(audio)
+
+        # puts the messages in order, drops silence
+        session.ingest = IngestStage(
+            decode_and_resample,
+            block_ms=ingest_block_ms,
+            jitter_depth=ingest_jitter_messages,
+            gate=ingest_gate,
+            threshold_db=ingest_gate_db,
+            hangover=ingest_hangover,
+            preroll=ingest_preroll)
+
+        if len(self.sessions) == 1:
+            self.trigger("client_connected")
+        self.update_state()
 
-            # Decode 16-bit PCM data to numpy array
-            audio_np = np.frombuffer(audio_data, dtype=np.int16)
-
-            # Calculate the number of samples after resampling
-            num_original_samples = len(audio_np)
-            num_target_samples = int(num_original_samples
-                                     * target_sample_rate /
-                                     original_sample_rate)
-
-            # Resample the audio
-            resampled_audio = resample(audio_np, num_target_samples)
-
-            return resampled_audio.astype(np.int16).tobytes()
-
-        self.client_websocket = websocket
-        self.trigger("client_connected")
-        self.state.set_active(True)
-
-        async for message in websocket:
-            metadata_length = int.from_bytes(message[:4], byteorder='little')
-            metadata_json = message[4:4+metadata_length].decode('utf-8')
-            metadata = json.loads(metadata_json)
-            sample_rate = metadata['sampleRate']
-            chunk = message[4+metadata_length:]
-            resampled_chunk = decode_and_resample(chunk, sample_rate, 16000)
-
-            self.trigger("client_chunk_received", resampled_chunk)
+        try:
+            async for message in websocket:
+                metadata_length = int.from_bytes(
+                    message[:4], byteorder='little')
+                metadata_json = message[4:4+metadata_length].decode('utf-8')
+                metadata = json.loads(metadata_json)
+                self.negotiate_codecs(session, metadata)
+                sample_rate = metadata['sampleRate']
+                chunk = message[4+metadata_length:]
+                if not chunk:
+                    # codec negotiation only
+                    continue
+                resampled_chunk = session.ingest.push(
+                    metadata.get('seq'),
+                    chunk,
+                    sample_rate,
+                    metadata.get('codec', 'int16'))
+                if not resampled_chunk \
+                        or not self.sessions.claim_input(session):
+                    # silence or another client is speaking
+                    continue
+
+                self.trigger("client_chunk_received", resampled_chunk)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.sessions.remove(session)
+            print(f"Client {session.id} from {session.address} "
+                  "disconnected")
+            if not len(self.sessions):
+                self.trigger("client_disconnected")
+            self.update_state()
 
     def float32_to_int16(self, float_audio):
         # Clip to the range -1.0 to 1.0 to avoid overflow when converting
@@ -220,17 +302,30 @@ class WebserverLogic(Logic):
         int16_audio = np.int16(float_audio * 32767)
         return int16_audio.tobytes()
 
-    def init_websocket_server(self):
-        asyncio.set_event_loop(self.loop)
+    async def serve(self, app):
+        """
+        Runs the websocket and the FastAPI server in the event loop.
+        """
+        self.loop_monitor.start()
         print(f"Starting websocket server on port {port_websocket}")
-        start_server = websockets.serve(
+        self.websocket_server = await websockets.serve(
             self.listen_server_worker,
             "0.0.0.0",
             port_websocket,
             ssl=ssl_context
         )
-        self.loop.run_until_complete(start_server)
-        self.loop.run_forever()
+        server = uvicorn.Server(uvicorn.Config(
+            app,
+            host="0.0.0.0",
+            port=port_ssl,
+            ssl_certfile=ssl_certfile,
+            ssl_keyfile=ssl_keyfile
+        ))
+        await server.serve()
+
+    def run_server(self, app):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.serve(app))
 
     # def init_wav_writer(self):
     #     self.wav_file = wave.open('output.wav', 'wb')
@@ -241,14 +336,6 @@ class WebserverLogic(Logic):
 
     def init(self):
         log.inf("  [server] Starting Linguflex 2.0 Webserver...")
-        self.rvc_chunk = False
-        self.stream_info = None
-        self.engine_name = None
-        self.audio_chunks_available = False
-        self.chunk_counter = 0
-
-        self.thread = threading.Thread(target=self.init_websocket_server)
-        self.thread.start()
 
         origins = [
             "http://localhost",
@@ -334,105 +421,6 @@ class WebserverLogic(Logic):
         }        
         csp_string = "; ".join(f"{key} {value}" for key, value in csp.items())
 
-        BROWSER_IDENTIFIERS = [
-            "mozilla",
-            "chrome",
-            "safari",
-            "firefox",
-            "edge",
-            "opera",
-            "msie",
-            "trident"
-        ]
-
-        def is_browser_request(request):
-            user_agent = request.headers.get('user-agent', '').lower()
-            is_browser = any(
-                browser_id in user_agent for browser_id in BROWSER_IDENTIFIERS)
-            return is_browser
-
-        def is_currently_speaking(text):
-            with speaking_lock:
-                return current_speaking.get(text, False)
-
-        def set_speaking(text, status):
-            with speaking_lock:
-                current_speaking[text] = status
-
-        def play_text_to_speech():
-            try:
-                log.inf(f"  [server] client requested audio stream")
-                while self.audio_chunks_available:
-                    time.sleep(0.1)
-
-                self.audio_queue.put(None)
-
-                # Wait until the self.audio_queue is empty
-                while not self.audio_queue.empty():
-                    time.sleep(0.1)
-            finally:
-                print("Done speaking")
-                set_speaking("", False)
-
-        def create_wave_header_for_engine():
-            # _, _, sample_rate = engine.get_stream_info()
-
-            if self.rvc_chunk:
-                sample_rate = 40000
-            else:
-                _, _, sample_rate = self.stream_info
-
-            num_channels = 1
-            sample_width = 2
-            frame_rate = sample_rate
-
-            wav_header = io.BytesIO()
-            with wave.open(wav_header, 'wb') as wav_file:
-                wav_file.setnchannels(num_channels)
-                wav_file.setsampwidth(sample_width)
-                wav_file.setframerate(frame_rate)
-                wav_file.setcomptype('NONE', 'Not Compressed')
-
-            wav_header.seek(0)
-            wave_header_bytes = wav_header.read()
-            wav_header.close()
-
-            # Create a new BytesIO with the correct MIME type for Firefox
-            final_wave_header = io.BytesIO()
-            final_wave_header.write(wave_header_bytes)
-            final_wave_header.seek(0)
-
-            return final_wave_header.getvalue()
-
-        def audio_chunk_generator(send_wave_headers):
-            with audiochunk_generator_lock:
-                first_chunk = False
-                try:
-                    while True:
-                        chunk = self.audio_queue.get()
-                        if chunk is None:
-                            log.dbg("Terminating stream")
-                            break
-                        if not first_chunk:
-                            if send_wave_headers and not self.engine_name == "elevenlabs":
-                                log.dbg("Sending wave header")
-                                # yield create_wave_header_for_engine()
-                            first_chunk = True
-                            # self.init_wav_writer()  # Initialize WAV file on first chunk
-                        self.chunk_counter += 1
-                        # print(f"Sending chunk {self.chunk_counter}")
-                        # # log.dbg("Sending chunk")
-                        # int16_chunk = self.float32_to_int16(
-                        #     np.frombuffer(chunk, dtype=np.float32))
-                        # self.wav_file.writeframes(int16_chunk)
-                        yield chunk
-                except Exception as e:
-                    log.err(f"Error during streaming: {str(e)}")
-                # finally:
-                #     if first_chunk:
-                #         self.wav_file.close()  # Ensure file is closed at the end                    
-
-
         @app.middleware("http")
         async def add_security_headers(request: Request, call_next):
             response = await call_next(request)
@@ -443,43 +431,19 @@ class WebserverLogic(Logic):
         async def favicon():
             return FileResponse('static/favicon.ico')
 
-        @app.get("/tts")
-        def tts(request: Request):
-            with tts_lock:
-                browser_request = is_browser_request(request)
-
-                if play_text_to_speech_semaphore.acquire(blocking=False):
-                    try:
-                        if not is_currently_speaking(""):
-                            print("Speaking...")
-                            set_speaking("", True)
-
-                            threading.Thread(
-                                target=play_text_to_speech,
-                                args=(),
-                                daemon=True).start()
-                    finally:
-                        play_text_to_speech_semaphore.release()
-
-                if is_currently_speaking(""):
-                    log.dbg(f"Currently speaking")
-                    return StreamingResponse(
-                        audio_chunk_generator(browser_request),
-                        media_type="application/octet-stream"
-                    )
-                else:
-                    print("Service unavailable, returning 503.")
-                    raise HTTPException(
-                        status_code=503,
-                        detail="Service unavailable, currently processing another request. Please try again shortly.",
-                        headers={"Retry-After": "10"}
-                    )
-
         @app.post("/disconnect")
         async def async_disconnect_client():
             self.disconnect_client()
             return {"message": "Disconnected successfully"}
 
+        @app.get("/sessions")
+        async def session_stats():
+            return self.get_session_stats()
+
+        @app.get("/stats")
+        async def server_stats():
+            return self.get_server_stats()
+
         @app.get("/")
         def root_page():
             # Get the WebSocket address dynamically
@@ -591,17 +555,8 @@ class WebserverLogic(Logic):
             """
             return HTMLResponse(content=content)
 
-        def run_server():
-            uvicorn.run(
-                app,
-                host="0.0.0.0",
-                port=port_ssl,
-                ssl_certfile=ssl_certfile,
-                ssl_keyfile=ssl_keyfile
-            )
-
-        # Run the server in a separate thread
-        self.thread = threading.Thread(target=run_server)
+        # Run both servers in one event loop in a separate thread
+        self.thread = threading.Thread(target=self.run_server, args=(app,))
         self.thread.start()
 
         self.ready()
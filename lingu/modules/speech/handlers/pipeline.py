@@ -0,0 +1,313 @@
+from lingu import log
+from collections import deque
+import stream2sentence as s2s
+import numpy as np
+import threading
+import pyaudio
+import queue
+import time
+
+STATS_FRAGMENTS = 100
+
+
+class _Marker:
+    """
+    Put into the engine queue after the last chunk of a fragment.
+    """
+    def __init__(self, last=False):
+        self.last = last
+
+
+class Fragment:
+    """
+    One sentence fragment and its audio, filled while it is synthesized.
+    """
+    def __init__(self, index, text):
+        self.index = index
+        self.text = text
+        self.chunks = queue.Queue()
+        self.samples = 0
+        self.synthesis_time = 0.0
+
+
+class SpeechPipeline:
+    """
+    Plays a text stream through three stages running in their own threads:
+
+    - fragmenting: splits the text stream into sentence fragments
+    - synthesis: synthesizes fragment after fragment with the TTS engine,
+      up to depth fragments ahead of the output stage, without waiting
+      for their audio to be processed
+    - output: hands the audio of the fragments in order to a sink, e.g.
+      RealtimeRVC conversion or the client audio stream
+
+    So post-processing of a fragment never delays the synthesis of the
+    next one and the next fragment is usually complete when the output
+    stage reaches it. Audio reaches the sink while it is synthesized,
+    the first fragment is not delayed.
+
+    Engines synthesize one fragment at a time (XTTS runs in a single worker
+    process, all engines share one output queue), so the lookahead comes
+    from decoupling synthesis from the output, not from concurrent
+    synthesis of several fragments.
+    """
+    def __init__(self, depth=2, on_audio_start=None, on_audio_stop=None):
+        """
+        Args:
+            depth (int): Fragments synthesized ahead of the one in output.
+            on_audio_start (callable, optional): Called before the first
+              chunk is handed to the sink.
+            on_audio_stop (callable, optional): Called after the last
+              chunk, not when aborted (see stopped_during_audio).
+        """
+        self.depth = max(1, int(depth))
+        self.on_audio_start = on_audio_start
+        self.on_audio_stop = on_audio_stop
+        self.abort_event = threading.Event()
+        # orders starting and ending the audio against abort
+        self.audio_lock = threading.RLock()
+        self.threads = []
+        self.audio_started = False
+        self.audio_stopped = False
+        self.fragment_times = deque(maxlen=STATS_FRAGMENTS)
+        self.output_waits = deque(maxlen=STATS_FRAGMENTS)
+        self.ahead = deque(maxlen=STATS_FRAGMENTS)
+
+    @staticmethod
+    def supports(engine):
+        """
+        Returns True if the pipeline can drive the engine: raw mono
+        int16 or float32 audio from synthesize(text).
+        """
+        if engine is None or getattr(engine, "can_consume_generators", False):
+            return False
+        audio_format, channels, _ = engine.get_stream_info()
+        return channels == 1 and \
+            audio_format in (pyaudio.paInt16, pyaudio.paFloat32)
+
+    def is_running(self):
+        """
+        Returns True while a stream plays. An aborted stream counts as
+        ended, even while its threads finish in the background.
+        """
+        return not self.abort_event.is_set() \
+            and any(thread.is_alive() for thread in self.threads)
+
+    def play(self, engine, text_generator, sink, **fragment_args):
+        """
+        Starts playing a text stream, returns immediately.
+
+        Args:
+            engine: RealtimeTTS engine to synthesize with.
+            text_generator: Yields text chunks (e.g. BufferStream.gen()).
+            sink (callable): Called in order with the int16 audio chunks
+              (bytes), in the output stage thread.
+            **fragment_args: Passed to stream2sentence.generate_sentences.
+        """
+        self.stop()
+        self.abort_event = threading.Event()
+        self.audio_started = False
+        self.audio_stopped = False
+        self.engine = engine
+        self.sink = sink
+        self.is_float = engine.get_stream_info()[0] == pyaudio.paFloat32
+        self.texts = queue.Queue()
+        self.synthesizing = queue.Queue()
+        self.ready = queue.Queue(maxsize=self.depth)
+
+        # chunks left from an aborted stream
+        while True:
+            try:
+                engine.queue.get_nowait()
+            except queue.Empty:
+                break
+
+        # the fragmenting thread ends with the text stream, it is not
+        # joined on stop and only uses its own queue and abort event
+        threading.Thread(
+            target=self._fragment_worker,
+            args=(text_generator, fragment_args, self.texts,
+                  self.abort_event),
+            daemon=True,
+            name="speech fragmenting").start()
+        self.threads = [
+            threading.Thread(target=worker, daemon=True, name=f"speech {name}")
+            for name, worker in (
+                ("synthesis", self._synthesis_worker),
+                ("collect", self._collect_worker),
+                ("output", self._output_worker),
+            )
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _put(self, target, item):
+        # bounded put that gives up when the pipeline is stopped
+        while not self.abort_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        # get that gives up (returns None) when the pipeline is stopped
+        while not self.abort_event.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    @staticmethod
+    def _fragment_worker(text_generator, fragment_args, texts, abort_event):
+        try:
+            fragments = s2s.generate_sentences(text_generator, **fragment_args)
+            for index, text in enumerate(fragments):
+                if abort_event.is_set():
+                    break
+                text = text.strip()
+                if text:
+                    texts.put(Fragment(index, text))
+        except Exception as e:
+            log.err(f"  [speech] splitting text into fragments failed: {e}")
+        finally:
+            texts.put(None)
+
+    def _synthesis_worker(self):
+        try:
+            while not self.abort_event.is_set():
+                fragment = self._get(self.texts)
+                if fragment is None:
+                    break
+                # blocks while depth fragments wait for the output stage
+                if not self._put(self.ready, fragment):
+                    break
+                self.ahead.append(self.ready.qsize())
+                self.synthesizing.put(fragment)
+                start = time.perf_counter()
+                try:
+                    if self.engine.synthesize(fragment.text) is False:
+                        log.wrn("  [speech] synthesis failed for "
+                                f"\"{fragment.text}\"")
+                except Exception as e:
+                    log.err("  [speech] synthesis failed for "
+                            f"\"{fragment.text}\": {e}")
+                fragment.synthesis_time = time.perf_counter() - start
+                self.engine.queue.put(_Marker())
+        finally:
+            self.engine.queue.put(_Marker(last=True))
+            self._put(self.ready, None)
+
+    def _collect_worker(self):
+        # moves chunks from the engine queue to the fragment being
+        # synthesized, the marker after each fragment keeps them in order
+        fragment = None
+        while True:
+            chunk = self.engine.queue.get()
+            if isinstance(chunk, _Marker):
+                if chunk.last:
+                    break
+                if fragment is None:
+                    fragment = self.synthesizing.get()
+                fragment.chunks.put(None)
+                self.fragment_times.append(fragment.synthesis_time)
+                fragment = None
+                continue
+            if fragment is None:
+                fragment = self.synthesizing.get()
+            if self.is_float:
+                audio = np.frombuffer(chunk, dtype=np.float32)
+                chunk = np.int16(np.clip(audio, -1.0, 1.0) * 32767).tobytes()
+            fragment.samples += len(chunk) // 2
+            fragment.chunks.put(chunk)
+
+    def _output_worker(self):
+        started = False
+        while not self.abort_event.is_set():
+            wait_start = time.perf_counter()
+            fragment = self._get(self.ready)
+            if fragment is None:
+                break
+            while not self.abort_event.is_set():
+                try:
+                    chunk = fragment.chunks.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if started:
+                    if wait_start is not None:
+                        # time between the last fragment's end and
+                        # the first audio of this one
+                        self.output_waits.append(
+                            time.perf_counter() - wait_start)
+                elif chunk is not None:
+                    with self.audio_lock:
+                        if self.abort_event.is_set():
+                            break
+                        started = True
+                        self.audio_started = True
+                        if self.on_audio_start:
+                            self.on_audio_start()
+                wait_start = None
+                if chunk is None:
+                    break
+                try:
+                    self.sink(chunk)
+                except Exception as e:
+                    log.err(f"  [speech] audio output failed: {e}")
+
+        with self.audio_lock:
+            if started and not self.abort_event.is_set():
+                self.audio_stopped = True
+                if self.on_audio_stop:
+                    self.on_audio_stop()
+
+    def abort(self):
+        """
+        Stops handing audio to the sink, returns immediately. The fragment
+        in synthesis is finished in the background, engines can not be
+        interrupted.
+        """
+        with self.audio_lock:
+            self.abort_event.set()
+
+    def stop(self):
+        """
+        Aborts the stream and waits for the fragment in synthesis to
+        finish.
+        """
+        self.abort()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self.threads = []
+
+    def stopped_during_audio(self):
+        """
+        Returns True if the last stream was aborted after its audio had
+        started, on_audio_stop is not called for it then.
+        """
+        with self.audio_lock:
+            return self.abort_event.is_set() and self.audio_started \
+                and not self.audio_stopped
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Number of recent fragments, their mean synthesis time,
+              mean and longest wait of the output stage for the next
+              fragment's first audio in milliseconds, and the mean number
+              of fragments waiting for the output stage.
+        """
+        def mean(values):
+            return sum(values) / len(values) if values else 0.0
+
+        return {
+            "depth": self.depth,
+            "fragments": len(self.fragment_times),
+            "synthesis_ms": mean(self.fragment_times) * 1000,
+            "output_wait_ms": mean(self.output_waits) * 1000,
+            "max_output_wait_ms": max(self.output_waits, default=0) * 1000,
+            "mean_ahead": mean(self.ahead),
+        }
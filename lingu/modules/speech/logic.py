@@ -18,23 +18,25 @@ Triggers:
     To update the UI
 """
 
-from lingu import log, cfg, Logic, RealtimeRVC
+from lingu import log, cfg, Logic, RealtimeRVC, StreamResampler, tracer
 from .state import state
 from .handlers.feed2stream import BufferStream
 from .handlers.engines import Engines
 from .handlers.voices import Voices
-from .handlers.resample import Resampler
+from .handlers.pipeline import SpeechPipeline
 from scipy.spatial.distance import cosine
 import numpy as np
 import threading
 import os
-import resampy
 import wave
 from scipy.signal import butter, lfilter
 
 force_first_fragment_after_words = \
     int(cfg("speech", "force_first_fragment_after_words", default=99999))
 
+pipeline_depth = int(cfg("speech", "pipeline_depth", default=2))
+rvc_preload_voices = bool(cfg("speech", "rvc_preload_voices", default=True))
+
 warmup = bool(cfg("speech", "warmup", default=False))
 if warmup:
     warmup_text = cfg("speech", "warmup_text", default="Hi")
@@ -50,6 +52,8 @@ min_sentence_length = 25
 min_first_fragment_length = 25
 fast_sentence_fragment = False
 
+sentence_fragment_delimiters = ".?!;:,\n()[]{}。-“”„”—…/|《》¡¿\""
+
 
 class SpeechLogic(Logic):
     """
@@ -65,7 +69,9 @@ class SpeechLogic(Logic):
         """
         # Flag to indicate if the speech logic is running.
         self.is_running = True
-        self.resampler = Resampler(16000, 48000)  # values get changed later
+        # values get changed later
+        self.resampler = StreamResampler(16000, 48000, dtype_in=np.int16)
+        self.float32_resampler = StreamResampler(40000, 48000)
 
         # RealtimeRVC object for real-time voice cloning.
         self.rvc = RealtimeRVC(
@@ -94,6 +100,16 @@ class SpeechLogic(Logic):
             self,
             self.engines,
             state)
+        # synthesizes ahead of rvc conversion and client audio output
+        self.pipeline = SpeechPipeline(
+            pipeline_depth,
+            on_audio_start=self.audio_start,
+            on_audio_stop=self.audio_stop,
+        )
+        # mimic answers the voice list with the voices of its chars
+        self.add_listener("char_voices",
+                          "mimic",
+                          self.preload_rvc_voices)
         self.voices.send_voices()
         if state.voice_index >= 0 and state.voice_index < len(state.voices):
             state.top_info = state.voices[state.voice_index]["name"]
@@ -150,6 +166,28 @@ class SpeechLogic(Logic):
     def mimic_set_voice(self, voice):
         self.voices.mimic_set_voice(voice)
         self.set_rvc_enabled(state.rvc_enabled)
+        if state.rvc_enabled and self.rvc.started and state.rvc_model:
+            self.rvc.set_model(state.rvc_model)
+
+    def preload_rvc_voices(self, voices):
+        """
+        Loads the RVC models of the given voices in the background, so
+        switching between mimic chars does not wait for model loading.
+
+        Args:
+            voices (list): Voice dicts, looked up by name in state.voices.
+        """
+        if not rvc_preload_voices:
+            return
+        names = {voice.get("name") for voice in voices if voice}
+        models = [
+            voice["rvc_model"] for voice in state.voices
+            if voice["name"] in names
+            and voice.get("rvc_enabled") and voice.get("rvc_model")
+        ]
+        if models:
+            log.dbg(f"  [speech] preloading rvc models {models}")
+            self.rvc.preload(models)
 
     def _yield_playout(self):
         self.state.set_text("🌐")
@@ -166,14 +204,12 @@ class SpeechLogic(Logic):
             return
 
     def yield_chunk_callback(self, chunk):
+        tracer.stamp("tts_first_chunk")
 
         _, _, sample_rate = self.engines.engine.get_stream_info()
-        self.resampler.set_sample_rate(sample_rate, 48000)
-        np_data = np.frombuffer(chunk, dtype=np.int16)
-        np_resampled_data = self.resampler.resample(np_data)
-        chunk = np_resampled_data.astype(np.float32) / 32767.0
-        chunk = chunk.newbyteorder('<')  # Force little-endian
-        chunk = chunk.tobytes()
+        self.resampler.set_rates(sample_rate, 48000)
+        chunk = self.resampler.process(chunk)
+        chunk = chunk.astype('<f4').tobytes()  # Force little-endian
         self.trigger("audio_chunk", chunk)
 
     def resample_float32_to_float32(
@@ -186,18 +222,12 @@ class SpeechLogic(Logic):
         Otherwise speech output on browser client won't work.
         """
 
-        # Assume chunk is a bytes object containing float32 data
-        audio_data = np.frombuffer(chunk, dtype=np.float32)
+        # chunk is a bytes object containing float32 data,
+        # consecutive chunks are resampled as one stream
+        self.float32_resampler.set_rates(sample_rate, target_sample_rate)
+        audio_data = self.float32_resampler.process(chunk)
 
-        # Resample the audio
-        resampled_audio = resampy.resample(audio_data, sample_rate, target_sample_rate)
-        audio_data = resampled_audio
-
-        # The data is already in float32, scale it to [-1, 1]
-        audio_data = audio_data.astype(np.float32)
-        audio_data = audio_data.newbyteorder('<')  # Force little-endian if needed
-
-        chunk = audio_data.tobytes()
+        chunk = audio_data.astype('<f4').tobytes()  # Force little-endian
 
         return chunk
 
@@ -215,13 +245,13 @@ class SpeechLogic(Logic):
         for i in range(num_full_sub_chunks):
             start_index = i * num_floats_per_chunk * float32_size
             end_index = start_index + num_floats_per_chunk * float32_size
-            sub_chunk = chunk[start_index:end_index]
+            sub_chunk = bytes(chunk[start_index:end_index])
             self.trigger("rvc_audio_chunk", sub_chunk)
         
         # Handle any remaining data that's less than a full sub-chunk
         remaining_data_start = num_full_sub_chunks * num_floats_per_chunk * float32_size
         if remaining_data_start < len(chunk):
-            remaining_data = chunk[remaining_data_start:]        
+            remaining_data = bytes(chunk[remaining_data_start:])
             self.trigger("rvc_audio_chunk", remaining_data)
 
     def post_init_processing(self):
@@ -267,8 +297,12 @@ class SpeechLogic(Logic):
         self.muted = muted
         self.text_stream.add(text)
 
-
-        if not self.engines.stream.is_playing():
+        if not self.is_speaking():
+            self.resampler.reset()
+            self.float32_resampler.reset()
+            if self.use_pipeline():
+                self.play_pipeline()
+                return
             self.engines.stream.feed(self.text_stream.gen())
             if state.rvc_enabled:
                 self.rvc.chunk_callback_only = self.playout_yielded
@@ -280,7 +314,7 @@ class SpeechLogic(Logic):
                     on_audio_chunk=self.feed_to_rvc,
                     context_size=4,
                     muted=True,
-                    sentence_fragment_delimiters=".?!;:,\n()[]{}。-“”„”—…/|《》¡¿\"",
+                    sentence_fragment_delimiters=sentence_fragment_delimiters,
                     force_first_fragment_after_words=force_first_fragment_after_words,
                     )
             else: 
@@ -292,7 +326,7 @@ class SpeechLogic(Logic):
                         # log_synthesized_text=True,
                         context_size=4,
                         muted=muted,
-                        sentence_fragment_delimiters=".?!;:,\n()[]{}。-“”„”—…/|《》¡¿\"",
+                        sentence_fragment_delimiters=sentence_fragment_delimiters,
                         force_first_fragment_after_words=force_first_fragment_after_words,
                         )
                 else:
@@ -303,10 +337,52 @@ class SpeechLogic(Logic):
                         on_audio_chunk=self.yield_chunk_callback,
                         context_size=4,
                         muted=True,
-                        sentence_fragment_delimiters=".?!;:,\n()[]{}。-“”„”—…/|《》¡¿\"",
+                        sentence_fragment_delimiters=sentence_fragment_delimiters,
                         force_first_fragment_after_words=force_first_fragment_after_words,
                         )
         
+    def is_speaking(self):
+        return self.engines.stream.is_playing() or \
+            self.pipeline.is_running()
+
+    def use_pipeline(self):
+        """
+        Returns True if the text stream is played through the speech
+        pipeline. That is the case when audio goes to RVC or to a client
+        instead of the local TextToAudioStream player and the engine
+        delivers raw audio per fragment.
+        """
+        return pipeline_depth > 0 \
+            and (state.rvc_enabled or self.playout_yielded) \
+            and self.pipeline.supports(self.engines.engine)
+
+    def play_pipeline(self):
+        """
+        Plays the text stream through the speech pipeline, synthesizing
+        up to speech/pipeline_depth fragments ahead of RVC conversion or
+        the client audio output.
+        """
+        if state.rvc_enabled:
+            self.rvc.chunk_callback_only = self.playout_yielded
+            sink = self.feed_to_rvc
+        else:
+            sink = self.yield_chunk_callback
+        self.pipeline.play(
+            self.engines.engine,
+            self.text_stream.gen(),
+            sink,
+            context_size=4,
+            minimum_sentence_length=min_sentence_length,
+            minimum_first_fragment_length=min_first_fragment_length,
+            quick_yield_single_sentence_fragment=fast_sentence_fragment,
+            cleanup_text_links=True,
+            cleanup_text_emojis=True,
+            tokenizer=self.engines.stream.tokenizer,
+            language=self.engines.stream.language,
+            sentence_fragment_delimiters=sentence_fragment_delimiters,
+            force_first_fragment_after_words=force_first_fragment_after_words,
+        )
+
     def test_voice(self, text, muted=False):
         """
         Test a voice by synthesizing and playing the given text.
@@ -369,6 +445,7 @@ class SpeechLogic(Logic):
             text (str): The synthesized speech text to be fed to RealtimeRVC.
 
         """
+        tracer.stamp("tts_first_chunk")
         if not self.muted:
             _, _, sample_rate = self.engines.engine.get_stream_info()
             if self.playout_yielded:
@@ -449,6 +526,13 @@ class SpeechLogic(Logic):
 
         """
 
+        pipeline_running = self.pipeline.is_running()
+        if pipeline_running:
+            # no more audio to rvc before it is stopped, the fragment in
+            # synthesis finishes in the background so the event thread
+            # is not blocked
+            self.pipeline.abort()
+
         if self.engines and self.engines.stream:
             if self.engines.stream.is_playing():
                 self.engines.stream.stop()
@@ -456,5 +540,11 @@ class SpeechLogic(Logic):
             if self.rvc and self.rvc.is_playing():
                 self.rvc.stop()
 
+        if pipeline_running:
+            if not state.rvc_enabled and self.pipeline.stopped_during_audio():
+                # like TextToAudioStream.stop, end the audio stream
+                # (with rvc enabled rvc.stop does this)
+                self.audio_stop()
+
 
 logic = SpeechLogic()
@@ -12,7 +12,7 @@ from .ui_engines import (
     CoquiWidget,
     ParlerWidget
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSlot
 from qfluentwidgets import (
     EditableComboBox,
     ComboBox,
@@ -21,7 +21,7 @@ from qfluentwidgets import (
     Theme,
     setTheme,
 )
-from lingu import UI, Line
+from lingu import UI, Line, tracer
 from .logic import logic
 
 
@@ -125,6 +125,10 @@ class SpeechUI(UI):
         self.engine_groupbox.setLayout(self.engine_layout)
         self.add(self.engine_groupbox)
 
+        self.add(UI.label("Latency"))
+        self.label_latency = UI.label("no voice turn measured yet")
+        self.add(self.label_latency)
+
         self.add(Line())
 
         self.engine_widget = None
@@ -139,6 +143,11 @@ class SpeechUI(UI):
             "audio_stream_stop",
             "speech",
             self.on_audio_stream_stop)
+        self.add_ui_listener(
+            self,
+            "turn_traced",
+            "tracer",
+            "update_latency")
 
     def set_rvc_enabled(self, state):
         logic.set_rvc_enabled(self.rvc_groupbox.isChecked())
@@ -248,6 +257,17 @@ class SpeechUI(UI):
 
         self.update_display()
 
+    @pyqtSlot()
+    def update_latency(self):
+        summary = tracer.get_summary()
+        lines = [
+            f"{stage}: {milliseconds:.0f} ms"
+            for stage, milliseconds in summary.items()
+            if stage != "turns"
+        ]
+        lines.append(f"(average of last {summary['turns']} turns)")
+        self.label_latency.setText("\n".join(lines))
+
     def on_audio_stream_start(self):
         self.test_voice_button.setEnabled(False)
 
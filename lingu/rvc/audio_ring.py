@@ -0,0 +1,190 @@
+from multiprocessing import shared_memory
+import numpy as np
+import time
+
+# header slots (int64)
+WRITE_CURSOR = 0      # frames ever written, producer only
+READ_CURSOR = 1       # frames ever read, consumer only
+FLUSH_REQUEST = 2     # incremented by the producer to drop queued audio
+FLUSH_DONE = 3        # last flush request handled by the consumer
+FINISHED_REQUEST = 4  # incremented by the producer at the end of a stream
+FINISHED_AT = 5       # write cursor at the end of that stream
+HEADER_SLOTS = 8
+
+FULL_WAIT = 0.005
+
+
+class SharedAudioRing:
+    """
+    Single producer, single consumer float32 ring buffer in shared memory.
+
+    The producer (RVC conversion) and consumer (playback process) each own
+    one cursor. Cursors count frames since creation and are never reset,
+    so the number of queued frames is always exact and no lock is needed:
+    each side only writes its own cursor and reads the other one.
+
+    Commands that affect both sides (flush, end of stream) are counters
+    written by the producer and acknowledged by the consumer.
+    """
+    def __init__(self, capacity, name=None):
+        """
+        Args:
+            capacity (int): Ring size in frames.
+            name (str, optional): Name of an existing ring to attach to
+              (consumer side). Creates a new ring if None.
+        """
+        self.capacity = capacity
+        size = HEADER_SLOTS * 8 + capacity * 4
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.header = np.ndarray(
+            (HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray(
+            (capacity,), dtype=np.float32, buffer=self.shm.buf,
+            offset=HEADER_SLOTS * 8)
+        if self.owner:
+            self.header[:] = 0
+        self.finished_handled = int(self.header[FINISHED_REQUEST])
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def frames_queued(self):
+        """
+        Returns:
+            int: Frames written but not yet read.
+        """
+        return int(self.header[WRITE_CURSOR] - self.header[READ_CURSOR])
+
+    # producer side
+
+    def write(self, audio, abort_event=None):
+        """
+        Appends audio, waiting while the ring is full.
+
+        Args:
+            audio (np.ndarray): float32 frames.
+            abort_event (optional): Event that stops waiting for space.
+
+        Returns:
+            int: Number of frames written.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        written = 0
+        while written < len(audio):
+            write_cursor = int(self.header[WRITE_CURSOR])
+            free = self.capacity - (
+                write_cursor - int(self.header[READ_CURSOR]))
+            if free <= 0:
+                if abort_event is not None and abort_event.is_set():
+                    break
+                time.sleep(FULL_WAIT)
+                continue
+
+            count = min(free, len(audio) - written)
+            position = write_cursor % self.capacity
+            first = min(count, self.capacity - position)
+            self.data[position:position + first] = \
+                audio[written:written + first]
+            self.data[:count - first] = audio[written + first:written + count]
+
+            # publish the frames only after they are copied
+            self.header[WRITE_CURSOR] = write_cursor + count
+            written += count
+        return written
+
+    def request_flush(self):
+        """
+        Asks the consumer to drop all queued frames.
+        """
+        self.header[FLUSH_REQUEST] += 1
+
+    def wait_flushed(self, timeout=0.5):
+        """
+        Waits until the consumer handled the last flush request.
+
+        Returns:
+            bool: True if the flush was handled within timeout.
+        """
+        end = time.time() + timeout
+        while int(self.header[FLUSH_DONE]) != int(self.header[FLUSH_REQUEST]):
+            if time.time() > end:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def mark_finished(self):
+        """
+        Marks the current write position as the end of a stream.
+        """
+        self.header[FINISHED_AT] = self.header[WRITE_CURSOR]
+        self.header[FINISHED_REQUEST] += 1
+
+    # consumer side
+
+    def handle_flush(self):
+        """
+        Drops the queued frames if the producer requested a flush.
+
+        Returns:
+            bool: True if frames were dropped.
+        """
+        request = int(self.header[FLUSH_REQUEST])
+        if request == int(self.header[FLUSH_DONE]):
+            return False
+        self.header[READ_CURSOR] = self.header[WRITE_CURSOR]
+        self.header[FLUSH_DONE] = request
+        return True
+
+    def read_into(self, out):
+        """
+        Copies up to len(out) queued frames into out.
+
+        Args:
+            out (np.ndarray): float32 target buffer.
+
+        Returns:
+            int: Number of frames copied.
+        """
+        read_cursor = int(self.header[READ_CURSOR])
+        count = min(len(out), int(self.header[WRITE_CURSOR]) - read_cursor)
+        if count <= 0:
+            return 0
+
+        position = read_cursor % self.capacity
+        first = min(count, self.capacity - position)
+        out[:first] = self.data[position:position + first]
+        out[first:count] = self.data[:count - first]
+
+        # release the space only after the frames are copied
+        self.header[READ_CURSOR] = read_cursor + count
+        return count
+
+    def finished_reached(self):
+        """
+        Returns True once per stream end, when all frames written before
+        mark_finished have been read.
+        """
+        request = int(self.header[FINISHED_REQUEST])
+        if request == self.finished_handled:
+            return False
+        if int(self.header[READ_CURSOR]) < int(self.header[FINISHED_AT]):
+            return False
+        self.finished_handled = request
+        return True
+
+    def close(self):
+        """
+        Detaches from the ring, the creating side also frees it.
+        """
+        del self.header
+        del self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
@@ -0,0 +1,228 @@
+from multiprocessing import shared_memory
+from collections import deque
+import multiprocessing as mp
+import numpy as np
+import threading
+import queue
+import time
+
+SAMPLERATE = 16000
+HOP = 160  # 10 ms frames
+OVERLAP = 320  # samples of context on each side of a part
+MAX_SECONDS = 30
+RESULT_TIMEOUT = 5.0
+STATS_BLOCKS = 200
+
+
+def _harvest_worker(
+        input_name: str,
+        output_name: str,
+        capacity: int,
+        tasks: mp.Queue,
+        results: mp.Queue,
+        current: mp.Value,
+        ):
+    import pyworld
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    audio = np.ndarray((capacity,), dtype=np.float64, buffer=input_shm.buf)
+    f0_out = np.ndarray(
+        (capacity // HOP + 1,), dtype=np.float64, buffer=output_shm.buf)
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            generation, part, start, end, trim_head, trim_tail, offset = task
+            if current.value != generation:
+                continue  # block timed out, the buffers hold the next one
+            start_time = time.perf_counter()
+            f0, _ = pyworld.harvest(
+                audio[start:end],
+                fs=SAMPLERATE,
+                f0_ceil=1100,
+                f0_floor=50,
+                frame_period=10)
+            f0 = f0[trim_head:len(f0) - trim_tail]
+            count = min(len(f0), len(f0_out) - offset)
+            with current.get_lock():
+                if current.value != generation:
+                    continue
+                f0_out[offset:offset + count] = f0[:count]
+            results.put(
+                (generation, part, time.perf_counter() - start_time))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del audio
+        del f0_out
+        input_shm.close()
+        output_shm.close()
+
+
+class HarvestPool:
+    """
+    Persistent worker processes computing harvest F0 in parallel.
+
+    The audio of a block is copied once into a shared input buffer, each
+    worker runs harvest on one overlapping part of it and writes the
+    trimmed F0 directly to its place in a shared output array. Only small
+    tuples of indices pass through the queues, no audio or F0 is pickled.
+    Workers start on the first call.
+
+    Tasks of a block that timed out may still be queued or running when
+    the buffers are reused. Workers only write F0 of the current block
+    (shared generation number, checked under its lock).
+    """
+    def __init__(self, workers, max_seconds=MAX_SECONDS):
+        """
+        Args:
+            workers (int): Number of worker processes (parts per block).
+            max_seconds (float): Longest audio the shared buffers hold.
+        """
+        self.workers = max(1, int(workers))
+        self.capacity = int(max_seconds * SAMPLERATE)
+        self.started = False
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=STATS_BLOCKS)
+        self.worker_times = deque(maxlen=STATS_BLOCKS)
+
+    def start(self):
+        self.input_shm = shared_memory.SharedMemory(
+            create=True, size=self.capacity * 8)
+        self.output_shm = shared_memory.SharedMemory(
+            create=True, size=(self.capacity // HOP + 1) * 8)
+        self.audio = np.ndarray(
+            (self.capacity,), dtype=np.float64, buffer=self.input_shm.buf)
+        self.f0 = np.ndarray(
+            (self.capacity // HOP + 1,), dtype=np.float64,
+            buffer=self.output_shm.buf)
+        self.tasks = mp.Queue()
+        self.results = mp.Queue()
+        self.current = mp.Value("q", self.generation)
+        self.processes = []
+        for _ in range(self.workers):
+            process = mp.Process(
+                target=_harvest_worker,
+                args=(
+                    self.input_shm.name,
+                    self.output_shm.name,
+                    self.capacity,
+                    self.tasks,
+                    self.results,
+                    self.current),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+        self.started = True
+
+    def harvest(self, x):
+        """
+        Computes harvest F0 of 16 kHz audio.
+
+        Args:
+            x (np.ndarray): Audio samples.
+
+        Returns:
+            np.ndarray: float64 F0 with one value per 10 ms
+              (len(x) // 160 + 1), not yet median filtered.
+
+        Raises:
+            ValueError: If x is longer than the shared buffer.
+            TimeoutError: If the workers do not answer in time.
+        """
+        length = len(x)
+        if length > self.capacity:
+            raise ValueError(
+                f"{length} samples exceed the f0 pool buffer "
+                f"of {self.capacity}")
+
+        with self.lock:
+            if not self.started:
+                self.start()
+            start_time = time.perf_counter()
+
+            # same split as the former queue based version
+            part_length = HOP * ((length // HOP - 1) // self.workers + 1)
+            parts = (length // HOP - 1) // (part_length // HOP) + 1
+            frames = length // HOP + 1
+
+            with self.current.get_lock():
+                # tasks of a timed out block stop writing from here on
+                self.generation += 1
+                self.current.value = self.generation
+                self.f0[:frames] = 0
+            self.audio[:length] = x
+            for part in range(parts):
+                start = max(0, part_length * part - OVERLAP)
+                end = min(length, part_length * (part + 1) + OVERLAP)
+                trim_head = 0 if part == 0 else 2
+                trim_tail = 3 if part == 0 or part != parts - 1 else 0
+                self.tasks.put((
+                    self.generation, part, start, end, trim_head, trim_tail,
+                    part_length * part // HOP))
+
+            worker_time = 0.0
+            pending = parts
+            deadline = time.time() + RESULT_TIMEOUT
+            while pending:
+                try:
+                    generation, _, elapsed = self.results.get(
+                        timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    raise TimeoutError("f0 pool workers did not answer")
+                if generation != self.generation:
+                    continue  # late result of a timed out block
+                worker_time = max(worker_time, elapsed)
+                pending -= 1
+
+            f0 = self.f0[:frames].copy()
+            self.latencies.append(time.perf_counter() - start_time)
+            self.worker_times.append(worker_time)
+            return f0
+
+    def get_stats(self):
+        """
+        Returns block latency statistics of the recent blocks.
+
+        Returns:
+            dict: Number of blocks, mean and 95th percentile latency,
+              mean time of the slowest part and mean overhead (copy,
+              dispatch and collection) in milliseconds.
+        """
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"workers": self.workers, "blocks": 0}
+        mean = sum(latencies) / len(latencies)
+        worker_mean = sum(self.worker_times) / len(self.worker_times)
+        return {
+            "workers": self.workers,
+            "blocks": len(latencies),
+            "mean_ms": mean * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "slowest_part_ms": worker_mean * 1000,
+            "overhead_ms": (mean - worker_mean) * 1000,
+        }
+
+    def close(self):
+        """
+        Stops the workers and frees the shared buffers.
+        """
+        with self.lock:
+            if not self.started:
+                return
+            for _ in self.processes:
+                self.tasks.put(None)
+            for process in self.processes:
+                process.join(timeout=2)
+                if process.is_alive():
+                    process.terminate()
+            del self.audio
+            del self.f0
+            for shm in (self.input_shm, self.output_shm):
+                shm.close()
+                shm.unlink()
+            self.started = False
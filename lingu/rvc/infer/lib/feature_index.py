@@ -0,0 +1,145 @@
+"""
+Retrieval index of a voice for the realtime conversion.
+
+The feature bank (all training features, formerly reconstructed from the
+index into a float32 array per loaded voice) is written once as float16
+.npy sidecar next to the .index file and memory-mapped, so only the rows
+that searches actually return are paged in. IVF indexes are memory-mapped
+as well when faiss supports it. Search parameters of approximate indexes
+(nprobe for IVF/PQ, efSearch for HNSW) are set through faiss'
+ParameterSpace, so they work for wrapped indexes too.
+"""
+import numpy as np
+import logging
+import faiss
+import os
+
+logger = logging.getLogger(__name__)
+
+BANK_DTYPE = np.float16
+RECONSTRUCT_BATCH = 65536
+
+
+def bank_path(index_path):
+    return f"{os.path.splitext(index_path)[0]}.features.f16.npy"
+
+
+def write_bank(index, path):
+    """
+    Reconstructs all vectors of an index into a float16 .npy file.
+    """
+    bank = np.lib.format.open_memmap(
+        f"{path}.tmp", mode="w+", dtype=BANK_DTYPE,
+        shape=(index.ntotal, index.d))
+    for start in range(0, index.ntotal, RECONSTRUCT_BATCH):
+        count = min(RECONSTRUCT_BATCH, index.ntotal - start)
+        bank[start:start + count] = index.reconstruct_n(start, count)
+    bank.flush()
+    del bank
+    os.replace(f"{path}.tmp", path)
+
+
+def _read_index(index_path, mmap):
+    if mmap:
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP), True
+        except RuntimeError:
+            # index types without mmap support (e.g. flat) load normally
+            pass
+    return faiss.read_index(index_path), False
+
+
+class FeatureIndex:
+    """
+    Faiss index plus memory-mapped feature bank of one voice.
+    """
+    def __init__(self, index_path, nprobe=1, efsearch=16, mmap=True):
+        """
+        Args:
+            index_path (str): Path of the voice's .index file.
+            nprobe (int): Inverted lists visited per query (IVF, IVFPQ).
+              Higher is more exact and slower.
+            efsearch (int): Search depth of HNSW indexes.
+            mmap (bool): Memory-map the index and the feature bank
+              instead of reading them into RAM.
+        """
+        self.index_path = index_path
+        self.index, self.index_mapped = _read_index(index_path, mmap)
+
+        sidecar = bank_path(index_path)
+        if not os.path.exists(sidecar) or \
+                os.path.getmtime(sidecar) < os.path.getmtime(index_path):
+            logger.info("Writing feature bank %s", sidecar)
+            write_bank(self.index, sidecar)
+        self.bank = np.load(sidecar, mmap_mode="r" if mmap else None)
+        self.bank_path = sidecar
+
+        self.set_search_parameters(nprobe, efsearch)
+
+    def set_search_parameters(self, nprobe=None, efsearch=None):
+        """
+        Tunes the search of approximate indexes, parameters the index
+        does not have are ignored.
+        """
+        parameters = faiss.ParameterSpace()
+        for name, value in (("nprobe", nprobe), ("efSearch", efsearch)):
+            if value is None:
+                continue
+            try:
+                parameters.set_index_parameter(self.index, name, int(value))
+            except RuntimeError:
+                pass
+
+    def retrieve(self, feats, k=8):
+        """
+        Replaces every feature by the inverse square distance weighted
+        mean of its k nearest training features.
+
+        Args:
+            feats (np.ndarray): float32 features of shape (frames, dim).
+            k (int): Number of neighbours.
+
+        Returns:
+            np.ndarray: float32 retrieved features of shape (frames, dim).
+        """
+        score, ix = self.index.search(feats, k=k)
+        weight = np.square(1 / score)
+        # approximate indexes return -1 if fewer than k neighbours are
+        # found in the visited lists
+        missing = ix < 0
+        weight[missing] = 0
+        ix[missing] = 0
+        weight /= np.maximum(
+            weight.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        neighbours = self.bank[ix].astype(np.float32)
+        return np.einsum("fkd,fk->fd", neighbours, weight)
+
+    def memory_usage(self):
+        """
+        Returns:
+            dict: Vector count and dimension, index type, and the bytes
+              of the index and the feature bank, each with a flag telling
+              if it is memory-mapped (paged in on demand) or in RAM.
+        """
+        return {
+            "vectors": self.index.ntotal,
+            "dim": self.index.d,
+            "index_type": type(faiss.downcast_index(self.index)).__name__,
+            "index_bytes": os.path.getsize(self.index_path),
+            "index_mapped": self.index_mapped,
+            "bank_bytes": self.bank.nbytes,
+            "bank_mapped": isinstance(self.bank, np.memmap),
+        }
+
+    def describe(self):
+        usage = self.memory_usage()
+
+        def size(key):
+            where = "mapped" if usage[key.replace("bytes", "mapped")] \
+                else "in ram"
+            return f"{usage[key] / 1024 / 1024:.1f} MB {where}"
+
+        return (f"{os.path.basename(self.index_path)}: "
+                f"{usage['vectors']} x {usage['dim']} {usage['index_type']}, "
+                f"index {size('index_bytes')}, "
+                f"float16 bank {size('bank_bytes')}")
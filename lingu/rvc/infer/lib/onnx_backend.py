@@ -0,0 +1,336 @@
+"""
+ONNX Runtime execution of the realtime voice conversion models.
+
+HuBERT, the synthesizer and RMVPE are exported once from their torch
+checkpoints and cached next to them (see *_onnx_path), later starts load
+the cached files directly. All sessions run on the CPU execution provider
+with a configurable number of intra op threads.
+"""
+from lingu.rvc.infer.lib.infer_pack.models_onnx import SynthesizerTrnMsNSFsidM
+import numpy as np
+import logging
+import torch
+import os
+
+logger = logging.getLogger(__name__)
+
+OPSET = 17
+PROVIDERS = ["CPUExecutionProvider"]
+# length of the dummy inputs used to trace the models
+EXPORT_SAMPLES = 16000
+EXPORT_FRAMES = 100
+
+
+def hubert_onnx_path(hubert_path, version):
+    # v1 models use layer 9 with projection, v2 models layer 12
+    return f"{os.path.splitext(hubert_path)[0]}.{version}.onnx"
+
+
+def synthesizer_onnx_path(pth_path):
+    return f"{os.path.splitext(pth_path)[0]}.realtime.onnx"
+
+
+def rmvpe_onnx_path(rmvpe_path):
+    return f"{os.path.splitext(rmvpe_path)[0]}.onnx"
+
+
+def is_stale(onnx_path, source_path):
+    """
+    Returns True if the export is missing or older than its checkpoint.
+    """
+    if not os.path.exists(onnx_path):
+        return True
+    return os.path.getmtime(onnx_path) < os.path.getmtime(source_path)
+
+
+def create_session(onnx_path, threads=0):
+    """
+    Opens an ONNX model on the CPU.
+
+    Args:
+        onnx_path (str): Path of the .onnx file.
+        threads (int): Intra op threads, 0 lets onnxruntime use one
+          thread per physical core.
+
+    Returns:
+        onnxruntime.InferenceSession: The session.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = int(threads)
+    # the models run one after another, parallelism is inside the ops
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = \
+        ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        onnx_path, sess_options=options, providers=PROVIDERS)
+
+
+def _add_metadata(onnx_path, metadata):
+    import onnx
+
+    model = onnx.load(onnx_path)
+    for key, value in metadata.items():
+        entry = model.metadata_props.add()
+        entry.key = key
+        entry.value = str(value)
+    onnx.save(model, onnx_path)
+
+
+class HubertFeatures(torch.nn.Module):
+    """
+    HuBERT feature extraction as used by the realtime conversion.
+    """
+    def __init__(self, model, version):
+        super().__init__()
+        self.model = model
+        self.version = version
+
+    def forward(self, source):
+        logits = self.model.extract_features(
+            source=source,
+            padding_mask=None,
+            output_layer=9 if self.version == "v1" else 12)
+        if self.version == "v1":
+            return self.model.final_proj(logits[0])
+        return logits[0]
+
+
+class RealtimeSynthesizer(torch.nn.Module):
+    """
+    Synthesizer inference of a block.
+
+    Equivalent to SynthesizerTrnMs*NSFsid.infer with skip_head and
+    return_length, but the noise is an input and the returned frames are
+    given as indices, so the whole graph stays dynamic when exported.
+    """
+    def __init__(self, net_g):
+        super().__init__()
+        self.net_g = net_g
+
+    def forward(self, phone, phone_lengths, pitch, pitchf, sid, rnd, frames):
+        g = self.net_g.emb_g(sid).unsqueeze(-1)
+        m_p, logs_p, x_mask = self.net_g.enc_p(phone, pitch, phone_lengths)
+        z_p = (m_p + torch.exp(logs_p) * rnd * 0.66666) * x_mask
+        z_p = z_p.index_select(2, frames)
+        x_mask = x_mask.index_select(2, frames)
+        pitchf = pitchf.index_select(1, frames)
+        z = self.net_g.flow(z_p, x_mask, g=g, reverse=True)
+        return self.net_g.dec(z * x_mask, pitchf, g=g)
+
+
+def export_hubert(hubert_path, version, onnx_path):
+    """
+    Exports the HuBERT feature extractor for a model version.
+    """
+    import fairseq
+
+    models, _, _ = fairseq.checkpoint_utils.load_model_ensemble_and_task(
+        [hubert_path], suffix="")
+    model = HubertFeatures(models[0].float().eval(), version)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (torch.zeros(1, EXPORT_SAMPLES),),
+            onnx_path,
+            input_names=["source"],
+            output_names=["feats"],
+            dynamic_axes={"source": {1: "samples"}, "feats": {1: "frames"}},
+            opset_version=OPSET,
+            do_constant_folding=True)
+
+
+def export_synthesizer(pth_path, onnx_path):
+    """
+    Exports the synthesizer of a voice, storing its sample rate, pitch
+    flag and version as model metadata.
+
+    Raises:
+        ValueError: If the voice has no pitch guidance (not supported).
+    """
+    cpt = torch.load(pth_path, map_location="cpu")
+    if cpt.get("f0", 1) != 1:
+        raise ValueError(
+            f"{pth_path} has no pitch guidance, "
+            "only pitch guided voices can run on onnxruntime")
+    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]
+    version = cpt.get("version", "v1")
+    vec_channels = 256 if version == "v1" else 768
+
+    net_g = SynthesizerTrnMsNSFsidM(
+        *cpt["config"], is_half=False, version=version)
+    net_g.load_state_dict(cpt["weight"], strict=False)
+    net_g.eval()
+    net_g.remove_weight_norm()
+    inter_channels = net_g.inter_channels
+
+    frames = EXPORT_FRAMES
+    inputs = (
+        torch.rand(1, frames, vec_channels),
+        torch.LongTensor([frames]),
+        torch.randint(size=(1, frames), low=5, high=255),
+        torch.rand(1, frames) * 300,
+        torch.LongTensor([0]),
+        torch.randn(1, inter_channels, frames),
+        torch.arange(frames // 2, frames),
+    )
+    with torch.no_grad():
+        torch.onnx.export(
+            RealtimeSynthesizer(net_g),
+            inputs,
+            onnx_path,
+            input_names=[
+                "phone", "phone_lengths", "pitch", "pitchf", "sid", "rnd",
+                "frames"],
+            output_names=["audio"],
+            dynamic_axes={
+                "phone": {1: "frames_in"},
+                "pitch": {1: "frames_in"},
+                "pitchf": {1: "frames_in"},
+                "rnd": {2: "frames_in"},
+                "frames": {0: "frames_out"},
+                "audio": {2: "samples"},
+            },
+            opset_version=OPSET,
+            do_constant_folding=True)
+
+    _add_metadata(onnx_path, {
+        "tgt_sr": cpt["config"][-1],
+        "f0": 1,
+        "version": version,
+    })
+
+
+def export_rmvpe(rmvpe_path, onnx_path):
+    """
+    Exports the RMVPE pitch network (mel spectrogram to salience).
+    """
+    from lingu.rvc.infer.lib.rmvpe import E2E
+
+    model = E2E(4, 1, (2, 2))
+    model.load_state_dict(torch.load(rmvpe_path, map_location="cpu"))
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (torch.rand(1, 128, 32 * 4),),
+            onnx_path,
+            input_names=["mel"],
+            output_names=["hidden"],
+            dynamic_axes={"mel": {2: "frames"}, "hidden": {1: "frames"}},
+            opset_version=OPSET,
+            do_constant_folding=True)
+
+
+def load_session(onnx_path, source_path, export, threads=0):
+    """
+    Exports a model if its cached export is missing or outdated and
+    opens it.
+
+    Args:
+        onnx_path (str): Path of the cached export.
+        source_path (str): Path of the torch checkpoint.
+        export (callable): Called with onnx_path to write the export.
+        threads (int): Intra op threads of the session.
+    """
+    if is_stale(onnx_path, source_path):
+        logger.info("Exporting %s to %s", source_path, onnx_path)
+        export(onnx_path)
+    return create_session(onnx_path, threads)
+
+
+class OnnxRealtimeModels:
+    """
+    HuBERT and synthesizer sessions of one voice, with the same
+    conversion steps as RVC.infer runs in torch.
+    """
+    def __init__(self, pth_path, hubert_path, threads=0, hubert_loader=None):
+        """
+        Args:
+            pth_path (str): Voice checkpoint.
+            hubert_path (str): HuBERT checkpoint.
+            threads (int): Intra op threads per session.
+            hubert_loader (callable, optional): Returns the HuBERT session
+              for a model version, lets voices share one session.
+        """
+        self.threads = threads
+        self.synthesizer = load_session(
+            synthesizer_onnx_path(pth_path),
+            pth_path,
+            lambda path: export_synthesizer(pth_path, path),
+            threads)
+        metadata = self.synthesizer.get_modelmeta().custom_metadata_map
+        self.tgt_sr = int(metadata["tgt_sr"])
+        self.if_f0 = int(metadata["f0"])
+        self.version = metadata["version"]
+        inputs = {i.name: i for i in self.synthesizer.get_inputs()}
+        self.inter_channels = inputs["rnd"].shape[1]
+
+        if hubert_loader is None:
+            self.hubert = load_hubert_session(
+                hubert_path, self.version, threads)
+        else:
+            self.hubert = hubert_loader(self.version)
+        self.rng = np.random.default_rng()
+
+    def extract_features(self, audio):
+        """
+        Args:
+            audio (np.ndarray): 16 kHz float32 audio.
+
+        Returns:
+            np.ndarray: Features of shape (1, frames, channels).
+        """
+        source = np.ascontiguousarray(audio, dtype=np.float32)[None]
+        return self.hubert.run(None, {"source": source})[0]
+
+    def synthesize(self, feats, pitch, pitchf, skip_head, return_length):
+        """
+        Args:
+            feats (np.ndarray): Features of shape (1, frames, channels).
+            pitch (np.ndarray): Coarse pitch per frame.
+            pitchf (np.ndarray): Pitch in Hz per frame.
+            skip_head (int): Frames to skip at the start.
+            return_length (int): Frames to synthesize.
+
+        Returns:
+            np.ndarray: float32 audio at tgt_sr.
+        """
+        frames = feats.shape[1]
+        rnd = self.rng.standard_normal(
+            (1, self.inter_channels, frames), dtype=np.float32)
+        audio = self.synthesizer.run(None, {
+            "phone": np.ascontiguousarray(feats, dtype=np.float32),
+            "phone_lengths": np.array([frames], dtype=np.int64),
+            "pitch": np.asarray(pitch, dtype=np.int64)[None],
+            "pitchf": np.asarray(pitchf, dtype=np.float32)[None],
+            "sid": np.array([0], dtype=np.int64),
+            "rnd": rnd,
+            "frames": np.arange(
+                skip_head, skip_head + return_length, dtype=np.int64),
+        })[0]
+        return audio.reshape(-1)
+
+
+def load_hubert_session(hubert_path, version, threads=0):
+    """
+    Returns a HuBERT session for a model version, exporting on first use.
+    """
+    return load_session(
+        hubert_onnx_path(hubert_path, version),
+        hubert_path,
+        lambda path: export_hubert(hubert_path, version, path),
+        threads)
+
+
+def load_rmvpe_session(rmvpe_path, threads=0):
+    """
+    Returns an RMVPE session, exporting rmvpe.pt on first use.
+    """
+    return load_session(
+        rmvpe_onnx_path(rmvpe_path),
+        rmvpe_path,
+        lambda path: export_rmvpe(rmvpe_path, path),
+        threads)
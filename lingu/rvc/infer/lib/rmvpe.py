@@ -493,17 +493,26 @@ class MelSpectrogram(torch.nn.Module):
 
 
 class RMVPE:
-    def __init__(self, model_path: str, is_half, device=None, use_jit=False):
+    def __init__(
+        self, model_path: str, is_half, device=None, use_jit=False, session=None
+    ):
+        """
+        session: optional onnxruntime session of the model, used instead
+        of torch (see onnx_backend.load_rmvpe_session)
+        """
         self.resample_kernel = {}
         self.resample_kernel = {}
         self.is_half = is_half
         if device is None:
             device = "cuda:0" if torch.cuda.is_available() else "cpu"
         self.device = device
+        self.is_onnx = session is not None or "privateuseone" in str(device)
         self.mel_extractor = MelSpectrogram(
             is_half, 128, 16000, 1024, 160, None, 30, 8000
         ).to(device)
-        if "privateuseone" in str(device):
+        if session is not None:
+            self.model = session
+        elif "privateuseone" in str(device):
             import onnxruntime as ort
 
             ort_session = ort.InferenceSession(
@@ -572,7 +581,7 @@ class RMVPE:
             n_pad = 32 * ((n_frames - 1) // 32 + 1) - n_frames
             if n_pad > 0:
                 mel = F.pad(mel, (0, n_pad), mode="constant")
-            if "privateuseone" in str(self.device):
+            if self.is_onnx:
                 onnx_input_name = self.model.get_inputs()[0].name
                 onnx_outputs_names = self.model.get_outputs()[0].name
                 hidden = self.model.run(
@@ -606,7 +615,7 @@ class RMVPE:
         # torch.cuda.synchronize()
         # t2 = ttime()
         # print(234234,hidden.device.type)
-        if "privateuseone" not in str(self.device):
+        if not self.is_onnx:
             hidden = hidden.squeeze(0).cpu().numpy()
         else:
             hidden = hidden[0]
@@ -620,29 +629,24 @@ class RMVPE:
         return f0
 
     def to_local_average_cents(self, salience, thred=0.05):
-        # t0 = ttime()
+        n_frames, n_bins = salience.shape
         center = np.argmax(salience, axis=1)  # 帧长#index
-        salience = np.pad(salience, ((0, 0), (4, 4)))  # 帧长,368
-        # t1 = ttime()
-        center += 4
-        todo_salience = []
-        todo_cents_mapping = []
-        starts = center - 4
-        ends = center + 5
-        for idx in range(salience.shape[0]):
-            todo_salience.append(salience[:, starts[idx] : ends[idx]][idx])
-            todo_cents_mapping.append(self.cents_mapping[starts[idx] : ends[idx]])
-        # t2 = ttime()
-        todo_salience = np.array(todo_salience)  # 帧长，9
-        todo_cents_mapping = np.array(todo_cents_mapping)  # 帧长，9
+        # 9 bin window around the peak of every frame, gathered in one go;
+        # bins outside the 360 are zero, like in the padded salience
+        windows = center[:, None] + np.arange(-4, 5)
+        inside = (windows >= 0) & (windows < n_bins)
+        todo_salience = np.where(
+            inside,
+            np.take_along_axis(salience, np.clip(windows, 0, n_bins - 1), 1),
+            0,
+        ).astype(salience.dtype, copy=False)  # 帧长，9
+        todo_cents_mapping = self.cents_mapping[windows + 4]  # 帧长，9
         product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
         weight_sum = np.sum(todo_salience, 1)  # 帧长
         devided = product_sum / weight_sum  # 帧长
-        # t3 = ttime()
-        maxx = np.max(salience, axis=1)  # 帧长
+        # the peak is the maximum, the zero padding counted as well
+        maxx = np.maximum(salience[np.arange(n_frames), center], 0)  # 帧长
         devided[maxx <= thred] = 0
-        # t4 = ttime()
-        # print("decode:%s\t%s\t%s\t%s" % (t1 - t0, t2 - t1, t3 - t2, t4 - t3))
         return devided
 
 
@@ -1,9 +1,17 @@
 import torch.multiprocessing as mp
 from .configs.config import Config
-from queue import Empty
+from .audio_ring import SharedAudioRing
+from .f0_pool import HarvestPool
+from .voice_cache import VoiceCache
+from .stream_buffers import RingTensor, StageTimer, frame_rms
+from lingu.core.resample import StreamResampler
+from lingu.core.tracer import tracer
 from lingu import cfg
+from collections import deque
 import numpy as np
+import threading
 import torch
+import time
 import glob
 import gc
 import sys
@@ -15,33 +23,81 @@ flag_vc = False
 rvc_model_path = cfg("rvc_model_path")
 PTH_DEFAULT = os.path.join(rvc_model_path, "Samantha.pth")
 INDEX_DEFAULT = os.path.join(rvc_model_path, "Samantha.index")
+FEED_BUFFER_BLOCKS = 4
+PLAY_SAMPLERATE = 40000
+PLAY_BUFFER_SECONDS = 60
+PLAY_PERIOD_FRAMES = 400  # 10 ms, keeps stop responsive
+CACHE_VOICES = cfg("speech", "rvc_cache_voices", default=3)
+CACHE_MB = cfg("speech", "rvc_cache_mb", default=0)
+SWITCH_STATS = 50
+SYNC_TIMINGS = cfg("speech", "rvc_sync_timings", default=False)
+STAGES = ["resample", "feature", "index", "f0", "model", "mix", "sola"]
+
+
+def _phase_vocoder(a, b, fade_out, fade_in):
+    window = torch.sqrt(fade_out * fade_in)
+    fa = torch.fft.rfft(a * window)
+    fb = torch.fft.rfft(b * window)
+    absab = torch.abs(fa) + torch.abs(fb)
+    n = a.shape[0]
+    if n % 2 == 0:
+        absab[1:-1] *= 2
+    else:
+        absab[1:] *= 2
+    phia = torch.angle(fa)
+    phib = torch.angle(fb)
+    deltaphase = phib - phia
+    deltaphase = deltaphase - 2 * np.pi * torch.floor(
+        deltaphase / 2 / np.pi + 0.5)
+    w = 2 * np.pi * torch.arange(n // 2 + 1).to(a) + deltaphase
+    t = torch.arange(n).unsqueeze(-1).to(a) / n
+    result = (
+        a * (fade_out**2)
+        + b * (fade_in**2)
+        + torch.sum(absab * torch.cos(w * t + phia), -1) * window / n
+    )
+    return result
 
 
 def _stream_play_worker(
-        stream_queue: mp.Queue,
+        ring_name: str,
+        ring_capacity: int,
+        data_event: mp.Event,
         shutdown_event: mp.Event,
         finished_event: mp.Event,
         ):
     import pyaudio
+    ring = SharedAudioRing(ring_capacity, name=ring_name)
     pyaudio_instance = pyaudio.PyAudio()
     stream = pyaudio_instance.open(
         format=pyaudio.paFloat32,
         channels=1,
-        rate=40000,
+        rate=PLAY_SAMPLERATE,
         output=True)
     stream.start_stream()
+    period = np.zeros(PLAY_PERIOD_FRAMES, dtype=np.float32)
+
+    try:
+        while not shutdown_event.is_set():
+            ring.handle_flush()
+
+            frames = ring.read_into(period)
+            if frames:
+                stream.write(period[:frames].tobytes())
 
-    while not shutdown_event.is_set():
-        try:
-            name, chunk_to_play = stream_queue.get(timeout=0.02)
-            if name == "play":
-                stream.write(chunk_to_play)
-            elif name == "finished":
+            if ring.finished_reached():
                 finished_event.set()
-        except Empty:
-            continue
-        except KeyboardInterrupt:
-            break
+
+            if not frames:
+                # clear before checking again, so a write between the
+                # check and the wait is not missed
+                data_event.clear()
+                if not ring.frames_queued():
+                    data_event.wait(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
 
 
 def printt(strr, *args):
@@ -71,11 +127,31 @@ class GUIConfig:
 
 
 class RealtimeRVCBase:
-    def __init__(self, pth: str = None, index: str = None) -> None:
+    def __init__(
+            self,
+            pth: str = None,
+            index: str = None,
+            backend: str = None,
+            onnx_threads: int = None,
+            f0_pool: HarvestPool = None) -> None:
+        """
+        Args:
+            pth (str): Voice checkpoint.
+            index (str): Faiss index of the voice.
+            backend (str): torch or onnx, None uses speech/rvc_backend.
+            onnx_threads (int): Onnxruntime threads per model,
+              None uses speech/rvc_onnx_threads.
+            f0_pool (HarvestPool, optional): Harvest pool shared with
+              other voices, a pool of its own is created if None.
+        """
         self.gui_config = GUIConfig()
         self.config = Config()
         self.function = "vc"
         self.rvc = None
+        self.f0_pool = f0_pool
+        self.owns_f0_pool = f0_pool is None
+        self.backend = backend
+        self.onnx_threads = onnx_threads
         if pth is not None:
             self.gui_config.pth_path = pth
         if index is not None:
@@ -90,9 +166,10 @@ class RealtimeRVCBase:
 
         torch.cuda.empty_cache()
         import lingu.rvc.tools.rvc_for_realtime as rvc_for_realtime
-        from multiprocessing import Queue
-        inp_q = Queue()
-        opt_q = Queue()
+
+        if self.f0_pool is None and int(self.gui_config.n_cpu) > 1:
+            # workers start with the first harvest block
+            self.f0_pool = HarvestPool(int(self.gui_config.n_cpu))
 
         self.rvc = rvc_for_realtime.RVC(
             self.gui_config.pitch,
@@ -100,10 +177,11 @@ class RealtimeRVCBase:
             self.gui_config.index_path,
             self.gui_config.index_rate,
             self.gui_config.n_cpu,
-            inp_q,
-            opt_q,
+            self.f0_pool,
             self.config,
             self.rvc if hasattr(self, "rvc") else None,
+            backend=self.backend,
+            onnx_threads=self.onnx_threads,
         )
         self.gui_config.samplerate = (
             self.rvc.tgt_sr
@@ -145,29 +223,51 @@ class RealtimeRVCBase:
             )
             * self.zc
         )
-        self.input_wav: torch.Tensor = torch.zeros(
+        device = self.config.device
+        input_frame = (
             self.extra_frame
             + self.crossfade_frame
             + self.sola_search_frame
-            + self.block_frame,
-            device=self.config.device,
-            dtype=torch.float32,
-        )
-        self.input_wav_res: torch.Tensor = torch.zeros(
-            160 * self.input_wav.shape[0] // self.zc,
-            device=self.config.device,
-            dtype=torch.float32,
+            + self.block_frame
         )
+        # streaming state, advanced by moving a head instead of shifting
+        self.input_wav = RingTensor(input_frame, device)
+        self.input_wav_res = RingTensor(160 * input_frame // self.zc, device)
+        self.output_buffer = RingTensor(input_frame, device)
         self.sola_buffer: torch.Tensor = torch.zeros(
             self.sola_buffer_frame,
-            device=self.config.device,
+            device=device,
             dtype=torch.float32
         )
         self.nr_buffer: torch.Tensor = self.sola_buffer.clone()
-        self.output_buffer: torch.Tensor = self.input_wav.clone()
         self.res_buffer: torch.Tensor = torch.zeros(
-            2 * self.zc, device=self.config.device, dtype=torch.float32
+            2 * self.zc, device=device, dtype=torch.float32
+        )
+        # preallocated workspaces of the per block processing
+        self.block_in: torch.Tensor = torch.zeros(
+            self.block_frame, device=device, dtype=torch.float32
         )
+        self.nr_input: torch.Tensor = torch.zeros(
+            2 * self.zc + self.block_frame, device=device, dtype=torch.float32
+        )
+        self.rms_workspace: torch.Tensor = torch.zeros(
+            max(input_frame, self.input_wav_res.length),
+            device=device,
+            dtype=torch.float32,
+        )
+        self.sola_workspace: torch.Tensor = torch.zeros(
+            self.sola_buffer_frame + self.sola_search_frame,
+            device=device,
+            dtype=torch.float32,
+        )
+        self.sola_ones: torch.Tensor = torch.ones(
+            1, 1, self.sola_buffer_frame, device=device, dtype=torch.float32
+        )
+        sync = None
+        if SYNC_TIMINGS and "cuda" in str(device):
+            sync = torch.cuda.synchronize
+        self.timer = StageTimer(STAGES, sync=sync)
+        self.rvc.sync = sync
         self.skip_head = self.extra_frame // self.zc
         self.return_length = (
             self.block_frame + self.sola_buffer_frame + self.sola_search_frame
@@ -213,71 +313,61 @@ class RealtimeRVCBase:
         - handles incoming audio data, applies transformations, and sends it
           to the output
         """
-        # import time
-        import librosa
-        import torch
         import torch.nn.functional as F
 
         global flag_vc
-        # start_time = time.perf_counter()
-        indata = librosa.to_mono(indata.T)
+        timer = self.timer
+        timer.start()
+        if indata.ndim > 1:
+            indata = indata.mean(axis=1)
+        block = self.block_in
+        block.copy_(torch.from_numpy(indata))
         if self.gui_config.threhold > -60:
-            rms = librosa.feature.rms(
-                y=indata, frame_length=4 * self.zc, hop_length=self.zc
-            )
-            db_threhold = (
-                librosa.amplitude_to_db(rms, ref=1.0)[0]
-                < self.gui_config.threhold
-            )
-            for i in range(db_threhold.shape[0]):
-                if db_threhold[i]:
-                    indata[i * self.zc: (i + 1) * self.zc] = 0
-        self.input_wav[: -self.block_frame] = self.input_wav[
-            self.block_frame:
-        ].clone()
-        self.input_wav[-self.block_frame:] = torch.from_numpy(indata).to(
-            self.config.device
-        )
-        self.input_wav_res[: -self.block_frame_16k] = self.input_wav_res[
-            self.block_frame_16k:
-        ].clone()
+            # librosa.amplitude_to_db of the frame rms (top_db=80)
+            rms = frame_rms(block, 4 * self.zc, self.zc, self.rms_workspace)
+            db = 10 * torch.log10(torch.clamp(rms * rms, min=1e-10))
+            db = torch.maximum(db, db.max() - 80)
+            keep = db[:-1] >= self.gui_config.threhold
+            block.view(-1, self.zc).mul_(keep[:, None])
+        self.input_wav.push(block)
+        input_window = self.input_wav.window()
+        self.input_wav_res.advance(self.block_frame_16k)
         # input noise reduction and resampling
         if self.gui_config.I_noise_reduce and self.function == "vc":
-            input_wav = self.input_wav[
-                -self.sola_buffer_frame - self.block_frame - 2 * self.zc:
-            ]
             input_wav = self.tg(
-                input_wav.unsqueeze(0), self.input_wav.unsqueeze(0)
+                input_window[
+                    -self.sola_buffer_frame - self.block_frame - 2 * self.zc:
+                ].unsqueeze(0),
+                input_window.unsqueeze(0),
             )[0, 2 * self.zc:]
             input_wav[: self.sola_buffer_frame] *= self.fade_in_window
             input_wav[: self.sola_buffer_frame] += (
                 self.nr_buffer * self.fade_out_window
             )
             self.nr_buffer[:] = input_wav[self.block_frame:]
-            input_wav = torch.cat(
-                (self.res_buffer[:], input_wav[: self.block_frame])
-            )
-            self.res_buffer[:] = input_wav[-2 * self.zc:]
-            self.input_wav_res[-self.block_frame_16k - 160:] = self.resampler(
-                input_wav
-            )[160:]
+            self.nr_input[: 2 * self.zc] = self.res_buffer
+            self.nr_input[2 * self.zc:] = input_wav[: self.block_frame]
+            self.res_buffer[:] = self.nr_input[-2 * self.zc:]
+            self.input_wav_res.write_tail(self.resampler(self.nr_input)[160:])
         else:
-            self.input_wav_res[-self.block_frame_16k - 160:] = self.resampler(
-                self.input_wav[-self.block_frame - 2 * self.zc:]
-            )[160:]
+            self.input_wav_res.write_tail(self.resampler(
+                input_window[-self.block_frame - 2 * self.zc:]
+            )[160:])
+        timer.stamp("resample")
         # infer
         if self.function == "vc":
             infer_wav = self.rvc.infer(
-                self.input_wav_res,
+                self.input_wav_res.window(),
                 self.block_frame_16k,
                 self.skip_head,
                 self.return_length,
                 self.gui_config.f0method,
             )
+            timer.add(self.rvc.timings)
             if self.resampler2 is not None:
                 infer_wav = self.resampler2(infer_wav)
         else:
-            infer_wav = self.input_wav[
+            infer_wav = input_window[
                 -self.crossfade_frame - self.sola_search_frame
                 - self.block_frame:
             ].clone()
@@ -285,66 +375,49 @@ class RealtimeRVCBase:
         if (self.gui_config.O_noise_reduce and self.function == "vc") or (
             self.gui_config.I_noise_reduce and self.function == "im"
         ):
-            self.output_buffer[: -self.block_frame] = self.output_buffer[
-                self.block_frame:
-            ].clone()
-            self.output_buffer[-self.block_frame:] = \
-                infer_wav[-self.block_frame:]
+            self.output_buffer.push(infer_wav[-self.block_frame:])
             infer_wav = self.tg(
-                infer_wav.unsqueeze(0), self.output_buffer.unsqueeze(0)
+                infer_wav.unsqueeze(0), self.output_buffer.window().unsqueeze(0)
             ).squeeze(0)
         # volume envelop mixing
         if self.gui_config.rms_mix_rate < 1 and self.function == "vc":
-            rms1 = librosa.feature.rms(
-                y=self.input_wav_res[
+            rms1 = frame_rms(
+                self.input_wav_res.window()[
                     160
                     * self.skip_head: 160
                     * (self.skip_head + self.return_length)
-                ]
-                .cpu()
-                .numpy(),
-                frame_length=640,
-                hop_length=160,
+                ],
+                640,
+                160,
+                self.rms_workspace,
             )
-            rms1 = torch.from_numpy(rms1).to(self.config.device)
             rms1 = F.interpolate(
-                rms1.unsqueeze(0),
+                rms1[None, None],
                 size=infer_wav.shape[0] + 1,
                 mode="linear",
                 align_corners=True,
             )[0, 0, :-1]
-            rms2 = librosa.feature.rms(
-                y=infer_wav[:].cpu().numpy(),
-                frame_length=4 * self.zc,
-                hop_length=self.zc,
-            )
-            rms2 = torch.from_numpy(rms2).to(self.config.device)
+            rms2 = frame_rms(
+                infer_wav, 4 * self.zc, self.zc, self.rms_workspace)
             rms2 = F.interpolate(
-                rms2.unsqueeze(0),
+                rms2[None, None],
                 size=infer_wav.shape[0] + 1,
                 mode="linear",
                 align_corners=True,
             )[0, 0, :-1]
-            rms2 = torch.max(rms2, torch.zeros_like(rms2) + 1e-3)
-            infer_wav *= torch.pow(
-                rms1 / rms2, torch.tensor(1 - self.gui_config.rms_mix_rate)
-            )
+            rms2.clamp_(min=1e-3)
+            infer_wav *= rms1.div_(rms2).pow_(1 - self.gui_config.rms_mix_rate)
+        timer.stamp("mix")
         # SOLA algorithm from https://github.com/yxlllc/DDSP-SVC
         conv_input = infer_wav[
             None, None, : self.sola_buffer_frame + self.sola_search_frame
         ]
         cor_nom = F.conv1d(conv_input, self.sola_buffer[None, None, :])
-        cor_den = torch.sqrt(
-            F.conv1d(
-                conv_input**2,
-                torch.ones(
-                    1,
-                    1,
-                    self.sola_buffer_frame,
-                    device=self.config.device),
-            )
-            + 1e-8
+        conv_power = torch.mul(
+            conv_input[0, 0], conv_input[0, 0], out=self.sola_workspace
         )
+        cor_den = F.conv1d(conv_power[None, None], self.sola_ones)
+        cor_den.add_(1e-8).sqrt_()
         if sys.platform == "darwin":
             _, sola_offset = torch.max(cor_nom[0, 0] / cor_den[0, 0])
             sola_offset = sola_offset.item()
@@ -352,31 +425,6 @@ class RealtimeRVCBase:
             sola_offset = torch.argmax(cor_nom[0, 0] / cor_den[0, 0])
         # printt("sola_offset = %d", int(sola_offset))
         infer_wav = infer_wav[sola_offset:]
-
-        def phase_vocoder(a, b, fade_out, fade_in):
-            window = torch.sqrt(fade_out * fade_in)
-            fa = torch.fft.rfft(a * window)
-            fb = torch.fft.rfft(b * window)
-            absab = torch.abs(fa) + torch.abs(fb)
-            n = a.shape[0]
-            if n % 2 == 0:
-                absab[1:-1] *= 2
-            else:
-                absab[1:] *= 2
-            phia = torch.angle(fa)
-            phib = torch.angle(fb)
-            deltaphase = phib - phia
-            deltaphase = deltaphase - 2 * np.pi * torch.floor(
-                deltaphase / 2 / np.pi + 0.5)
-            w = 2 * np.pi * torch.arange(n // 2 + 1).to(a) + deltaphase
-            t = torch.arange(n).unsqueeze(-1).to(a) / n
-            result = (
-                a * (fade_out**2)
-                + b * (fade_in**2)
-                + torch.sum(absab * torch.cos(w * t + phia), -1) * window / n
-            )
-            return result
-
         if ("privateuseone" in str(self.config.device)
                 or not self.gui_config.use_pv):
 
@@ -385,7 +433,7 @@ class RealtimeRVCBase:
                 self.sola_buffer * self.fade_out_window
             )
         else:
-            infer_wav[: self.sola_buffer_frame] = phase_vocoder(
+            infer_wav[: self.sola_buffer_frame] = _phase_vocoder(
                 self.sola_buffer,
                 infer_wav[: self.sola_buffer_frame],
                 self.fade_out_window,
@@ -394,20 +442,48 @@ class RealtimeRVCBase:
         self.sola_buffer[:] = infer_wav[
             self.block_frame: self.block_frame + self.sola_buffer_frame
         ]
-        if sys.platform == "darwin":
-            outdata[:] = (
-                infer_wav[: self.block_frame].cpu().numpy()[:, np.newaxis]
-            )
+        output = infer_wav[: self.block_frame].cpu().numpy()
+        if outdata.ndim == 1:
+            outdata[:] = output
         else:
-            outdata[:] = (
-                infer_wav[: self.block_frame].repeat(2, 1).t().cpu().numpy()
-            )
-        # total_time = time.perf_counter() - start_time
-        # printt("Infer time: %.2f", total_time)
+            outdata[:] = output[:, np.newaxis]
+        timer.stamp("sola")
+        timer.finish()
+
+    def get_stage_timings(self):
+        """
+        Returns the time of every processing stage of the recent blocks
+        (see StageTimer.get_stats): resample (input gate, noise reduction
+        and resampling to 16 kHz), feature, index, f0, model, mix (output
+        resampling, noise reduction and rms mixing), sola and total.
+        Stages after the model call are only timed precisely on CUDA with
+        speech/rvc_sync_timings enabled.
+        """
+        return self.timer.get_stats()
 
     def set_pitch(self, pitch):
         self.rvc.change_key(pitch)
 
+    def get_f0_stats(self):
+        """
+        Returns the block latency of the harvest f0 pool
+        (see HarvestPool.get_stats), None if no pool is used.
+        """
+        if self.f0_pool is None:
+            return None
+        return self.f0_pool.get_stats()
+
+    def get_memory(self):
+        """
+        Returns:
+            int: Bytes held by this voice alone (see RVC.get_memory).
+        """
+        return self.rvc.get_memory() if self.rvc else 0
+
+    def close(self):
+        if self.f0_pool is not None and self.owns_f0_pool:
+            self.f0_pool.close()
+
 
 class RealtimeRVC:
     def __init__(
@@ -420,11 +496,29 @@ class RealtimeRVC:
         self.yield_chunk_callback = yield_chunk_callback
         self.chunk_callback_only = False
         self.is_active = True
-        self.stream_play_chunk_queue = mp.Queue()
+        self.play_ring = SharedAudioRing(
+            PLAY_BUFFER_SECONDS * PLAY_SAMPLERATE)
+        self.play_data_event = mp.Event()
         self.shutdown_event = mp.Event()
         self.finished_event = mp.Event()
         self.started = False
         self.current_model = ""
+        # one harvest pool for all cached voices
+        n_cpu = int(GUIConfig().n_cpu)
+        self.f0_pool = HarvestPool(n_cpu) if n_cpu > 1 else None
+        self.voices = VoiceCache(
+            max_voices=CACHE_VOICES,
+            max_bytes=int(CACHE_MB * 1024 * 1024),
+            size=lambda voice: voice.get_memory(),
+            release=self._release_voice)
+        # serializes voice loading between set_model and preloading
+        self.load_lock = threading.Lock()
+        self.preload_thread = None
+        self.switch_times = deque(maxlen=SWITCH_STATS)
+        self.feed_resampler = StreamResampler(
+            24000, 40000, dtype_in=np.int16)
+        self.feed_buffer = None
+        self.out_buffer = None
 
         # start stop_worker as thread
         import threading
@@ -439,27 +533,19 @@ class RealtimeRVC:
         print("Starting RVC worker process")
         self.stream_play_worker_process = mp.Process(
             target=_stream_play_worker, args=(
-                self.stream_play_chunk_queue,
+                self.play_ring.name,
+                self.play_ring.capacity,
+                self.play_data_event,
                 self.shutdown_event,
                 self.finished_event
-                # self.stop_request_event
             ))
         self.stream_play_worker_process.start()
 
         if not model_name:
             model_name = "Samantha"
 
-        pth_path = os.path.join(rvc_model_path, model_name + ".pth")
-        index_path = os.path.join(rvc_model_path, model_name + ".index")
         print("Starting RVC with model", model_name)
-        print("pth_path:", pth_path)
-        print("index_path:", index_path)
-
-        self.rvc = RealtimeRVCBase(
-            pth=os.path.join(rvc_model_path, model_name + ".pth"),
-            index=os.path.join(rvc_model_path, model_name + ".index")
-        )
-        self.rvc.start_vc()
+        self.set_model(model_name)
 
     def set_pitch(self, pitch):
         self.rvc.set_pitch(pitch)
@@ -478,77 +564,120 @@ class RealtimeRVC:
             time.sleep(0.02)
 
     def init(self):
-        self.accumulated_chunk = []
-        self.accumulated_length = 0
+        self.feed_resampler.reset()
+        self.read_pos = 0
+        self.write_pos = 0
+        self.buffered = 0
 
-    def feed(self, audio_chunk, samplerate=24000, targetrate=40000):
-        import librosa
-        # Step 1: Convert to float32
-        audio_chunk = np.frombuffer(
-            audio_chunk,
-            dtype=np.int16
-        ).astype(np.float32) / 32768.0
-
-        # Step 2: Resample from original sample rate to 40000 Hz
-        audio_chunk = librosa.resample(
-            audio_chunk,
-            orig_sr=samplerate,
-            target_sr=targetrate
-        )
-
-        # Step 3: Accumulate chunks
-        self.accumulated_chunk += audio_chunk.tolist()
-        self.accumulated_length += len(audio_chunk)
-
-        # Check if accumulated chunk reached the required block size
-        if self.accumulated_length >= self.rvc.block_frame:
-            # Step 4: Prepare np.ndarray
-            processed_chunk = np.array(
-                self.accumulated_chunk[:self.rvc.block_frame])
-
-            # Reset the accumulated chunk
-            self.accumulated_chunk = self.accumulated_chunk[
-                self.rvc.block_frame:
-            ]
-            self.accumulated_length -= self.rvc.block_frame
-
-            # print ("rvc.block_frame: ", rvc.block_frame)
-
-            # Step 5: Process the chunk
-            outdata = np.zeros((self.rvc.block_frame, 2), dtype='float32')
+    def _allocate_buffers(self):
+        """
+        Allocates the feed ring buffer and the reusable output block.
+        The ring holds a whole number of blocks, so blocks are always
+        read from it as contiguous views.
+        """
+        block_frame = self.rvc.block_frame
+        self.feed_buffer = np.zeros(
+            FEED_BUFFER_BLOCKS * block_frame, dtype=np.float32)
+        self.out_buffer = np.zeros(block_frame, dtype=np.float32)
+        self.out_bytes = memoryview(self.out_buffer).cast("B")
+        self.init()
+
+    def _write(self, audio):
+        """
+        Copies as much audio into the ring buffer as fits.
 
-            self.rvc.audio_callback(
-                processed_chunk,
-                outdata,
-                self.rvc.block_frame,
-                None,
-                None)
+        Returns:
+            int: Number of samples written.
+        """
+        capacity = len(self.feed_buffer)
+        count = min(capacity - self.buffered, len(audio))
+        first = min(count, capacity - self.write_pos)
+        self.feed_buffer[self.write_pos:self.write_pos + first] = \
+            audio[:first]
+        self.feed_buffer[:count - first] = audio[first:count]
+        self.write_pos = (self.write_pos + count) % capacity
+        self.buffered += count
+        return count
+
+    def _process_block(self):
+        block_frame = self.rvc.block_frame
+        block = self.feed_buffer[self.read_pos:self.read_pos + block_frame]
+
+        self.rvc.audio_callback(
+            block,
+            self.out_buffer,
+            block_frame,
+            None,
+            None)
+        tracer.stamp("rvc_first_block")
+
+        self.read_pos = (self.read_pos + block_frame) % len(self.feed_buffer)
+        self.buffered -= block_frame
+
+        if not self.chunk_callback_only:
+            self.play_ring.write(self.out_buffer, self.shutdown_event)
+            self.play_data_event.set()
+        elif self.yield_chunk_callback:
+            # only valid until the next block, callbacks copy what they keep
+            self.yield_chunk_callback(self.out_bytes)
 
-            outdata_list = outdata[:, 0].tolist()
-            write_data = np.array(outdata_list, dtype='float32').tobytes()
+    def feed(self, audio_chunk, samplerate=24000, targetrate=40000):
+        """
+        Converts TTS audio and processes every complete block.
 
-            if not self.chunk_callback_only:
-                self.stream_play_chunk_queue.put(("play", write_data))
-            else:
-                if self.yield_chunk_callback:
-                    self.yield_chunk_callback(write_data)
+        Args:
+            audio_chunk (bytes): int16 audio.
+            samplerate (int): Sample rate of audio_chunk.
+            targetrate (int): Sample rate of the RVC model.
+        """
+        # Convert to float32 and resample from original sample rate
+        # to 40000 Hz (continuing the stream of the last chunk)
+        self.feed_resampler.set_rates(samplerate, targetrate)
+        audio_chunk = self.feed_resampler.process(audio_chunk)
+
+        if self.out_buffer is None or \
+                len(self.out_buffer) != self.rvc.block_frame:
+            self._allocate_buffers()
+
+        position = 0
+        while position < len(audio_chunk):
+            position += self._write(audio_chunk[position:])
+            while self.buffered >= self.rvc.block_frame:
+                self._process_block()
+
+    def frames_queued(self):
+        """
+        Returns:
+            int: Converted frames not yet handed to the sound device.
+        """
+        return self.play_ring.frames_queued()
 
     def is_playing(self):
-        # check stream_play_chunk_queue for data
-        return not self.stream_play_chunk_queue.empty()
+        return self.play_ring.frames_queued() > 0
 
     def feed_finished(self):
-        self.stream_play_chunk_queue.put(("finished", None))
+        self.play_ring.mark_finished()
+        self.play_data_event.set()
 
     def stop(self):
-        # clear self.stream_play_chunk_queue
-        while not self.stream_play_chunk_queue.empty():
-            self.stream_play_chunk_queue.get()
+        # drop everything queued for playback
+        self.play_ring.request_flush()
+        self.play_data_event.set()
+        if self.started:
+            self.play_ring.wait_flushed()
         if self.stop_callback:
             self.stop_callback()
 
     def shutdown(self):
+        self.voices.clear()
+        self.rvc = None
+        if self.f0_pool is not None:
+            self.f0_pool.close()
         self.shutdown_event.set()
+        self.play_data_event.set()
+        if self.started:
+            self.stream_play_worker_process.join(timeout=2)
+        self.play_ring.close()
 
     def get_models(self):
         models = []
@@ -563,24 +692,111 @@ class RealtimeRVC:
 
         return models
 
+    def _load_voice(self, model_name):
+        voice = RealtimeRVCBase(
+            pth=os.path.join(rvc_model_path, model_name + ".pth"),
+            index=os.path.join(rvc_model_path, model_name + ".index"),
+            f0_pool=self.f0_pool,
+        )
+        voice.start_vc()
+        return voice
+
+    def _release_voice(self, voice):
+        voice.close()
+        torch.cuda.empty_cache()
+
     def unload_model(self):
-        if self.rvc:
-            del self.rvc
-            torch.cuda.empty_cache()
-            gc.collect()
-            # from numba import cuda
-            # device = cuda.get_current_device()
-            # device.reset()
-            self.rvc = None
+        """
+        Releases all loaded voices.
+        """
+        self.voices.clear()
+        self.rvc = None
+        self.current_model = ""
+        torch.cuda.empty_cache()
+        gc.collect()
 
     def set_model(self, model_name):
-        if self.current_model == model_name:
+        """
+        Switches to a voice, loading it unless it is cached.
+        """
+        if self.current_model == model_name and self.rvc:
             return
+        start = time.perf_counter()
+        with self.load_lock:
+            voice = self.voices.get(model_name)
+            cached = voice is not None
+            if not cached:
+                voice = self._load_voice(model_name)
+                self.voices.put(model_name, voice)
+        self.rvc = voice
         self.current_model = model_name
-        # print("Setting RVC model to", model_name)
-        self.unload_model()
-        self.rvc = RealtimeRVCBase(
-            pth=os.path.join(rvc_model_path, model_name + ".pth"),
-            index=os.path.join(rvc_model_path, model_name + ".index")
-        )
-        self.rvc.start_vc()
+
+        elapsed = time.perf_counter() - start
+        self.switch_times.append((cached, elapsed))
+        print(f"RVC switched to {model_name} in {elapsed * 1000:.0f} ms "
+              f"({'cached' if cached else 'loaded'})")
+
+    def preload(self, model_names):
+        """
+        Loads voices in a background thread, as long as the cache has
+        room for them without evicting voices in use.
+
+        Args:
+            model_names (list): Names of the voices to load.
+        """
+        available = set(self.get_models())
+        names = [name for name in dict.fromkeys(model_names)
+                 if name in available and name not in self.voices]
+        if not names:
+            return
+        if self.preload_thread and self.preload_thread.is_alive():
+            return
+
+        def preload_worker():
+            for name in names:
+                with self.load_lock:
+                    if name in self.voices:
+                        continue
+                    if not self.voices.has_room():
+                        break
+                    start = time.perf_counter()
+                    try:
+                        voice = self._load_voice(name)
+                    except Exception as e:
+                        print(f"RVC preloading {name} failed: {e}")
+                        continue
+                    self.voices.put(name, voice, recent=False)
+                print(f"RVC preloaded {name} in "
+                      f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+        self.preload_thread = threading.Thread(
+            target=preload_worker, daemon=True)
+        self.preload_thread.start()
+
+    def get_stage_timings(self):
+        """
+        Returns the per stage block timings of the current voice
+        (see RealtimeRVCBase.get_stage_timings), None if none is loaded.
+        """
+        if not self.rvc:
+            return None
+        return self.rvc.get_stage_timings()
+
+    def get_switch_stats(self):
+        """
+        Returns voice switch latency and cache statistics.
+
+        Returns:
+            dict: Number of recent switches, mean switch time in ms for
+              cached and loaded voices and the voice cache statistics.
+        """
+        def mean_ms(cached):
+            times = [t for hit, t in self.switch_times if hit == cached]
+            return sum(times) / len(times) * 1000 if times else None
+
+        return {
+            "switches": len(self.switch_times),
+            "cached_ms": mean_ms(True),
+            "loaded_ms": mean_ms(False),
+            "cache": self.voices.get_stats(),
+        }
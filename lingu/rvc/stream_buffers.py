@@ -0,0 +1,154 @@
+from collections import deque
+import torch.nn.functional as F
+import torch
+import time
+
+STATS_BLOCKS = 200
+
+
+class RingTensor:
+    """
+    Sliding window over an audio stream, kept as circular tensor.
+
+    Every sample is stored twice, at its ring position and one window
+    length behind it, so the window (oldest sample first) is always the
+    contiguous slice storage[head:head + length]. Advancing the stream
+    moves the head instead of shifting the whole window, a block costs two
+    copies of its own size and nothing is allocated.
+    """
+    def __init__(self, length, device, dtype=torch.float32):
+        """
+        Args:
+            length (int): Window length in samples.
+            device: Torch device of the storage.
+            dtype: Sample type.
+        """
+        self.length = length
+        self.storage = torch.zeros(2 * length, device=device, dtype=dtype)
+        self.head = 0
+
+    def window(self):
+        """
+        Returns:
+            torch.Tensor: The current window, a view that is only valid
+              until the next advance and must not be written to.
+        """
+        return self.storage[self.head:self.head + self.length]
+
+    def advance(self, count):
+        """
+        Drops the oldest count samples. The newest count samples of the
+        window are stale until they are written with write_tail.
+        """
+        self.head = (self.head + count) % self.length
+
+    def write_tail(self, data):
+        """
+        Overwrites the newest len(data) samples of the window.
+        """
+        count = data.shape[0]
+        start = (self.head - count) % self.length
+        first = min(count, self.length - start)
+        for base in (start, start + self.length):
+            self.storage[base:base + first] = data[:first]
+        for base in (0, self.length):
+            self.storage[base:base + count - first] = data[first:]
+
+    def push(self, data):
+        """
+        Appends data to the stream.
+        """
+        self.advance(data.shape[0])
+        self.write_tail(data)
+
+
+def frame_rms(x, frame_length, hop_length, workspace=None):
+    """
+    Centered frame RMS of a 1-D tensor on its device, same as
+    librosa.feature.rms(y=x, center=True) with constant padding.
+
+    Args:
+        x (torch.Tensor): Audio.
+        frame_length (int): Samples per frame, even.
+        hop_length (int): Samples between frames.
+        workspace (torch.Tensor, optional): Preallocated tensor of at
+          least len(x) samples for the squared signal.
+
+    Returns:
+        torch.Tensor: len(x) // hop_length + 1 RMS values.
+    """
+    if workspace is None:
+        power = x * x
+    else:
+        power = torch.mul(x, x, out=workspace[:x.shape[0]])
+    power = F.avg_pool1d(
+        power[None, None], frame_length, hop_length,
+        padding=frame_length // 2)
+    return power[0, 0].sqrt_()
+
+
+class StageTimer:
+    """
+    Times the stages of every processed block.
+
+    Stages are stamped in order, each stamp records the time since the
+    previous one. Stages measured elsewhere (e.g. inside the model call)
+    are recorded with add.
+    """
+    def __init__(self, stages, sync=None, blocks=STATS_BLOCKS):
+        """
+        Args:
+            stages (list): Stage names in processing order.
+            sync (callable, optional): Called before every stamp, e.g.
+              torch.cuda.synchronize to time GPU work instead of kernel
+              launches.
+            blocks (int): Number of recent blocks kept.
+        """
+        self.stages = list(stages)
+        self.sync = sync
+        self.times = {stage: deque(maxlen=blocks) for stage in self.stages}
+        self.times["total"] = deque(maxlen=blocks)
+        self.block_start = 0.0
+        self.last = 0.0
+
+    def start(self):
+        self.block_start = self.last = time.perf_counter()
+
+    def stamp(self, stage):
+        if self.sync:
+            self.sync()
+        now = time.perf_counter()
+        self.times[stage].append(now - self.last)
+        self.last = now
+
+    def add(self, timings):
+        """
+        Records stages timed elsewhere that ran since the last stamp.
+
+        Args:
+            timings (dict): Seconds per stage.
+        """
+        for stage, seconds in timings.items():
+            self.times[stage].append(seconds)
+        self.last = time.perf_counter()
+
+    def finish(self):
+        self.times["total"].append(time.perf_counter() - self.block_start)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Per stage (and "total" per block) the number of timed
+              blocks, mean and 95th percentile time in milliseconds.
+        """
+        stats = {}
+        for stage, times in self.times.items():
+            times = sorted(times)
+            if not times:
+                continue
+            stats[stage] = {
+                "blocks": len(times),
+                "mean_ms": sum(times) / len(times) * 1000,
+                "p95_ms": times[int(len(times) * 0.95)] * 1000,
+            }
+        return stats
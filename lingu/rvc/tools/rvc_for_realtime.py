@@ -2,12 +2,14 @@ from io import BytesIO
 import os
 import pickle
 import sys
+import threading
 import traceback
 from lingu.rvc.infer.lib import jit
+from lingu.rvc.infer.lib import onnx_backend
+from lingu.rvc.infer.lib.feature_index import FeatureIndex
 from lingu.rvc.infer.lib.jit.get_synthesizer import get_synthesizer
 from time import time as ttime
 import fairseq
-import faiss
 import numpy as np
 import parselmouth
 import pyworld
@@ -28,18 +30,23 @@ from lingu.rvc.infer.lib.infer_pack.models import (
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
-from multiprocessing import Manager as M
 
 from lingu.rvc.configs.config import Config
 from lingu import cfg
 
 # config = Config()
 
-mm = M()
-
 assets_path = cfg("speech", "rvc_assets_path", default="models/rvc/assets")
 
 hubert_file = "hubert/hubert_base.pt"
+rmvpe_file = "rmvpe/rmvpe.pt"
+
+# torch or onnx (onnxruntime on the cpu)
+rvc_backend = cfg("speech", "rvc_backend", default="torch")
+rvc_onnx_threads = cfg("speech", "rvc_onnx_threads", default=0)
+rvc_index_nprobe = cfg("speech", "rvc_index_nprobe", default=1)
+rvc_index_efsearch = cfg("speech", "rvc_index_efsearch", default=16)
+rvc_index_mmap = cfg("speech", "rvc_index_mmap", default=True)
 
 
 def printt(strr, *args):
@@ -49,6 +56,37 @@ def printt(strr, *args):
         print(strr % args)
 
 
+# backbone models (hubert, rmvpe, fcpe) shared by all loaded voices
+shared_models = {}
+shared_models_lock = threading.Lock()
+
+
+def get_shared_model(key, load):
+    """
+    Returns the shared model for key, loading it on first use.
+    """
+    with shared_models_lock:
+        if key not in shared_models:
+            shared_models[key] = load()
+        return shared_models[key]
+
+
+def load_hubert(hubert_path, device, is_half):
+    printt("Loading hubert model")
+    models, _, _ = fairseq.checkpoint_utils.load_model_ensemble_and_task(
+        [hubert_path],
+        suffix="",
+    )
+    hubert_model = models[0]
+    hubert_model = hubert_model.to(device)
+    if is_half:
+        hubert_model = hubert_model.half()
+    else:
+        hubert_model = hubert_model.float()
+    hubert_model.eval()
+    return hubert_model
+
+
 # config.device=torch.device("cpu")########强制cpu测试
 # config.is_half=False########强制cpu测试
 class RVC:
@@ -59,10 +97,11 @@ class RVC:
         index_path,
         index_rate,
         n_cpu,
-        inp_q,
-        opt_q,
+        f0_pool,
         config: Config,
         last_rvc=None,
+        backend=None,
+        onnx_threads=None,
     ) -> None:
         """
         初始化
@@ -78,8 +117,8 @@ class RVC:
                 fairseq.modules.grad_multiply.GradMultiply.forward = forward_dml
             # global config
             self.config = config
-            self.inp_q = inp_q
-            self.opt_q = opt_q
+            # HarvestPool computing multi-core harvest f0 (n_cpu > 1)
+            self.f0_pool = f0_pool
             # device="cpu"########强制cpu测试
             self.device = config.device
             self.f0_up_key = key
@@ -90,39 +129,56 @@ class RVC:
             self.n_cpu = n_cpu
             self.use_jit = self.config.use_jit
             self.is_half = config.is_half
+            self.backend = backend or rvc_backend
+            self.onnx_threads = (
+                rvc_onnx_threads if onnx_threads is None else onnx_threads
+            )
+            self.onnx = None
+            self.model = None
+            self.net_g: nn.Module = None
 
-            if index_rate != 0:
-                self.index = faiss.read_index(index_path)
-                self.big_npy = self.index.reconstruct_n(0, self.index.ntotal)
-                printt("Index search enabled")
             self.pth_path: str = pth_path
             self.index_path = index_path
+            if index_rate != 0:
+                self.load_index()
             self.index_rate = index_rate
             self.cache_pitch: np.ndarray = np.zeros(1024, dtype="int32")
             self.cache_pitchf = np.zeros(1024, dtype="float32")
-
-            if last_rvc is None:
-                hubert_path = os.path.join(assets_path, hubert_file)
-                models, _, _ = fairseq.checkpoint_utils.load_model_ensemble_and_task(
-                    [hubert_path],
-                    suffix="",
-                )            
-                # models, _, _ = fairseq.checkpoint_utils.load_model_ensemble_and_task(
-                #     ["lingu/rvc/assets/hubert/hubert_base.pt"],
-                #     suffix="",
-                # )
-                hubert_model = models[0]
-                hubert_model = hubert_model.to(self.device)
-                if self.is_half:
-                    hubert_model = hubert_model.half()
-                else:
-                    hubert_model = hubert_model.float()
-                hubert_model.eval()
-                self.model = hubert_model
-            else:
-                self.model = last_rvc.model
-
-            self.net_g: nn.Module = None
+            # seconds of the stages of the last infer call, synced with
+            # sync (e.g. torch.cuda.synchronize) if set
+            self.timings = {}
+            self.sync = None
+
+            hubert_path = os.path.join(assets_path, hubert_file)
+            if self.backend == "onnx":
+                try:
+                    threads = self.onnx_threads
+                    self.onnx = onnx_backend.OnnxRealtimeModels(
+                        self.pth_path,
+                        hubert_path,
+                        threads=threads,
+                        hubert_loader=lambda version: get_shared_model(
+                            ("hubert_onnx", version, threads),
+                            lambda: onnx_backend.load_hubert_session(
+                                hubert_path, version, threads
+                            ),
+                        ),
+                    )
+                    self.tgt_sr = self.onnx.tgt_sr
+                    self.if_f0 = self.onnx.if_f0
+                    self.version = self.onnx.version
+                    printt("Using onnxruntime backend")
+                except Exception:
+                    printt(traceback.format_exc())
+                    printt("Onnxruntime backend not available, using torch")
+                    self.backend = "torch"
+                    self.onnx = None
+
+            if self.onnx is None:
+                self.model = get_shared_model(
+                    ("hubert", str(self.device), self.is_half),
+                    lambda: load_hubert(hubert_path, self.device, self.is_half),
+                )
 
             def set_default_model():
                 self.net_g, cpt = get_synthesizer(self.pth_path, self.device)
@@ -180,7 +236,13 @@ class RVC:
                 else:
                     set_default_model()
 
-            if last_rvc is None or last_rvc.pth_path != self.pth_path:
+            if self.onnx is not None:
+                pass
+            elif (
+                last_rvc is None
+                or last_rvc.pth_path != self.pth_path
+                or last_rvc.net_g is None
+            ):
                 set_synthesizer()
             else:
                 self.tgt_sr = last_rvc.tgt_sr
@@ -192,11 +254,6 @@ class RVC:
                 else:
                     self.net_g = last_rvc.net_g
 
-            if last_rvc is not None and hasattr(last_rvc, "model_rmvpe"):
-                self.model_rmvpe = last_rvc.model_rmvpe
-            if last_rvc is not None and hasattr(last_rvc, "model_fcpe"):
-                self.device_fcpe = last_rvc.device_fcpe
-                self.model_fcpe = last_rvc.model_fcpe
         except:
             printt(traceback.format_exc())
 
@@ -205,11 +262,49 @@ class RVC:
 
     def change_index_rate(self, new_index_rate):
         if new_index_rate != 0 and self.index_rate == 0:
-            self.index = faiss.read_index(self.index_path)
-            self.big_npy = self.index.reconstruct_n(0, self.index.ntotal)
-            printt("Index search enabled")
+            self.load_index()
         self.index_rate = new_index_rate
 
+    def load_index(self):
+        self.index = FeatureIndex(
+            self.index_path,
+            nprobe=rvc_index_nprobe,
+            efsearch=rvc_index_efsearch,
+            mmap=rvc_index_mmap,
+        )
+        printt("Index search enabled, %s", self.index.describe())
+
+    def get_memory(self):
+        """
+        Returns the bytes held by this voice alone: synthesizer weights
+        and the parts of the retrieval index that are not memory-mapped.
+        Shared backbone models (hubert, rmvpe, fcpe) are not included.
+        """
+        if self.onnx is not None:
+            size = os.path.getsize(
+                onnx_backend.synthesizer_onnx_path(self.pth_path)
+            )
+        elif self.net_g is not None:
+            size = sum(p.numel() * p.element_size() for p in self.net_g.parameters())
+        else:
+            size = 0
+        usage = self.get_index_memory()
+        if usage:
+            if not usage["index_mapped"]:
+                size += usage["index_bytes"]
+            if not usage["bank_mapped"]:
+                size += usage["bank_bytes"]
+        return size
+
+    def get_index_memory(self):
+        """
+        Returns the memory used by the retrieval index of this voice
+        (see FeatureIndex.memory_usage), None if index search is off.
+        """
+        if not hasattr(self, "index"):
+            return None
+        return self.index.memory_usage()
+
     def get_f0_post(self, f0):
         f0bak = f0.copy()
         f0_mel = 1127 * np.log(1 + f0 / 700)
@@ -248,7 +343,7 @@ class RVC:
             f0 = f0[:p_len]
             f0 *= pow(2, f0_up_key / 12)
             return self.get_f0_post(f0)
-        if n_cpu == 1:
+        if n_cpu == 1 or self.f0_pool is None:
             f0, t = pyworld.harvest(
                 x.astype(np.double),
                 fs=16000,
@@ -259,35 +354,7 @@ class RVC:
             f0 = signal.medfilt(f0, 3)
             f0 *= pow(2, f0_up_key / 12)
             return self.get_f0_post(f0)
-        f0bak = np.zeros(x.shape[0] // 160 + 1, dtype=np.float64)
-        length = len(x)
-        part_length = 160 * ((length // 160 - 1) // n_cpu + 1)
-        n_cpu = (length // 160 - 1) // (part_length // 160) + 1
-        ts = ttime()
-        res_f0 = mm.dict()
-        for idx in range(n_cpu):
-            tail = part_length * (idx + 1) + 320
-            if idx == 0:
-                self.inp_q.put((idx, x[:tail], res_f0, n_cpu, ts))
-            else:
-                self.inp_q.put(
-                    (idx, x[part_length * idx - 320 : tail], res_f0, n_cpu, ts)
-                )
-        while 1:
-            res_ts = self.opt_q.get()
-            if res_ts == ts:
-                break
-        f0s = [i[1] for i in sorted(res_f0.items(), key=lambda x: x[0])]
-        for idx, f0 in enumerate(f0s):
-            if idx == 0:
-                f0 = f0[:-3]
-            elif idx != n_cpu - 1:
-                f0 = f0[2:-3]
-            else:
-                f0 = f0[2:]
-            f0bak[
-                part_length * idx // 160 : part_length * idx // 160 + f0.shape[0]
-            ] = f0
+        f0bak = self.f0_pool.harvest(x)
         f0bak = signal.medfilt(f0bak, 3)
         f0bak *= pow(2, f0_up_key / 12)
         return self.get_f0_post(f0bak)
@@ -317,29 +384,52 @@ class RVC:
 
     def get_f0_rmvpe(self, x, f0_up_key):
         if hasattr(self, "model_rmvpe") == False:
-            from infer.lib.rmvpe import RMVPE
-
-            printt("Loading rmvpe model")
-            self.model_rmvpe = RMVPE(
-                "lingu/rvc/assets/rmvpe/rmvpe.pt",
-                is_half=self.is_half,
-                device=self.device,
-                use_jit=self.config.use_jit,
-            )
+            if self.onnx is not None:
+                key = ("rmvpe_onnx", self.onnx_threads)
+            else:
+                key = ("rmvpe", str(self.device), self.is_half)
+            self.model_rmvpe = get_shared_model(key, self.load_rmvpe)
         f0 = self.model_rmvpe.infer_from_audio(x, thred=0.03)
         f0 *= pow(2, f0_up_key / 12)
         return self.get_f0_post(f0)
 
+    def load_rmvpe(self):
+        from lingu.rvc.infer.lib.rmvpe import RMVPE
+
+        printt("Loading rmvpe model")
+        rmvpe_path = os.path.join(assets_path, rmvpe_file)
+        if self.onnx is not None:
+            return RMVPE(
+                rmvpe_path,
+                is_half=False,
+                device="cpu",
+                session=onnx_backend.load_rmvpe_session(
+                    rmvpe_path, self.onnx_threads
+                ),
+            )
+        return RMVPE(
+            rmvpe_path,
+            is_half=self.is_half,
+            device=self.device,
+            use_jit=self.config.use_jit,
+        )
+
     def get_f0_fcpe(self, x, f0_up_key):
         if hasattr(self, "model_fcpe") == False:
             from torchfcpe import spawn_bundled_infer_model
 
-            printt("Loading fcpe model")
             if "privateuseone" in str(self.device):
                 self.device_fcpe = "cpu"
             else:
                 self.device_fcpe = self.device
-            self.model_fcpe = spawn_bundled_infer_model(self.device_fcpe)
+
+            def load_fcpe():
+                printt("Loading fcpe model")
+                return spawn_bundled_infer_model(self.device_fcpe)
+
+            self.model_fcpe = get_shared_model(
+                ("fcpe", str(self.device_fcpe)), load_fcpe
+            )
         f0 = self.model_fcpe.infer(
             x.to(self.device_fcpe).unsqueeze(0).float(),
             sr=16000,
@@ -360,29 +450,34 @@ class RVC:
     ) -> np.ndarray:
         t1 = ttime()
         with torch.no_grad():
-            if self.config.is_half:
-                feats = input_wav.half().view(1, -1)
+            if self.onnx is not None:
+                feats = self.onnx.extract_features(input_wav.float().cpu().numpy())
+                feats = torch.from_numpy(feats).to(self.device)
             else:
-                feats = input_wav.float().view(1, -1)
-            padding_mask = torch.BoolTensor(feats.shape).to(self.device).fill_(False)
-            inputs = {
-                "source": feats,
-                "padding_mask": padding_mask,
-                "output_layer": 9 if self.version == "v1" else 12,
-            }
-            logits = self.model.extract_features(**inputs)
-            feats = (
-                self.model.final_proj(logits[0]) if self.version == "v1" else logits[0]
-            )
+                if self.config.is_half:
+                    feats = input_wav.half().view(1, -1)
+                else:
+                    feats = input_wav.float().view(1, -1)
+                padding_mask = (
+                    torch.BoolTensor(feats.shape).to(self.device).fill_(False)
+                )
+                inputs = {
+                    "source": feats,
+                    "padding_mask": padding_mask,
+                    "output_layer": 9 if self.version == "v1" else 12,
+                }
+                logits = self.model.extract_features(**inputs)
+                feats = (
+                    self.model.final_proj(logits[0])
+                    if self.version == "v1"
+                    else logits[0]
+                )
             feats = torch.cat((feats, feats[:, -1:, :]), 1)
-        t2 = ttime()
+        t2 = self._stamp()
         try:
             if hasattr(self, "index") and self.index_rate != 0:
                 npy = feats[0][skip_head // 2 :].cpu().numpy().astype("float32")
-                score, ix = self.index.search(npy, k=8)
-                weight = np.square(1 / score)
-                weight /= weight.sum(axis=1, keepdims=True)
-                npy = np.sum(self.big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+                npy = self.index.retrieve(npy, k=8)
                 if self.config.is_half:
                     npy = npy.astype("float16")
                 feats[0][skip_head // 2 :] = (
@@ -395,7 +490,7 @@ class RVC:
         except:
             traceback.print_exc()
             printt("Index search FAILED")
-        t3 = ttime()
+        t3 = self._stamp()
         if self.if_f0 == 1:
             f0_extractor_frame = block_frame_16k + 800
             if f0method == "rmvpe":
@@ -405,14 +500,51 @@ class RVC:
             )
             start_frame = block_frame_16k // 160
             end_frame = len(self.cache_pitch) - (pitch.shape[0] - 4) + start_frame
-            self.cache_pitch[:] = np.append(
-                self.cache_pitch[start_frame:end_frame], pitch[3:-1]
+            kept = end_frame - start_frame
+            self.cache_pitch[:kept] = self.cache_pitch[start_frame:end_frame]
+            self.cache_pitch[kept:] = pitch[3:-1]
+            self.cache_pitchf[:kept] = self.cache_pitchf[start_frame:end_frame]
+            self.cache_pitchf[kept:] = pitchf[3:-1]
+        t4 = self._stamp()
+        p_len = input_wav.shape[0] // 160
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
+        feats = feats[:, :p_len, :]
+        if self.onnx is not None:
+            infered_audio = self.onnx.synthesize(
+                feats.float().cpu().numpy(),
+                self.cache_pitch[-p_len:],
+                self.cache_pitchf[-p_len:],
+                skip_head,
+                return_length,
             )
-            self.cache_pitchf[:] = np.append(
-                self.cache_pitchf[start_frame:end_frame], pitchf[3:-1]
+            infered_audio = torch.from_numpy(infered_audio).to(self.device)
+        else:
+            infered_audio = self.infer_torch(
+                feats, p_len, skip_head, return_length
             )
-        t4 = ttime()
-        p_len = input_wav.shape[0] // 160
+        t5 = self._stamp()
+        self.timings = {
+            "feature": t2 - t1,
+            "index": t3 - t2,
+            "f0": t4 - t3,
+            "model": t5 - t4,
+        }
+        if debug:
+            printt(
+                "Spent time: fea = %.3fs, index = %.3fs, f0 = %.3fs, model = %.3fs",
+                t2 - t1,
+                t3 - t2,
+                t4 - t3,
+                t5 - t4,
+            )
+        return infered_audio.squeeze().float()
+
+    def _stamp(self):
+        if self.sync:
+            self.sync()
+        return ttime()
+
+    def infer_torch(self, feats, p_len, skip_head, return_length):
         if self.if_f0 == 1:
             cache_pitch = (
                 torch.LongTensor(self.cache_pitch[-p_len:]).to(self.device).unsqueeze(0)
@@ -422,8 +554,6 @@ class RVC:
                 .to(self.device)
                 .unsqueeze(0)
             )
-        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
-        feats = feats[:, :p_len, :]
         p_len = torch.LongTensor([p_len]).to(self.device)
         sid = torch.LongTensor([0]).to(self.device)
         skip_head = torch.LongTensor([skip_head])
@@ -443,13 +573,4 @@ class RVC:
                 infered_audio, _, _ = self.net_g.infer(
                     feats, p_len, sid, skip_head, return_length
                 )
-        t5 = ttime()
-        if debug:
-            printt(
-                "Spent time: fea = %.3fs, index = %.3fs, f0 = %.3fs, model = %.3fs",
-                t2 - t1,
-                t3 - t2,
-                t4 - t3,
-                t5 - t4,
-            )
-        return infered_audio.squeeze().float()
+        return infered_audio
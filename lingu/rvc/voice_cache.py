@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import threading
+
+
+class VoiceCache:
+    """
+    Least recently used cache of loaded voices.
+
+    Holds up to max_voices entries and, if max_bytes is set, evicts the
+    least recently used voices while the summed size is above it. The
+    most recently used voice (the active one) is never evicted, even if
+    it alone exceeds max_bytes.
+    """
+    def __init__(self, max_voices=3, max_bytes=0, size=None, release=None):
+        """
+        Args:
+            max_voices (int): Maximum number of cached voices.
+            max_bytes (int): Maximum summed size, 0 = no limit.
+            size (callable, optional): Returns the size of an entry in
+              bytes.
+            release (callable, optional): Called with evicted entries.
+        """
+        self.max_voices = max(1, int(max_voices))
+        self.max_bytes = int(max_bytes)
+        self.size = size or (lambda entry: 0)
+        self.release = release or (lambda entry: None)
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def get(self, name):
+        """
+        Returns a cached voice and marks it as most recently used.
+
+        Returns:
+            The entry, None if the voice is not cached.
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+            self.hits += 1
+            return entry
+
+    def put(self, name, entry, recent=True):
+        """
+        Adds a voice and evicts voices over the limits.
+
+        Args:
+            name (str): Voice name.
+            entry: The loaded voice.
+            recent (bool): Add as most recently used. Preloaded voices
+              are added as least recently used, so they never push out
+              voices that were actually used.
+
+        Returns:
+            bool: False if the voice was not kept (only possible with
+              recent=False when the cache is full).
+        """
+        with self.lock:
+            self.entries[name] = entry
+            self.sizes[name] = self.size(entry)
+            self.entries.move_to_end(name, last=recent)
+            self._evict()
+            return name in self.entries
+
+    def has_room(self, entry_size=0):
+        """
+        Returns True if a voice could be preloaded without evicting.
+        """
+        with self.lock:
+            if len(self.entries) >= self.max_voices:
+                return False
+            return not self.max_bytes or \
+                self.total_bytes() + entry_size <= self.max_bytes
+
+    def _evict(self):
+        while len(self.entries) > 1 and (
+                len(self.entries) > self.max_voices
+                or (self.max_bytes and self.total_bytes() > self.max_bytes)):
+            name, entry = self.entries.popitem(last=False)
+            self.sizes.pop(name, None)
+            self.evictions += 1
+            self.release(entry)
+
+    def total_bytes(self):
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def clear(self):
+        """
+        Releases all cached voices.
+        """
+        with self.lock:
+            while self.entries:
+                _, entry = self.entries.popitem(last=False)
+                self.release(entry)
+            self.sizes.clear()
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Cached voice names (least recently used first), their
+              summed size in MB, hits, misses and evictions.
+        """
+        with self.lock:
+            return {
+                "voices": list(self.entries),
+                "mb": self.total_bytes() / 1024 / 1024,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -126,7 +126,9 @@ class UI:
         events.add_listener(
             "assistant_text",
             "brain",
-            self._on_assistant_text
+            self._on_assistant_text,
+            asynchronous=True,
+            coalesce=True
         )
         events.add_listener(
             "function_call_start",
@@ -67,7 +67,8 @@ class UI(DraggableWidget):
             self,
             event_name: str,
             trigger_module_name: str,
-            callback
+            callback,
+            **kwargs
     ):
         """Registers a callback for a specified event.
 
@@ -76,8 +77,10 @@ class UI(DraggableWidget):
             trigger_module_name (str): The name of the module triggering
               the event.
             callback: The function to call when the event is triggered.
+            **kwargs: Dispatch options (asynchronous, coalesce, priority).
         """
-        events.add_listener(event_name, trigger_module_name, callback)
+        events.add_listener(
+            event_name, trigger_module_name, callback, **kwargs)
 
     def add_ui_listener(
             self,
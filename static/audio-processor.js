@@ -39,11 +39,16 @@ class StreamAudioProcessor extends AudioWorkletProcessor {
         super();
         this.audioBuffer = new RingBuffer(60 * 48000); // Buffer size of 1 second at 48 kHz
         this.started = false; // Flag to control the start of processing
+        this.ended = false; // End of utterance received
         this.minimumThreshold = 24000; // Start processing after half a second of audio is buffered
 
         this.port.onmessage = (event) => {
             try {
-                if (event.data instanceof ArrayBuffer) {
+                if (event.data && event.data.type === 'end') {
+                    // play utterances shorter than the threshold as well
+                    this.ended = true;
+                    this.started = true;
+                } else if (event.data instanceof ArrayBuffer) {
                     const incomingData = new DataView(event.data);
                     const numFloats = incomingData.byteLength / 4;
                     const audioData = new Float32Array(numFloats);
@@ -52,6 +57,7 @@ class StreamAudioProcessor extends AudioWorkletProcessor {
                         audioData[i] = incomingData.getFloat32(i * 4, true);
                     }
                     this.audioBuffer.push(audioData); // Push array to the ring buffer
+                    this.ended = false;
                     if (!this.started && this.audioBuffer.available >= this.minimumThreshold) {
                         this.started = true; // Start processing when threshold is reached
                     }
@@ -69,6 +75,11 @@ class StreamAudioProcessor extends AudioWorkletProcessor {
             if (this.started) {
                 const samplesToProcess = this.audioBuffer.pull(outputChannel.length);
                 outputChannel.set(samplesToProcess);
+                if (this.ended && this.audioBuffer.available === 0) {
+                    // buffer again before the next utterance starts
+                    this.started = false;
+                    this.ended = false;
+                }
             } else {
                 outputChannel.fill(0); // Fill with silence if not started
             }
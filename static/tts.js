@@ -7,6 +7,110 @@ let fullUserSentences = [];
 let fullAssistantSentences = [];
 let current_assistant_text = "";
 let chunkCounter = 0;
+let expectedSeq = null;
+
+// binary audio frames, see lingu/modules/server/handlers/audio_frames.py
+const FRAME_HEADER_SIZE = 12;
+const FORMAT_FLOAT32 = 0;
+const FORMAT_INT16 = 1;
+const FORMAT_MULAW = 2;
+const FORMAT_OPUS = 3;
+const FLAG_END_OF_UTTERANCE = 1;
+
+// codecs, see lingu/modules/server/handlers/codecs.py
+const MULAW_MU = 255;
+const OPUS_SAMPLERATE = 48000;
+const OPUS_FRAME_US = 20000;
+let uplinkCodec = 'int16';
+let micSeq = 0;
+let opusSupported = false;
+let opusDecoder = null;
+let opusTimestamp = 0;
+
+if (typeof AudioDecoder !== 'undefined') {
+    AudioDecoder.isConfigSupported({
+        codec: 'opus', sampleRate: OPUS_SAMPLERATE, numberOfChannels: 1
+    }).then(result => {
+        opusSupported = result.supported;
+    }).catch(() => {});
+}
+
+function acceptedCodecs() {
+    const codecs = ['mulaw', 'int16', 'float32'];
+    return opusSupported ? ['opus', ...codecs] : codecs;
+}
+
+function mulawDecode(codes) {
+    const samples = new Float32Array(codes.length);
+    for (let i = 0; i < codes.length; i++) {
+        const companded = codes[i] / 127.5 - 1;
+        samples[i] = Math.sign(companded) *
+            (Math.pow(1 + MULAW_MU, Math.abs(companded)) - 1) / MULAW_MU;
+    }
+    return samples;
+}
+
+function mulawEncode(samples) {
+    const codes = new Uint8Array(samples.length);
+    for (let i = 0; i < samples.length; i++) {
+        const sample = Math.max(-1, Math.min(1, samples[i]));
+        const companded = Math.sign(sample) *
+            Math.log1p(MULAW_MU * Math.abs(sample)) / Math.log1p(MULAW_MU);
+        codes[i] = Math.round((companded + 1) * 127.5);
+    }
+    return codes;
+}
+
+function playSamples(samples, sampleRate) {
+    chunkCounter++;
+    const audio = resampleToContext(samples, sampleRate);
+    ensurePlayer().port.postMessage(audio.buffer, [audio.buffer]);
+}
+
+function endUtterance() {
+    resampleState = { rate: 0, position: 0, last: 0 };
+    ensurePlayer().port.postMessage({ type: 'end' });
+}
+
+function getOpusDecoder() {
+    if (!opusDecoder) {
+        opusDecoder = new AudioDecoder({
+            output: (audioData) => {
+                const samples = new Float32Array(audioData.numberOfFrames);
+                audioData.copyTo(samples, { planeIndex: 0, format: 'f32-planar' });
+                playSamples(samples, audioData.sampleRate);
+                audioData.close();
+            },
+            error: (e) => console.error("Opus decoding failed:", e)
+        });
+        opusDecoder.configure({
+            codec: 'opus', sampleRate: OPUS_SAMPLERATE, numberOfChannels: 1
+        });
+    }
+    return opusDecoder;
+}
+
+function decodeOpus(payload, end) {
+    // payload holds packets, each prefixed with its uint16 length
+    const decoder = getOpusDecoder();
+    const view = new DataView(payload);
+    let offset = 0;
+    while (offset + 2 <= payload.byteLength) {
+        const length = view.getUint16(offset, true);
+        offset += 2;
+        decoder.decode(new EncodedAudioChunk({
+            type: 'key',
+            timestamp: opusTimestamp,
+            data: new Uint8Array(payload, offset, length)
+        }));
+        offset += length;
+        opusTimestamp += OPUS_FRAME_US;
+    }
+    if (end) {
+        // play the decoded audio before ending the utterance
+        decoder.flush().then(endUtterance).catch(endUtterance);
+    }
+}
 
 const serverCheckInterval = 5000; 
 
@@ -44,65 +148,85 @@ document.addEventListener('click', () => {
 });
 
 
-async function streamAudio() {
-    try {
-        const audioCtx = getAudioContext();
-
-        // Ensure the processorNode is created and connected only once
-        if (!window.processorNode) {
-            window.processorNode = new AudioWorkletNode(audioCtx, 'stream-audio-processor');
-            window.processorNode.port.onmessage = (event) => {
-                console.log(event.data);  // Log the message received from the worklet
-            };
-            window.processorNode.connect(audioCtx.destination);
-        }
-
-        const response = await fetch('/tts');
-        if (!response.body) {
-            throw new Error('ReadableStream not supported or no body in the response');
-        }
+function ensurePlayer() {
+    const audioCtx = getAudioContext();
 
-        const reader = response.body.getReader();
+    // Ensure the processorNode is created and connected only once
+    if (!window.processorNode) {
+        window.processorNode = new AudioWorkletNode(audioCtx, 'stream-audio-processor');
+        window.processorNode.port.onmessage = (event) => {
+            console.log(event.data);  // Log the message received from the worklet
+        };
+        window.processorNode.connect(audioCtx.destination);
+    }
+    return window.processorNode;
+}
 
-        async function push() {
-            const { done, value } = await reader.read();
-            chunkCounter++;
-            console.log("Chunk", chunkCounter);
-            if (done) {
-                console.log("Stream finished.");
-                return;
-            }
-            // Post the audio data to the processor
-            if (value instanceof Uint8Array) {
-                window.processorNode.port.postMessage(value.buffer);
-            } else {
-                window.processorNode.port.postMessage(value);
-            }
-            push(); // Continue reading
-        }
+// Linear resampler to the audio context rate, continues over frames
+let resampleState = { rate: 0, position: 0, last: 0 };
 
-        push();
-    } catch (err) {
-        console.error('Failed to fetch audio:', err);
+function resampleToContext(samples, sampleRate) {
+    const targetRate = getAudioContext().sampleRate;
+    if (sampleRate === targetRate) {
+        return samples;
+    }
+    if (resampleState.rate !== sampleRate) {
+        resampleState = { rate: sampleRate, position: 0, last: 0 };
+    }
+    const step = sampleRate / targetRate;
+    const output = [];
+    // position is relative to samples[0], -1 refers to the last sample
+    // of the previous frame
+    let position = resampleState.position;
+    while (position < samples.length - 1) {
+        const index = Math.floor(position);
+        const fraction = position - index;
+        const a = index < 0 ? resampleState.last : samples[index];
+        const b = samples[index + 1];
+        output.push(a + (b - a) * fraction);
+        position += step;
     }
+    resampleState.position = position - samples.length;
+    resampleState.last = samples[samples.length - 1];
+    return Float32Array.from(output);
 }
 
+function handleAudioFrame(buffer) {
+    if (buffer.byteLength < FRAME_HEADER_SIZE) {
+        return;
+    }
+    const header = new DataView(buffer, 0, FRAME_HEADER_SIZE);
+    const seq = header.getUint32(0, true);
+    const sampleRate = header.getUint32(4, true);
+    const format = header.getUint8(8);
+    const flags = header.getUint8(9);
+
+    if (expectedSeq !== null && seq !== expectedSeq) {
+        console.warn(`Audio frames ${expectedSeq} to ${seq - 1} missing`);
+    }
+    expectedSeq = (seq + 1) >>> 0;
 
-async function speak() {
-    const audioCtx = getAudioContext();
-    if (audioCtx.state === 'suspended') {
-        await audioCtx.resume();
-    }    
-    const blob = await streamAudio();
-    if (!blob) return;
-
-    const arrayBuffer = await blob.arrayBuffer();
-    audioCtx.decodeAudioData(arrayBuffer, buffer => {
-        const sourceNode = audioCtx.createBufferSource();
-        sourceNode.buffer = buffer;
-        sourceNode.connect(audioCtx.destination);
-        sourceNode.start();
-    }, e => console.error('Error decoding audio data:', e));
+    const payload = buffer.slice(FRAME_HEADER_SIZE);
+    const end = (flags & FLAG_END_OF_UTTERANCE) !== 0;
+    if (format === FORMAT_OPUS) {
+        decodeOpus(payload, end);
+        return;
+    }
+    if (payload.byteLength > 0) {
+        if (format === FORMAT_INT16) {
+            const pcm = new Int16Array(payload);
+            playSamples(Float32Array.from(pcm, value => value / 32768), sampleRate);
+        } else if (format === FORMAT_FLOAT32) {
+            playSamples(new Float32Array(payload), sampleRate);
+        } else if (format === FORMAT_MULAW) {
+            playSamples(mulawDecode(new Uint8Array(payload)), sampleRate);
+        } else {
+            console.warn(`Unknown audio format ${format}`);
+        }
+    }
+    if (end) {
+        endUtterance();
+    }
 }
 
 function updateButton() {
@@ -137,14 +261,27 @@ function createSocket(address) {
         window.processorNode = null;
     }    
     socket = new WebSocket(address);
+    socket.binaryType = 'arraybuffer';
+    expectedSeq = null;
     socket.onopen = function(event) {
         server_available = true;
+        uplinkCodec = 'int16';
+        micSeq = 0;
         updateButton();
         start_msg();
+        // metadata without audio, lets the server pick the codecs
+        sendAudioData(new Float32Array(0));
     };
     socket.onmessage = function(event) {
+        if (event.data instanceof ArrayBuffer) {
+            handleAudioFrame(event.data);
+            return;
+        }
         let data = JSON.parse(event.data);
-        if (data.type === 'realtime_user') {
+        if (data.type === 'codec') {
+            console.log(`Receiving ${data.downlink} audio, sending ${data.uplink}`);
+            uplinkCodec = data.uplink;
+        } else if (data.type === 'realtime_user') {
             if (current_assistant_text != "") {
                 fullAssistantSentences.push(current_assistant_text);
                 current_assistant_text = "";
@@ -158,7 +295,7 @@ function createSocket(address) {
             displayRealtimeText("", displayDiv, false);
         } else if (data.type === 'audio_stream_ready') {
             chunkCounter = 0;
-            speak();
+            ensurePlayer();
         }
     };
     socket.onclose = function(event) {
@@ -293,13 +430,27 @@ async function setupMicrophone() {
 // Function to handle WebSocket transmission
 function sendAudioData(audioData) {
     if (socket && socket.readyState === WebSocket.OPEN) {
-        const sampleRate = audioContext.sampleRate;
-        const metadata = { sampleRate };
+        const sampleRate = audioContext ? audioContext.sampleRate : 48000;
+        const metadata = {
+            sampleRate,
+            codec: uplinkCodec,
+            accept: acceptedCodecs(),
+            send: ['mulaw', 'int16']
+        };
+        if (audioData.length > 0) {
+            // lets the server put the messages back in order
+            metadata.seq = micSeq++;
+        }
         const metadataStr = JSON.stringify(metadata);
         const metadataBytes = new TextEncoder().encode(metadataStr);
-        const audioDataBuffer = new Int16Array(audioData.length);
-        for (let i = 0; i < audioData.length; i++) {
-            audioDataBuffer[i] = Math.max(-32768, Math.min(32767, audioData[i] * 32768));
+        let audioDataBuffer;
+        if (uplinkCodec === 'mulaw') {
+            audioDataBuffer = mulawEncode(audioData);
+        } else {
+            audioDataBuffer = new Int16Array(audioData.length);
+            for (let i = 0; i < audioData.length; i++) {
+                audioDataBuffer[i] = Math.max(-32768, Math.min(32767, audioData[i] * 32768));
+            }
         }
         const metadataLength = new ArrayBuffer(4);
         const view = new DataView(metadataLength);